@@ -1,16 +1,17 @@
+import asyncio
 import io
 import json
 import os
 import uuid
 from datetime import datetime, timedelta
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 from zoneinfo import ZoneInfo
 
 import httpx
 import jwt
-from fastapi import FastAPI, Request, UploadFile, File, Form, Body, HTTPException, Depends
+from fastapi import FastAPI, Request, UploadFile, File, Form, Body, HTTPException, Depends, Query
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import JSONResponse, FileResponse, Response
 import asyncpg
 import numpy as np
 import cv2
@@ -19,6 +20,9 @@ from sqlalchemy import create_engine
 from srs_audit import init_audit
 from srs_audit.fastapi import AuditMiddleware, metrics_route
 
+from preflight import PREFLIGHT_MODE, PreflightStats, check_photo
+from raw_image import RAW_IMAGE_CONTENT_TYPE, pack_raw_image
+
 
 FACE_SERVICE_URL = os.getenv("FACE_SERVICE_URL", "http://face-service:8001/detect-face")
 SKIN_SERVICE_URL = os.getenv("SKIN_SERVICE_URL", "http://skin-service:8002/analyze-skin")
@@ -31,6 +35,10 @@ SKIN_CONSULTING_SERVICE_URL = os.getenv(
     "SKIN_CONSULTING_SERVICE_URL",
     "http://skin-consulting-service:8005",
 )
+# How face crops are sent downstream: jpeg (default), raw or png. raw sends the decoded BGR
+# pixels behind a small shape/dtype header (no encode/decode, no compression loss) and is meant
+# for services on the same host or network; png is the lossless encoded fallback.
+SKIN_IMAGE_TRANSPORT = os.getenv("SKIN_IMAGE_TRANSPORT", "jpeg").lower()
 
 DB_HOST = os.getenv("DB_HOST", "db")
 DB_PORT = int(os.getenv("DB_PORT", "5432"))
@@ -38,6 +46,10 @@ DB_NAME = os.getenv("DB_NAME", "nyraa_ai")
 DB_USER = os.getenv("DB_USER", "nyraa")
 DB_PASSWORD = os.getenv("DB_PASSWORD", "nyraa123")
 
+MAX_FACES_LIMIT = int(os.getenv("MAX_FACES_LIMIT", "10"))
+# Salon whose rule set recommendation-service uses when a request carries no X-Tenant-ID header.
+DEFAULT_TENANT_ID = os.getenv("DEFAULT_TENANT_ID", "")
+
 ADMIN_USER = os.getenv("ADMIN_USER", "admin")
 ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD", "admin")
 JWT_SECRET = os.getenv("JWT_SECRET", "change-me-in-production")
@@ -64,6 +76,8 @@ app.include_router(metrics_route)
 
 security = HTTPBearer(auto_error=False)
 
+preflight_stats = PreflightStats()
+
 db_pool: asyncpg.pool.Pool | None = None
 
 
@@ -150,15 +164,19 @@ async def call_service(
     files: Dict[str, Any] | None = None,
     json: Dict[str, Any] | None = None,
     correlation_id: Optional[str] = None,
+    params: Dict[str, Any] | None = None,
+    tenant_id: Optional[str] = None,
 ) -> Dict[str, Any]:
     timeout = httpx.Timeout(20.0, connect=5.0)
     headers = {}
     if correlation_id:
         headers["X-Correlation-ID"] = correlation_id
+    if tenant_id:
+        headers["X-Tenant-ID"] = tenant_id
     async with httpx.AsyncClient(timeout=timeout) as client:
         try:
             if method.upper() == "POST":
-                resp = await client.post(url, files=files, json=json, headers=headers)
+                resp = await client.post(url, files=files, json=json, params=params, headers=headers)
             else:
                 resp = await client.get(url, params=json, headers=headers)
         except httpx.RequestError as exc:
@@ -182,14 +200,43 @@ def _decode_image(contents: bytes):
     return cv2.imdecode(arr, cv2.IMREAD_COLOR)
 
 
-def _crop_face_region(image: np.ndarray, landmarks: List[Dict[str, float]], padding: float = 0.1) -> np.ndarray:
+def _preflight(contents: bytes) -> Optional[Dict[str, Any]]:
+    """
+    Pre-flight photo check before any downstream call. In reject mode a failing photo raises 422
+    (reasons in the message and X-Preflight-Issues); in warn mode the result is returned to attach
+    to the response. None when the photo passes or PREFLIGHT_MODE is off.
+    """
+    if PREFLIGHT_MODE == "off":
+        return None
+    result = check_photo(contents)
+    rejected = not result.passed and PREFLIGHT_MODE == "reject"
+    preflight_stats.record(result, rejected)
+    if result.passed:
+        return None
+    if rejected:
+        audit_logger.track_error("preflight_rejected", details=result.to_dict())
+        raise HTTPException(
+            status_code=422,
+            detail=result.message(),
+            headers={"X-Preflight-Issues": ",".join(result.issues)},
+        )
+    return result.to_dict()
+
+
+def _crop_face_region(image: np.ndarray, landmarks: List[Dict[str, float]], padding: float = 0.2) -> np.ndarray:
+    """
+    Crop around one face's landmarks, padded by a fraction of that face's own box rather
+    than of the frame, so a crop on a group photo does not reach into the next face.
+    """
     h, w = image.shape[:2]
     xs = [lm["x"] * w for lm in landmarks]
     ys = [lm["y"] * h for lm in landmarks]
-    x_min = max(0, int(min(xs) - padding * w))
-    x_max = min(w, int(max(xs) + padding * w))
-    y_min = max(0, int(min(ys) - padding * h))
-    y_max = min(h, int(max(ys) + padding * h))
+    pad_x = padding * (max(xs) - min(xs))
+    pad_y = padding * (max(ys) - min(ys))
+    x_min = max(0, int(min(xs) - pad_x))
+    x_max = min(w, int(max(xs) + pad_x))
+    y_min = max(0, int(min(ys) - pad_y))
+    y_max = min(h, int(max(ys) + pad_y))
     if x_max <= x_min or y_max <= y_min:
         return image
     return image[y_min:y_max, x_min:x_max]
@@ -254,6 +301,141 @@ async def login(request: Request, body: Dict[str, Any] = Body(...)):
     return {"access_token": _create_token("admin"), "role": "admin"}
 
 
+def _encode_jpeg(image: np.ndarray) -> bytes:
+    _, buf = cv2.imencode(".jpg", image)
+    return buf.tobytes()
+
+
+def _encode_crop(image: np.ndarray) -> Tuple[str, bytes, str]:
+    """Multipart file tuple for a face crop in the configured SKIN_IMAGE_TRANSPORT."""
+    if SKIN_IMAGE_TRANSPORT == "raw":
+        return ("face_crop.raw", pack_raw_image(image), RAW_IMAGE_CONTENT_TYPE)
+    if SKIN_IMAGE_TRANSPORT == "png":
+        _, buf = cv2.imencode(".png", image, [cv2.IMWRITE_PNG_COMPRESSION, 1])
+        return ("face_crop.png", buf.tobytes(), "image/png")
+    return ("face_crop.jpg", _encode_jpeg(image), "image/jpeg")
+
+
+async def _consult_staff(file_tuple: Tuple[str, bytes, str], correlation_id: Optional[str]) -> Dict[str, Any]:
+    staff_url = f"{SKIN_CONSULTING_SERVICE_URL.rstrip('/')}/consult-staff"
+    try:
+        return await call_service(staff_url, files={"file": file_tuple}, correlation_id=correlation_id)
+    except Exception:
+        return {"face_detected": False}
+
+
+async def _analyze_face(
+    image: Optional[np.ndarray],
+    landmarks: List[Dict[str, float]],
+    fallback_bytes: bytes,
+    consult_tuple: Optional[Tuple[str, bytes, str]],
+    correlation_id: Optional[str],
+    tenant_id: Optional[str] = None,
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Run skin, shape and consult stages for one face concurrently, then recommendation.
+    consult_tuple defaults to the JPEG face crop. Returns (response, combined).
+    """
+    if image is not None:
+        cropped_tuple = _encode_crop(_crop_face_region(image, landmarks))
+    else:
+        cropped_tuple = ("face_crop.jpg", fallback_bytes, "image/jpeg")
+    if consult_tuple is None:
+        consult_tuple = cropped_tuple
+
+    skin, shape, staff = await asyncio.gather(
+        call_service(SKIN_SERVICE_URL, files={"file": cropped_tuple}, correlation_id=correlation_id),
+        call_service(SHAPE_SERVICE_URL, json={"landmarks": landmarks}, correlation_id=correlation_id),
+        _consult_staff(consult_tuple, correlation_id),
+    )
+
+    dark_circle_score = "Low"
+    if image is not None:
+        dark_circle_score = _compute_dark_circle_score(image, landmarks)
+
+    combined = {
+        "skin_type": skin.get("skin_type"),
+        "acne_level": skin.get("acne_level"),
+        "face_shape": shape.get("face_shape"),
+        "dark_circle_score": dark_circle_score,
+    }
+
+    skin_response = dict(skin)
+    skin_response["dark_circle_score"] = dark_circle_score
+
+    rec = await call_service(
+        RECOMMENDATION_SERVICE_URL,
+        json=combined,
+        correlation_id=correlation_id,
+        tenant_id=tenant_id,
+    )
+
+    response = {
+        "skin": skin_response,
+        "shape": shape,
+        "recommendation": rec,
+        "landmarks": landmarks,
+        "skin_consult": staff,
+    }
+    return response, combined
+
+
+def _save_upload(contents: bytes) -> Optional[str]:
+    if not contents or not UPLOAD_DIR:
+        return None
+    try:
+        os.makedirs(UPLOAD_DIR, exist_ok=True)
+        image_path = f"{uuid.uuid4().hex}.jpg"
+        with open(os.path.join(UPLOAD_DIR, image_path), "wb") as f:
+            f.write(contents)
+        return image_path
+    except Exception:
+        return None
+
+
+async def _log_analysis(
+    user_type: str,
+    cust_name: Optional[str],
+    combined: Dict[str, Any],
+    rec: Dict[str, Any],
+    image_path: Optional[str],
+    response: Dict[str, Any],
+) -> None:
+    if db_pool is None:
+        return
+    try:
+        async with db_pool.acquire() as conn:
+            await conn.execute(
+                """
+                INSERT INTO analysis_logs (user_type, customer_name, skin_type, acne_level, face_shape, dark_circle_score,
+                                          recommended_services, recommended_products, image_path, analysis_result)
+                VALUES ($1, $2, $3, $4, $5, $6, $7::jsonb, $8::jsonb, $9, $10::jsonb)
+                """,
+                user_type,
+                cust_name,
+                combined["skin_type"],
+                combined["acne_level"],
+                combined["face_shape"],
+                combined.get("dark_circle_score"),
+                json.dumps(rec.get("recommended_services") or []),
+                json.dumps(rec.get("recommended_products") or []),
+                image_path,
+                json.dumps(response),
+            )
+    except Exception:
+        pass
+
+
+def _tenant_id(request: Request) -> Optional[str]:
+    return request.headers.get("X-Tenant-ID") or DEFAULT_TENANT_ID or None
+
+
+def _customer_name(user_type: str, customer_name: Optional[str]) -> Optional[str]:
+    if user_type == "admin":
+        return (customer_name or "GENERAL").strip() or "GENERAL"
+    return None
+
+
 @app.post("/analyze")
 async def analyze(
     request: Request,
@@ -264,6 +446,7 @@ async def analyze(
     contents = await file.read()
     if not contents:
         raise HTTPException(status_code=400, detail="Empty file uploaded")
+    preflight = _preflight(contents)
 
     correlation_id = getattr(request.state, "correlation_id", None)
     filename = getattr(file, "filename", "image.jpg") or "image.jpg"
@@ -284,97 +467,87 @@ async def analyze(
         raise HTTPException(status_code=422, detail="Face landmarks not available")
 
     image = _decode_image(contents)
-    if image is not None:
-        cropped = _crop_face_region(image, landmarks)
-        _, buf = cv2.imencode(".jpg", cropped)
-        cropped_bytes = buf.tobytes()
-    else:
-        cropped_bytes = contents
-    cropped_tuple = ("face_crop.jpg", cropped_bytes, "image/jpeg")
+    response, combined = await _analyze_face(
+        image, landmarks, contents, file_tuple, correlation_id, tenant_id=_tenant_id(request)
+    )
 
-    skin = await call_service(SKIN_SERVICE_URL, files={"file": cropped_tuple}, correlation_id=correlation_id)
+    user_type = current_user.get("role", "guest")
+    cust_name = _customer_name(user_type, customer_name)
+    image_path = _save_upload(contents)
+    await _log_analysis(user_type, cust_name, combined, response["recommendation"], image_path, response)
 
-    shape = await call_service(
-        SHAPE_SERVICE_URL,
-        json={"landmarks": landmarks},
+    audit_logger.audit(
+        action="ANALYSIS_COMPLETED",
+        resource_type="analysis",
+        details={
+            "user_type": user_type,
+            "customer_name": cust_name,
+            "skin_type": combined.get("skin_type"),
+            "face_shape": combined.get("face_shape"),
+        },
+        request=request,
         correlation_id=correlation_id,
     )
+    audit_logger.track_interaction("skin_analysis", request=request)
 
-    dark_circle_score = "Low"
-    if image is not None:
-        dark_circle_score = _compute_dark_circle_score(image, landmarks)
+    if preflight:
+        response["preflight"] = preflight
+    return response
 
-    combined = {
-        "skin_type": skin.get("skin_type"),
-        "acne_level": skin.get("acne_level"),
-        "face_shape": shape.get("face_shape"),
-        "dark_circle_score": dark_circle_score,
-    }
 
-    skin_response = dict(skin)
-    skin_response["dark_circle_score"] = dark_circle_score
+@app.post("/analyze-faces")
+async def analyze_faces(
+    request: Request,
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    file: UploadFile = File(...),
+    customer_name: Optional[str] = Form(None),
+    max_faces: int = Form(5),
+):
+    """
+    Group photo analysis: detect up to max_faces faces in one upload and run the
+    skin, shape, recommendation and consult stages for every face concurrently.
+    The image is decoded once; each face is sent downstream as its own crop.
+    """
+    contents = await file.read()
+    if not contents:
+        raise HTTPException(status_code=400, detail="Empty file uploaded")
+    if max_faces < 1 or max_faces > MAX_FACES_LIMIT:
+        raise HTTPException(status_code=400, detail=f"max_faces must be between 1 and {MAX_FACES_LIMIT}")
+    preflight = _preflight(contents)
 
-    rec = await call_service(
-        RECOMMENDATION_SERVICE_URL,
-        json=combined,
+    correlation_id = getattr(request.state, "correlation_id", None)
+    filename = getattr(file, "filename", "image.jpg") or "image.jpg"
+    content_type = file.content_type or "image/jpeg"
+
+    face = await call_service(
+        FACE_SERVICE_URL,
+        files={"file": (filename, contents, content_type)},
+        params={"max_faces": max_faces},
         correlation_id=correlation_id,
     )
+    faces = [f for f in (face.get("faces") or []) if f.get("landmarks")]
+    if not face.get("face_detected") or not faces:
+        raise HTTPException(
+            status_code=422,
+            detail="We couldn't detect a face in this image. Please use a clear, front-facing photo with your face clearly visible and good lighting.",
+        )
 
-    response = {
-        "skin": skin_response,
-        "shape": shape,
-        "recommendation": rec,
-        "landmarks": landmarks,
-    }
-
-    staff_url = f"{SKIN_CONSULTING_SERVICE_URL.rstrip('/')}/consult-staff"
-    try:
-        staff = await call_service(staff_url, files={"file": file_tuple}, correlation_id=correlation_id)
-        response["skin_consult"] = staff
-    except Exception:
-        response["skin_consult"] = {"face_detected": False}
+    image = _decode_image(contents)
+    tenant_id = _tenant_id(request)
+    results = await asyncio.gather(
+        *(_analyze_face(image, f["landmarks"], contents, None, correlation_id, tenant_id) for f in faces)
+    )
 
     user_type = current_user.get("role", "guest")
-    cust_name = None
-    if user_type == "admin":
-        cust_name = (customer_name or "GENERAL").strip() or "GENERAL"
-    else:
-        cust_name = None
+    cust_name = _customer_name(user_type, customer_name)
+    image_path = _save_upload(contents)
 
-    image_path = None
-    if contents and UPLOAD_DIR:
-        try:
-            os.makedirs(UPLOAD_DIR, exist_ok=True)
-            ext = "jpg"
-            image_path = f"{uuid.uuid4().hex}.{ext}"
-            out_path = os.path.join(UPLOAD_DIR, image_path)
-            with open(out_path, "wb") as f:
-                f.write(contents)
-        except Exception:
-            image_path = None
-
-    if db_pool is not None:
-        try:
-            async with db_pool.acquire() as conn:
-                await conn.execute(
-                    """
-                    INSERT INTO analysis_logs (user_type, customer_name, skin_type, acne_level, face_shape, dark_circle_score,
-                                              recommended_services, recommended_products, image_path, analysis_result)
-                    VALUES ($1, $2, $3, $4, $5, $6, $7::jsonb, $8::jsonb, $9, $10::jsonb)
-                    """,
-                    user_type,
-                    cust_name,
-                    combined["skin_type"],
-                    combined["acne_level"],
-                    combined["face_shape"],
-                    combined.get("dark_circle_score"),
-                    json.dumps(rec.get("recommended_services") or []),
-                    json.dumps(rec.get("recommended_products") or []),
-                    image_path,
-                    json.dumps(response),
-                )
-        except Exception:
-            pass
+    face_responses = []
+    for index, (f, (response, combined)) in enumerate(zip(faces, results)):
+        response["face_index"] = index
+        response["bbox"] = f.get("bbox")
+        await _log_analysis(user_type, cust_name, combined, response["recommendation"], image_path, response)
+        face_responses.append(response)
 
     audit_logger.audit(
         action="ANALYSIS_COMPLETED",
@@ -382,15 +555,17 @@ async def analyze(
         details={
             "user_type": user_type,
             "customer_name": cust_name,
-            "skin_type": combined.get("skin_type"),
-            "face_shape": combined.get("face_shape"),
+            "face_count": len(face_responses),
         },
         request=request,
         correlation_id=correlation_id,
     )
     audit_logger.track_interaction("skin_analysis", request=request)
 
-    return response
+    result: Dict[str, Any] = {"face_count": len(face_responses), "faces": face_responses}
+    if preflight:
+        result["preflight"] = preflight
+    return result
 
 
 def _to_ist(dt) -> Optional[str]:
@@ -520,29 +695,132 @@ async def get_audit_stats_endpoint(
     return audit_logger.get_audit_stats(period=period)
 
 
+def _gateway_artifact_urls(payload: Any) -> Any:
+    """Rewrite skin-consulting artifact paths (/artifacts/<id>) to this gateway's /consult/artifacts/<id>."""
+    if isinstance(payload, list):
+        return [_gateway_artifact_urls(v) for v in payload]
+    if not isinstance(payload, dict):
+        return payload
+    rewritten = {}
+    for key, value in payload.items():
+        if key.endswith("_image_url") and isinstance(value, str) and value.startswith("/artifacts/"):
+            rewritten[key] = "/consult" + value
+        else:
+            rewritten[key] = _gateway_artifact_urls(value)
+    return rewritten
+
+
 @app.post("/consult")
-async def consult(file: UploadFile = File(...), current_user: Dict[str, Any] = Depends(get_current_user)):
-    """Forward to skin-consulting-service: staff + customer results."""
+async def consult(
+    file: UploadFile = File(...),
+    include_staff: bool = Query(True),
+    include_customer: bool = Query(True),
+    inline: bool = Query(False),
+    force: bool = Query(False),
+    current_user: Dict[str, Any] = Depends(get_current_user),
+):
+    """
+    Forward to skin-consulting-service: staff + customer results from one detection and scoring pass.
+    force=true scores photos that fail the service's quality gate.
+    """
     contents = await file.read()
     if not contents:
         raise HTTPException(status_code=400, detail="Empty file uploaded")
+    if not include_staff and not include_customer:
+        raise HTTPException(status_code=400, detail="At least one of include_staff or include_customer must be true")
+    preflight = _preflight(contents)
 
     filename = getattr(file, "filename", "image.jpg") or "image.jpg"
     content_type = file.content_type or "image/jpeg"
     file_tuple = (filename, contents, content_type)
 
-    staff_url = f"{SKIN_CONSULTING_SERVICE_URL.rstrip('/')}/consult-staff"
-    customer_url = f"{SKIN_CONSULTING_SERVICE_URL.rstrip('/')}/consult-customer"
+    consult_url = f"{SKIN_CONSULTING_SERVICE_URL.rstrip('/')}/consult"
+    params = {
+        "include_staff": str(include_staff).lower(),
+        "include_customer": str(include_customer).lower(),
+        "inline": str(inline).lower(),
+        "force": str(force).lower(),
+        "session": "true",  # kiosks follow up with /consult/simulate
+    }
 
     try:
-        staff = await call_service(staff_url, files={"file": file_tuple})
+        result = await call_service(consult_url, files={"file": file_tuple}, params=params)
     except HTTPException:
-        staff = {"face_detected": False, "detail": "Skin consulting staff call failed"}
+        result = {
+            "staff": {"face_detected": False, "detail": "Skin consulting staff call failed"},
+            "customer": {"face_detected": False, "detail": "Skin consulting customer call failed"},
+        }
+
+    result = _gateway_artifact_urls(result)
+    response: Dict[str, Any] = {}
+    if include_staff:
+        response["staff"] = result.get("staff") or {"face_detected": False, "detail": "Skin consulting staff call failed"}
+    if include_customer:
+        response["customer"] = result.get("customer") or {"face_detected": False, "detail": "Skin consulting customer call failed"}
+    # Token for POST /consult/simulate: try further services on the same face without re-uploading.
+    response["session_token"] = result.get("session_token")
+    if preflight:
+        response["preflight"] = preflight
+    return response
 
-    try:
-        customer = await call_service(customer_url, files={"file": file_tuple})
-    except HTTPException:
-        customer = {"face_detected": False, "detail": "Skin consulting customer call failed"}
 
-    return {"staff": staff, "customer": customer}
+@app.post("/consult/simulate")
+async def consult_simulate(body: Dict[str, Any] = Body(...), current_user: Dict[str, Any] = Depends(get_current_user)):
+    """Forward to skin-consulting-service /simulate: render services for a consult's session_token."""
+    if not body.get("session_token"):
+        raise HTTPException(status_code=400, detail="session_token required")
+    simulate_url = f"{SKIN_CONSULTING_SERVICE_URL.rstrip('/')}/simulate"
+    return _gateway_artifact_urls(await call_service(simulate_url, json=body))
+
+
+@app.post("/consult/scenarios")
+async def consult_scenarios(
+    file: UploadFile = File(...),
+    services: Optional[List[str]] = Query(None),
+    product_days: Optional[List[int]] = Query(None),
+    inline: bool = Query(False),
+    current_user: Dict[str, Any] = Depends(get_current_user),
+):
+    """Forward to skin-consulting-service /simulate-scenarios: after images per service and product timeline day."""
+    contents = await file.read()
+    if not contents:
+        raise HTTPException(status_code=400, detail="Empty file uploaded")
+    preflight = _preflight(contents)
+
+    filename = getattr(file, "filename", "image.jpg") or "image.jpg"
+    content_type = file.content_type or "image/jpeg"
+    params: Dict[str, Any] = {"inline": str(inline).lower()}
+    if services:
+        params["services"] = services
+    if product_days:
+        params["product_days"] = product_days
+    scenarios_url = f"{SKIN_CONSULTING_SERVICE_URL.rstrip('/')}/simulate-scenarios"
+    result = await call_service(scenarios_url, files={"file": (filename, contents, content_type)}, params=params)
+    result = _gateway_artifact_urls(result)
+    if preflight:
+        result["preflight"] = preflight
+    return result
+
+
+@app.get("/metrics/preflight")
+async def preflight_metrics():
+    """Pre-flight photo checks: mode, photos checked, passed, rejected, warned, and counts per issue."""
+    return preflight_stats.stats()
+
+
+@app.get("/consult/artifacts/{artifact_id}")
+async def consult_artifact(artifact_id: str):
+    """Proxy a rendered consult image. Ids are unguessable and short-lived, so <img> tags can load them without a token."""
+    if not artifact_id or "/" in artifact_id or ".." in artifact_id:
+        raise HTTPException(status_code=400, detail="Invalid artifact id")
+    url = f"{SKIN_CONSULTING_SERVICE_URL.rstrip('/')}/artifacts/{artifact_id}"
+    async with httpx.AsyncClient(timeout=httpx.Timeout(10.0, connect=5.0)) as client:
+        try:
+            resp = await client.get(url)
+        except httpx.RequestError as exc:
+            raise HTTPException(status_code=502, detail=f"Error contacting service at {url}: {exc}")
+    if resp.status_code >= 400:
+        raise HTTPException(status_code=resp.status_code, detail="Artifact not found or expired")
+    headers = {"Cache-Control": resp.headers["cache-control"]} if "cache-control" in resp.headers else None
+    return Response(content=resp.content, media_type=resp.headers.get("content-type", "image/webp"), headers=headers)
 
@@ -0,0 +1,122 @@
+"""
+Pre-flight photo check run by the gateway before any downstream call.
+
+The upload is decoded at reduced resolution (JPEG decodes at 1/4 scale straight from
+the DCT coefficients) and bounded to PREFLIGHT_THUMB_PX. Then its dimensions, mean
+luminance, contrast and Laplacian-variance sharpness are compared with configurable
+thresholds. Photos that could never give a usable analysis are rejected (or, in warn
+mode, flagged) before face-service or any ML service sees them. Counters per reason
+are kept for /metrics/preflight.
+"""
+import os
+import threading
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict, List
+
+import cv2
+import numpy as np
+
+PREFLIGHT_MODE = os.getenv("PREFLIGHT_MODE", "reject").lower()  # reject | warn | off
+PREFLIGHT_THUMB_PX = int(os.getenv("PREFLIGHT_THUMB_PX", "256"))  # long side the checks run at
+PREFLIGHT_MIN_SIDE_PX = int(os.getenv("PREFLIGHT_MIN_SIDE_PX", "160"))  # short side of the upload
+PREFLIGHT_MIN_LUMINANCE = float(os.getenv("PREFLIGHT_MIN_LUMINANCE", "30"))
+PREFLIGHT_MAX_LUMINANCE = float(os.getenv("PREFLIGHT_MAX_LUMINANCE", "235"))
+PREFLIGHT_MIN_CONTRAST = float(os.getenv("PREFLIGHT_MIN_CONTRAST", "8"))  # grey std; flat fills, blank frames
+PREFLIGHT_MIN_SHARPNESS = float(os.getenv("PREFLIGHT_MIN_SHARPNESS", "15"))  # Laplacian variance on the thumbnail
+
+if PREFLIGHT_MODE not in ("reject", "warn", "off"):
+    raise ValueError(f"PREFLIGHT_MODE must be reject, warn or off, got {PREFLIGHT_MODE!r}")
+
+# Reduced decode factor; reported dimensions are accurate to within this many pixels.
+_REDUCTION = 4
+
+ISSUE_MESSAGES = {
+    "undecodable": "the file is not a readable image",
+    "too_small": "the photo is too small",
+    "too_dark": "the photo is too dark",
+    "too_bright": "the photo is overexposed",
+    "low_contrast": "the photo looks blank or is not a photo",
+    "blurry": "the photo is blurred",
+}
+
+
+@dataclass
+class PreflightResult:
+    passed: bool
+    issues: List[str] = field(default_factory=list)
+    metrics: Dict[str, float] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"passed": self.passed, "issues": self.issues, "metrics": self.metrics}
+
+    def message(self) -> str:
+        reasons = "; ".join(ISSUE_MESSAGES.get(issue, issue) for issue in self.issues)
+        return f"Photo rejected before analysis: {reasons}. Please retake a clear, well-lit, front-facing photo."
+
+
+def check_photo(contents: bytes) -> PreflightResult:
+    """Dimensions, luminance, contrast and blur from a reduced-resolution greyscale decode."""
+    thumb = cv2.imdecode(np.frombuffer(contents, np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_4)
+    if thumb is None or thumb.size == 0:
+        return PreflightResult(passed=False, issues=["undecodable"])
+    h, w = thumb.shape[:2]
+    metrics = {"width": w * _REDUCTION, "height": h * _REDUCTION}
+    long_side = max(h, w)
+    if long_side > PREFLIGHT_THUMB_PX:
+        scale = PREFLIGHT_THUMB_PX / long_side
+        thumb = cv2.resize(thumb, (max(1, round(w * scale)), max(1, round(h * scale))), interpolation=cv2.INTER_AREA)
+    mean, std = cv2.meanStdDev(thumb)
+    _, lap_std = cv2.meanStdDev(cv2.Laplacian(thumb, cv2.CV_64F))
+    metrics.update(
+        luminance=round(float(mean[0, 0]), 1),
+        contrast=round(float(std[0, 0]), 1),
+        sharpness=round(float(lap_std[0, 0]) ** 2, 1),
+    )
+
+    issues = []
+    if min(metrics["width"], metrics["height"]) < PREFLIGHT_MIN_SIDE_PX:
+        issues.append("too_small")
+    # Contrast and edges collapse with exposure, so they are only judged on exposed photos.
+    if metrics["luminance"] < PREFLIGHT_MIN_LUMINANCE:
+        issues.append("too_dark")
+    elif metrics["luminance"] > PREFLIGHT_MAX_LUMINANCE:
+        issues.append("too_bright")
+    elif metrics["contrast"] < PREFLIGHT_MIN_CONTRAST:
+        issues.append("low_contrast")
+    elif metrics["sharpness"] < PREFLIGHT_MIN_SHARPNESS:
+        issues.append("blurry")  # a flat image has no edges either; report it once
+    return PreflightResult(passed=not issues, issues=issues, metrics=metrics)
+
+
+class PreflightStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checked = 0
+        self.passed = 0
+        self.rejected = 0
+        self.warned = 0
+        self.issues: Counter = Counter()
+
+    def record(self, result: PreflightResult, rejected: bool) -> None:
+        with self._lock:
+            self.checked += 1
+            if result.passed:
+                self.passed += 1
+                return
+            if rejected:
+                self.rejected += 1
+            else:
+                self.warned += 1
+            self.issues.update(result.issues)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "mode": PREFLIGHT_MODE,
+                "checked": self.checked,
+                "passed": self.passed,
+                "rejected": self.rejected,
+                "warned": self.warned,
+                "issues": dict(self.issues),
+            }
@@ -16,3 +16,11 @@ ALTER TABLE analysis_logs ADD COLUMN IF NOT EXISTS user_type TEXT;
 ALTER TABLE analysis_logs ADD COLUMN IF NOT EXISTS customer_name TEXT;
 UPDATE analysis_logs SET user_type = 'guest' WHERE user_type IS NULL;
 
+
+-- Per-salon recommendation rule sets (recommendation-service). version is bumped on every update.
+CREATE TABLE IF NOT EXISTS tenant_rule_sets (
+    tenant_id TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 1,
+    rules JSONB NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
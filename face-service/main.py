@@ -1,12 +1,64 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI, UploadFile, File, HTTPException, Query
+from fastapi.responses import JSONResponse
 import numpy as np
 import cv2
 import mediapipe as mp
 
-app = FastAPI(title="NYRAA AI Face Service", version="1.0.0")
+logger = logging.getLogger("uvicorn.error")
+
+MAX_FACES_LIMIT = int(os.getenv("MAX_FACES_LIMIT", "10"))
+if MAX_FACES_LIMIT < 1:
+    raise ValueError("MAX_FACES_LIMIT must be at least 1")
 
 mp_face = mp.solutions.face_mesh
-face_mesh = mp_face.FaceMesh(static_image_mode=True)
+
+# One FaceMesh built with the largest face budget; requests asking for fewer faces slice its results.
+_face_mesh: Optional[Any] = None
+model_state: Dict[str, Any] = {"status": "loading", "load_ms": None, "warmup_ms": None, "error": None}
+
+
+def _load_and_warm_face_mesh() -> None:
+    """Build the FaceMesh and run it once on a synthetic frame to initialize the graph."""
+    global _face_mesh
+    started = time.perf_counter()
+    mesh = mp_face.FaceMesh(static_image_mode=True, max_num_faces=MAX_FACES_LIMIT)
+    model_state["load_ms"] = round((time.perf_counter() - started) * 1000.0, 1)
+    started = time.perf_counter()
+    mesh.process(np.full((256, 256, 3), 128, dtype=np.uint8))
+    model_state["warmup_ms"] = round((time.perf_counter() - started) * 1000.0, 1)
+    _face_mesh = mesh
+
+
+async def _load_model() -> None:
+    try:
+        await asyncio.to_thread(_load_and_warm_face_mesh)
+        model_state["status"] = "ready"
+        logger.info("FaceMesh ready: %s", model_state)
+    except Exception as exc:
+        model_state["status"] = "failed"
+        model_state["error"] = str(exc)
+        logger.exception("FaceMesh failed to load")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    loader = asyncio.create_task(_load_model())
+    yield
+    global _face_mesh
+    loader.cancel()
+    if _face_mesh is not None:
+        _face_mesh.close()
+        _face_mesh = None
+
+
+app = FastAPI(title="NYRAA AI Face Service", version="1.0.0", lifespan=lifespan)
 
 
 def read_image(file_bytes: bytes) -> np.ndarray:
@@ -15,8 +67,23 @@ def read_image(file_bytes: bytes) -> np.ndarray:
     return image
 
 
+def _landmarks_bbox(landmarks: List[Dict[str, float]]) -> Dict[str, float]:
+    """Normalized (0-1) bounding box around a face's landmarks."""
+    xs = [lm["x"] for lm in landmarks]
+    ys = [lm["y"] for lm in landmarks]
+    return {
+        "x_min": max(0.0, min(xs)),
+        "y_min": max(0.0, min(ys)),
+        "x_max": min(1.0, max(xs)),
+        "y_max": min(1.0, max(ys)),
+    }
+
+
 @app.post("/detect-face")
-async def detect_face(file: UploadFile = File(...)):
+async def detect_face(
+    file: UploadFile = File(...),
+    max_faces: int = Query(1, ge=1, le=MAX_FACES_LIMIT),
+):
     contents = await file.read()
     if not contents:
         raise HTTPException(status_code=400, detail="Empty file uploaded")
@@ -25,15 +92,36 @@ async def detect_face(file: UploadFile = File(...)):
     if image is None:
         raise HTTPException(status_code=400, detail="Unable to decode image")
 
+    if model_state["status"] != "ready":
+        raise HTTPException(status_code=503, detail=f"FaceMesh is {model_state['status']}")
+
     rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-    results = face_mesh.process(rgb)
+    results = _face_mesh.process(rgb)
 
     if not results.multi_face_landmarks:
-        return {"face_detected": False, "landmarks": []}
+        return {"face_detected": False, "landmarks": [], "face_count": 0, "faces": []}
+
+    faces = []
+    for face_landmarks in results.multi_face_landmarks[:max_faces]:
+        landmarks = [{"x": float(lm.x), "y": float(lm.y)} for lm in face_landmarks.landmark]
+        faces.append({"landmarks": landmarks, "bbox": _landmarks_bbox(landmarks)})
+
+    # "landmarks" stays the first face so single-face callers are unaffected.
+    return {
+        "face_detected": True,
+        "landmarks": faces[0]["landmarks"],
+        "face_count": len(faces),
+        "faces": faces,
+    }
+
 
-    landmarks = []
-    for lm in results.multi_face_landmarks[0].landmark:
-        landmarks.append({"x": float(lm.x), "y": float(lm.y)})
+@app.get("/health/live")
+async def health_live():
+    return {"status": "ok", "service": "face"}
 
-    return {"face_detected": True, "landmarks": landmarks}
 
+@app.get("/health/ready")
+async def health_ready():
+    """200 once FaceMesh is loaded and warmed up; 503 while loading or after a load failure."""
+    status_code = 200 if model_state["status"] == "ready" else 503
+    return JSONResponse(status_code=status_code, content={"service": "face", **model_state})
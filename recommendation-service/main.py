@@ -1,11 +1,22 @@
+import asyncio
+import hashlib
 import json
+import logging
 import os
+import time
+from datetime import datetime, timezone
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple
 
-from fastapi import FastAPI
+import asyncpg
+from fastapi import FastAPI, HTTPException, Header, Body
 from pydantic import BaseModel
 
+from rules import CompiledRules, validate_rules
+from tenants import TenantRuleCache
+
+logger = logging.getLogger("uvicorn.error")
+
 
 class RecommendationRequest(BaseModel):
     skin_type: str
@@ -17,59 +28,186 @@ class RecommendationRequest(BaseModel):
 app = FastAPI(title="NYRAA AI Recommendation Service", version="1.0.0")
 
 CONFIG_PATH = os.getenv("RECOMMENDATIONS_CONFIG", "/app/config/recommendations.json")
-_rules: List[Dict[str, Any]] = []
+# Seconds between rule-file change checks; 0 disables the watcher (use POST /admin/reload-rules).
+RULES_WATCH_INTERVAL = float(os.getenv("RULES_WATCH_INTERVAL", "5"))
+FALLBACK_VERSION = "builtin"
 
+# The active rule set. Reloads compile a new CompiledRules off the request path and swap this
+# reference in one assignment, so a request sees either the old or the new set, never a mix.
+_compiled: Optional[CompiledRules] = None
+_file_signature: Optional[Tuple[int, int]] = None
+_reload_lock = asyncio.Lock()
+_watcher: Optional[asyncio.Task] = None
+rules_state: Dict[str, Any] = {
+    "version": FALLBACK_VERSION,
+    "loaded_at": None,
+    "rule_count": 0,
+    "table_size": 0,
+    "compile_ms": None,
+    "reloads": 0,
+    "reload_failures": 0,
+    "last_error": None,
+}
 
-def _load_rules() -> List[Dict[str, Any]]:
-    path = Path(CONFIG_PATH)
-    if not path.exists():
-        return []
+# Per-salon rule sets (tenant_rule_sets in Postgres). Requests without X-Tenant-ID, for
+# DEFAULT_TENANT_ID, or for a tenant with no stored rules use the file rules above.
+DEFAULT_TENANT_ID = os.getenv("DEFAULT_TENANT_ID", "default")
+TENANT_REFRESH_INTERVAL = float(os.getenv("TENANT_REFRESH_INTERVAL", "10"))
+DB_HOST = os.getenv("DB_HOST", "db")
+DB_PORT = int(os.getenv("DB_PORT", "5432"))
+DB_NAME = os.getenv("DB_NAME", "nyraa_ai")
+DB_USER = os.getenv("DB_USER", "nyraa")
+DB_PASSWORD = os.getenv("DB_PASSWORD", "nyraa123")
+# Longest wait between connection attempts while Postgres is not reachable yet.
+DB_RETRY_MAX_S = float(os.getenv("DB_RETRY_MAX_S", "30"))
+
+db_pool: asyncpg.pool.Pool | None = None
+tenant_cache = TenantRuleCache(int(os.getenv("TENANT_CACHE_SIZE", "256")))
+_tenant_locks: Dict[str, asyncio.Lock] = {}
+_tenant_watcher: Optional[asyncio.Task] = None
+
+
+def _signature(path: Path) -> Optional[Tuple[int, int]]:
     try:
-        with open(path) as f:
-            data = json.load(f)
-        return data.get("rules", [])
-    except Exception:
-        return []
-
-
-def _rule_matches(conditions: Dict[str, Any], payload: RecommendationRequest) -> bool:
-    payload_dict = {
-        "skin_type": payload.skin_type,
-        "acne_level": payload.acne_level,
-        "face_shape": payload.face_shape,
-        "dark_circle_score": payload.dark_circle_score or "Low",
-    }
-    for key, value in conditions.items():
-        if key not in payload_dict:
-            continue
-        actual = payload_dict[key]
-        if isinstance(value, list):
-            if actual not in value:
-                return False
-        else:
-            if actual != value:
-                return False
-    return True
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
 
 
-def _recommend_from_rules(payload: RecommendationRequest) -> Tuple[List[str], List[str]]:
-    services: List[str] = []
-    products: List[str] = []
-    seen_s: set = set()
-    seen_p: set = set()
-    for rule in _rules:
-        cond = rule.get("conditions", {})
-        if not _rule_matches(cond, payload):
+def _load_rules() -> Tuple[Optional[CompiledRules], Optional[Tuple[int, int]]]:
+    """
+    Parse, validate and compile the rule file. Returns (None, None) when the file is missing
+    (built-in fallback rules apply); raises on invalid JSON or RuleValidationError.
+    The version id is a hash of the file contents.
+    """
+    path = Path(CONFIG_PATH)
+    signature = _signature(path)
+    if signature is None:
+        return None, None
+    raw = path.read_bytes()
+    rules = validate_rules(json.loads(raw))
+    version = hashlib.sha256(raw).hexdigest()[:12]
+    return (CompiledRules(rules, version) if rules else None), signature
+
+
+def _activate(compiled: Optional[CompiledRules], signature: Optional[Tuple[int, int]], compile_ms: float) -> None:
+    global _compiled, _file_signature
+    _compiled = compiled
+    _file_signature = signature
+    rules_state.update(
+        version=compiled.version if compiled is not None else FALLBACK_VERSION,
+        loaded_at=datetime.now(timezone.utc).isoformat(),
+        rule_count=len(compiled.rules) if compiled is not None else 0,
+        table_size=compiled.table_size if compiled is not None else 0,
+        compile_ms=round(compile_ms, 1),
+    )
+    logger.info("recommendation rules active: %s", rules_state)
+
+
+async def reload_rules() -> Dict[str, Any]:
+    """Compile the rule file in a worker thread and swap it in; on failure keep the running set."""
+    async with _reload_lock:
+        started = time.perf_counter()
+        try:
+            compiled, signature = await asyncio.to_thread(_load_rules)
+        except Exception as exc:
+            rules_state["reload_failures"] += 1
+            rules_state["last_error"] = str(exc)
+            logger.error("recommendation rules reload failed, keeping %s: %s", rules_state["version"], exc)
+            raise
+        _activate(compiled, signature, (time.perf_counter() - started) * 1000.0)
+        rules_state["reloads"] += 1
+        rules_state["last_error"] = None
+        return dict(rules_state)
+
+
+async def _watch_rules() -> None:
+    global _file_signature
+    path = Path(CONFIG_PATH)
+    while True:
+        await asyncio.sleep(RULES_WATCH_INTERVAL)
+        signature = _signature(path)
+        if signature == _file_signature:
             continue
-        for s in rule.get("services", []):
-            if s and s not in seen_s:
-                services.append(s)
-                seen_s.add(s)
-        for p in rule.get("products", []):
-            if p and p not in seen_p:
-                products.append(p)
-                seen_p.add(p)
-    return services, products
+        try:
+            await reload_rules()
+        except Exception:
+            # Already recorded in rules_state; retry once the file changes again.
+            _file_signature = signature
+
+
+async def _refresh_tenant_versions() -> None:
+    async with db_pool.acquire() as conn:
+        rows = await conn.fetch("SELECT tenant_id, version FROM tenant_rule_sets")
+    tenant_cache.set_versions({r["tenant_id"]: r["version"] for r in rows})
+
+
+async def _connect_db() -> asyncpg.pool.Pool:
+    """Create the pool, retrying with exponential backoff until Postgres accepts connections."""
+    delay = 1.0
+    while True:
+        try:
+            return await asyncpg.create_pool(
+                host=DB_HOST,
+                port=DB_PORT,
+                database=DB_NAME,
+                user=DB_USER,
+                password=DB_PASSWORD,
+                min_size=1,
+                max_size=3,
+            )
+        except Exception as e:
+            logger.warning("tenant rule sets unavailable, retrying in %.0fs: %s", delay, e)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, DB_RETRY_MAX_S)
+
+
+async def _watch_tenants() -> None:
+    """
+    Connect (file rules serve every tenant until then), then keep every tenant's version current
+    with one small query per interval, however many requests arrive. The schema is db/init.sql.
+    """
+    global db_pool
+    db_pool = await _connect_db()
+    while True:
+        try:
+            await _refresh_tenant_versions()
+        except Exception as e:
+            logger.warning("tenant rule version refresh failed: %s", e)
+        await asyncio.sleep(TENANT_REFRESH_INTERVAL)
+
+
+async def _load_tenant_rules(tenant_id: str) -> Optional[CompiledRules]:
+    """Cache miss: read and compile one tenant's rules (single-flight per tenant)."""
+    lock = _tenant_locks.setdefault(tenant_id, asyncio.Lock())
+    async with lock:
+        compiled = tenant_cache.get(tenant_id)
+        if compiled is not None:
+            return compiled
+        async with db_pool.acquire() as conn:
+            row = await conn.fetchrow(
+                "SELECT version, rules FROM tenant_rule_sets WHERE tenant_id = $1",
+                tenant_id,
+            )
+        if row is None:
+            return None
+        rules = validate_rules(json.loads(row["rules"]))
+        compiled = await asyncio.to_thread(CompiledRules, rules, f"{tenant_id}:v{row['version']}")
+        tenant_cache.put(tenant_id, row["version"], compiled)
+        return compiled
+
+
+async def _rules_for_tenant(tenant_id: Optional[str]) -> Optional[CompiledRules]:
+    if db_pool is None or not tenant_id or tenant_id == DEFAULT_TENANT_ID or tenant_id not in tenant_cache.versions:
+        return _compiled
+    compiled = tenant_cache.get(tenant_id)
+    if compiled is None:
+        try:
+            compiled = await _load_tenant_rules(tenant_id)
+        except Exception as e:
+            logger.error("rules for tenant %s unavailable, using default rules: %s", tenant_id, e)
+    return compiled if compiled is not None else _compiled
 
 
 def _recommend_fallback(payload: RecommendationRequest) -> Tuple[List[str], List[str]]:
@@ -104,19 +242,89 @@ def _recommend_fallback(payload: RecommendationRequest) -> Tuple[List[str], List
 
 
 @app.on_event("startup")
-def startup():
-    global _rules
-    _rules = _load_rules()
+async def startup():
+    global _watcher, _tenant_watcher
+    started = time.perf_counter()
+    compiled, signature = _load_rules()
+    _activate(compiled, signature, (time.perf_counter() - started) * 1000.0)
+    if RULES_WATCH_INTERVAL > 0:
+        _watcher = asyncio.create_task(_watch_rules())
+
+    _tenant_watcher = asyncio.create_task(_watch_tenants())
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    for task in (_watcher, _tenant_watcher):
+        if task is not None:
+            task.cancel()
+    if db_pool is not None:
+        await db_pool.close()
 
 
 @app.post("/recommend")
-async def recommend(payload: RecommendationRequest):
-    if _rules:
-        services, products = _recommend_from_rules(payload)
-    else:
-        services, products = _recommend_fallback(payload)
+async def recommend(payload: RecommendationRequest, x_tenant_id: Optional[str] = Header(None)):
+    compiled = await _rules_for_tenant(x_tenant_id)
+    if compiled is not None:
+        return compiled.lookup(
+            payload.skin_type,
+            payload.acne_level,
+            payload.face_shape,
+            payload.dark_circle_score or "Low",
+        )
+
+    services, products = _recommend_fallback(payload)
 
     return {
         "recommended_services": services,
         "recommended_products": products,
+        "rules_version": FALLBACK_VERSION,
     }
+
+
+@app.post("/admin/reload-rules")
+async def admin_reload_rules():
+    """Re-read RECOMMENDATIONS_CONFIG now. 422 with the errors if the new file is invalid."""
+    try:
+        return await reload_rules()
+    except Exception as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+
+
+@app.put("/admin/tenants/{tenant_id}/rules")
+async def admin_put_tenant_rules(tenant_id: str, body: Optional[Dict[str, Any]] = Body(None)):
+    """
+    Store a tenant's rule set ({"rules": [...]}) and bump its version. Without a body the
+    tenant is seeded from the current RECOMMENDATIONS_CONFIG file. 422 if the rules are invalid.
+    """
+    if db_pool is None:
+        raise HTTPException(status_code=503, detail="Tenant rule storage unavailable")
+    if body is None:
+        path = Path(CONFIG_PATH)
+        if not path.exists():
+            raise HTTPException(status_code=422, detail="No body and no seed rule file")
+        body = json.loads(path.read_bytes())
+    try:
+        rules = validate_rules(body)
+        await asyncio.to_thread(CompiledRules, rules)
+    except Exception as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+    async with db_pool.acquire() as conn:
+        version = await conn.fetchval(
+            """
+            INSERT INTO tenant_rule_sets (tenant_id, rules) VALUES ($1, $2::jsonb)
+            ON CONFLICT (tenant_id) DO UPDATE
+                SET rules = EXCLUDED.rules, version = tenant_rule_sets.version + 1, updated_at = NOW()
+            RETURNING version
+            """,
+            tenant_id,
+            json.dumps({"rules": rules}),
+        )
+    # Other replicas pick the new version up on their next refresh.
+    tenant_cache.set_versions({**tenant_cache.versions, tenant_id: version})
+    return {"tenant_id": tenant_id, "version": version, "rule_count": len(rules)}
+
+
+@app.get("/metrics/rules")
+async def rules_metrics():
+    return {**rules_state, "tenant_cache": tenant_cache.stats()}
@@ -0,0 +1,129 @@
+"""
+Rule validation and compilation for recommendation-service.
+
+Rules are compiled once into per-attribute bitsets: for every attribute value, an int
+whose bit i is set when rule i accepts that value (rules without a condition on the
+attribute accept every value). Any value no rule mentions behaves like every other
+unmentioned value, so each attribute has a small finite domain and the full answer
+table (one precomputed response per combination) is built at compile time. Rule sets
+whose table would exceed MAX_TABLE_SIZE answer by ANDing bitsets per request instead.
+"""
+import itertools
+from typing import Any, Dict, List, Optional, Tuple
+
+ATTRIBUTES = ("skin_type", "acne_level", "face_shape", "dark_circle_score")
+MAX_TABLE_SIZE = 100_000
+
+
+class RuleValidationError(ValueError):
+    def __init__(self, errors: List[str]):
+        self.errors = errors
+        super().__init__("Invalid recommendation rules: " + "; ".join(errors))
+
+
+def _string_list(value: Any) -> bool:
+    return isinstance(value, list) and all(isinstance(v, str) for v in value)
+
+
+def validate_rules(data: Any) -> List[Dict[str, Any]]:
+    """Check the parsed JSON document and return its rule list; raise RuleValidationError listing every problem."""
+    if not isinstance(data, dict) or not isinstance(data.get("rules"), list):
+        raise RuleValidationError(['top level must be an object with a "rules" array'])
+    errors: List[str] = []
+    for i, rule in enumerate(data["rules"]):
+        where = f"rules[{i}]"
+        if not isinstance(rule, dict):
+            errors.append(f"{where}: must be an object")
+            continue
+        conditions = rule.get("conditions", {})
+        if not isinstance(conditions, dict):
+            errors.append(f"{where}.conditions: must be an object")
+        else:
+            for key, value in conditions.items():
+                if key not in ATTRIBUTES:
+                    errors.append(f"{where}.conditions: unknown key {key!r} (expected one of {', '.join(ATTRIBUTES)})")
+                elif not isinstance(value, str) and not _string_list(value):
+                    errors.append(f"{where}.conditions.{key}: must be a string or an array of strings")
+        for field in ("services", "products"):
+            if field in rule and not _string_list(rule[field]):
+                errors.append(f"{where}.{field}: must be an array of strings")
+    if errors:
+        raise RuleValidationError(errors)
+    return data["rules"]
+
+
+class CompiledRules:
+    def __init__(self, rules: List[Dict[str, Any]], version: str = ""):
+        self.rules = rules
+        self.version = version
+        # Per attribute: value -> index into masks; the extra last mask is "any other value".
+        self._index: List[Dict[str, int]] = []
+        self._masks: List[List[int]] = []
+        for attr in ATTRIBUTES:
+            values: Dict[str, int] = {}
+            wildcard = 0
+            accepts: List[Tuple[int, List[str]]] = []
+            for bit, rule in enumerate(rules):
+                cond = rule.get("conditions", {})
+                if attr not in cond:
+                    wildcard |= 1 << bit
+                    continue
+                accepted = cond[attr] if isinstance(cond[attr], list) else [cond[attr]]
+                accepts.append((bit, accepted))
+                for value in accepted:
+                    values.setdefault(value, len(values))
+            masks = [wildcard] * (len(values) + 1)
+            for bit, accepted in accepts:
+                for value in accepted:
+                    masks[values[value]] |= 1 << bit
+            self._index.append(values)
+            self._masks.append(masks)
+
+        self._table: Optional[Dict[Tuple[int, ...], Dict[str, Any]]] = None
+        size = 1
+        for masks in self._masks:
+            size *= len(masks)
+        if size <= MAX_TABLE_SIZE:
+            self._table = {
+                key: self._answer(key)
+                for key in itertools.product(*(range(len(masks)) for masks in self._masks))
+            }
+
+    def _key(self, values: Tuple[str, ...]) -> Tuple[int, ...]:
+        return tuple(index.get(v, len(index)) for index, v in zip(self._index, values))
+
+    def _answer(self, key: Tuple[int, ...]) -> Dict[str, Any]:
+        mask = -1
+        for masks, i in zip(self._masks, key):
+            mask &= masks[i]
+        services: List[str] = []
+        products: List[str] = []
+        seen_s: set = set()
+        seen_p: set = set()
+        for bit, rule in enumerate(self.rules):
+            if not mask >> bit & 1:
+                continue
+            for s in rule.get("services", []):
+                if s and s not in seen_s:
+                    services.append(s)
+                    seen_s.add(s)
+            for p in rule.get("products", []):
+                if p and p not in seen_p:
+                    products.append(p)
+                    seen_p.add(p)
+        return {
+            "recommended_services": services,
+            "recommended_products": products,
+            "rules_version": self.version,
+        }
+
+    @property
+    def table_size(self) -> int:
+        return len(self._table) if self._table is not None else 0
+
+    def lookup(self, skin_type: str, acne_level: str, face_shape: str, dark_circle_score: str) -> Dict[str, Any]:
+        """Response for one request. Precomputed (shared, do not mutate) when the answer table was built."""
+        key = self._key((skin_type, acne_level, face_shape, dark_circle_score))
+        if self._table is not None:
+            return self._table[key]
+        return self._answer(key)
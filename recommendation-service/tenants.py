@@ -0,0 +1,58 @@
+"""
+In-memory cache of compiled per-tenant (per-salon) rule sets.
+
+Tenant rule sets live in Postgres (tenant_rule_sets) with an integer version that is
+bumped on every update. A background poll keeps `versions` (tenant_id -> version) in
+memory, so a request never reads the DB to learn whether its tenant changed: a cached
+CompiledRules is used while its version matches, and is dropped as soon as the poll
+sees a newer one. Entries are evicted least-recently-used beyond max_entries.
+"""
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from rules import CompiledRules
+
+
+class TenantRuleCache:
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self.versions: Dict[str, int] = {}
+        self._entries: "OrderedDict[str, Tuple[int, CompiledRules]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, tenant_id: str) -> Optional[CompiledRules]:
+        entry = self._entries.get(tenant_id)
+        if entry is None or entry[0] != self.versions.get(tenant_id):
+            self.misses += 1
+            return None
+        self._entries.move_to_end(tenant_id)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, tenant_id: str, version: int, compiled: CompiledRules) -> None:
+        self._entries[tenant_id] = (version, compiled)
+        self._entries.move_to_end(tenant_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def set_versions(self, versions: Dict[str, int]) -> None:
+        """Replace the known tenant versions; drop cached rule sets that are stale or deleted."""
+        self.versions = versions
+        for tenant_id in [t for t, (v, _) in self._entries.items() if versions.get(t) != v]:
+            del self._entries[tenant_id]
+            self.invalidations += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "tenants": len(self.versions),
+            "cached": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
@@ -1,6 +1,10 @@
+import base64
+import binascii
+import os
+from typing import Dict, List, Tuple
+
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
-from typing import List
 import numpy as np
 
 
@@ -13,49 +17,115 @@ class ShapeRequest(BaseModel):
     landmarks: List[Landmark]
 
 
+class ShapeBatchRequest(BaseModel):
+    # base64 of a little-endian, C-ordered (count, num_landmarks, 2) array of normalized x, y.
+    data: str
+    count: int
+    num_landmarks: int = 468
+    dtype: str = "float32"
+    include_ratios: bool = True
+
+
 app = FastAPI(title="NYRAA AI Shape Service", version="1.0.0")
 
+REQUIRED_LANDMARKS = [454, 234, 152, 10, 21, 251, 93, 323]
+BATCH_DTYPES = {"float16": "<f2", "float32": "<f4", "float64": "<f8"}
+# Faces per /detect-shape/batch call; larger jobs page through it.
+MAX_BATCH = int(os.getenv("SHAPE_MAX_BATCH", "10000"))
+if MAX_BATCH < 1:
+    raise ValueError("SHAPE_MAX_BATCH must be at least 1")
+
+
+def _measure(points: np.ndarray) -> Dict[str, np.ndarray]:
+    """Jaw, face-height, forehead and cheek distances for an (N, K, 2) landmark array."""
+    def dist(a: int, b: int) -> np.ndarray:
+        return np.linalg.norm(points[:, a] - points[:, b], axis=1)
+
+    return {
+        "jaw_width": dist(454, 234),
+        "face_height": dist(152, 10),
+        "forehead_width": dist(251, 21),
+        "cheek_width": dist(323, 93),
+    }
+
+
+def _classify(m: Dict[str, np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Vectorized face-shape rules. Returns (ratio, face_shape) arrays; rows with zero jaw
+    width get ratio NaN and face_shape None.
+    """
+    jaw, height = m["jaw_width"], m["face_height"]
+    forehead, cheek = m["forehead_width"], m["cheek_width"]
+    valid = jaw > 0.0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = np.where(valid, height / np.where(valid, jaw, 1.0), np.nan)
+
+    face_shape = np.select(
+        [
+            ratio > 1.65,
+            ratio < 1.2,
+            (cheek > forehead) & (cheek > jaw),
+            forehead > jaw * 1.08,
+            ratio > 1.5,
+        ],
+        ["Oblong", "Round", "Diamond", "Heart", "Oval"],
+        default="Square",
+    ).astype(object)
+    face_shape[~valid] = None
+    return ratio, face_shape
+
 
 @app.post("/detect-shape")
 async def detect_shape(payload: ShapeRequest):
     landmarks = payload.landmarks
-    required = [454, 234, 152, 10, 21, 251, 93, 323]
-    if len(landmarks) <= max(required):
+    if len(landmarks) <= max(REQUIRED_LANDMARKS):
         raise HTTPException(status_code=400, detail="Insufficient landmarks provided")
 
-    points = np.array([[lm.x, lm.y] for lm in landmarks], dtype=np.float32)
+    points = np.array([[[lm.x, lm.y] for lm in landmarks]], dtype=np.float32)
+    _, face_shape = _classify(_measure(points))
 
-    jaw_left = points[234]
-    jaw_right = points[454]
-    forehead_top = points[10]
-    chin = points[152]
-    forehead_left = points[21]
-    forehead_right = points[251]
-    cheek_left = points[93]
-    cheek_right = points[323]
-
-    jaw_width = float(np.linalg.norm(jaw_right - jaw_left))
-    face_height = float(np.linalg.norm(chin - forehead_top))
-    forehead_width = float(np.linalg.norm(forehead_right - forehead_left))
-    cheek_width = float(np.linalg.norm(cheek_right - cheek_left))
-
-    if jaw_width == 0.0:
+    if face_shape[0] is None:
         raise HTTPException(status_code=400, detail="Invalid landmark geometry")
 
-    ratio = face_height / jaw_width
+    return {"face_shape": face_shape[0]}
 
-    if ratio > 1.65:
-        face_shape = "Oblong"
-    elif ratio < 1.2:
-        face_shape = "Round"
-    elif cheek_width > forehead_width and cheek_width > jaw_width:
-        face_shape = "Diamond"
-    elif forehead_width > jaw_width * 1.08:
-        face_shape = "Heart"
-    elif ratio > 1.5:
-        face_shape = "Oval"
-    else:
-        face_shape = "Square"
-
-    return {"face_shape": face_shape}
 
+@app.post("/detect-shape/batch")
+async def detect_shape_batch(payload: ShapeBatchRequest):
+    """
+    Classify many faces in one NumPy pass, e.g. to re-classify stored analysis_logs landmarks
+    after a threshold change. Returns one face_shape per face (None for degenerate geometry)
+    and, unless include_ratios is false, the raw distances and height/jaw ratio.
+    """
+    dtype = BATCH_DTYPES.get(payload.dtype)
+    if dtype is None:
+        raise HTTPException(status_code=400, detail=f"dtype must be one of {sorted(BATCH_DTYPES)}")
+    if payload.count < 0 or payload.num_landmarks <= max(REQUIRED_LANDMARKS):
+        raise HTTPException(status_code=400, detail="Insufficient landmarks provided")
+    if payload.count > MAX_BATCH:
+        raise HTTPException(status_code=400, detail=f"count {payload.count} exceeds SHAPE_MAX_BATCH={MAX_BATCH}")
+    try:
+        raw = base64.b64decode(payload.data, validate=True)
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail="data is not valid base64")
+
+    expected = payload.count * payload.num_landmarks * 2 * np.dtype(dtype).itemsize
+    if len(raw) != expected:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Expected {expected} bytes for ({payload.count}, {payload.num_landmarks}, 2) {payload.dtype}, got {len(raw)}",
+        )
+    points = np.frombuffer(raw, dtype=dtype).reshape(payload.count, payload.num_landmarks, 2).astype(np.float32)
+    if not np.isfinite(points).all():
+        raise HTTPException(status_code=400, detail="Landmarks must be finite numbers")
+
+    measures = _measure(points)
+    ratio, face_shape = _classify(measures)
+
+    response = {"count": payload.count, "face_shapes": face_shape.tolist()}
+    if payload.include_ratios:
+        response["ratios"] = {
+            "height_to_jaw": [None if np.isnan(r) else round(float(r), 4) for r in ratio],
+            **{name: np.round(values, 5).tolist() for name, values in measures.items()},
+        }
+    return response
@@ -0,0 +1,50 @@
+"""
+Raw decoded-pixel payload the gateway hands to skin-service and skin-consulting-service
+(SKIN_IMAGE_TRANSPORT=raw): a 20-byte little-endian header (magic, numpy dtype string,
+height, width, channels) followed by uint8 BGR or grey bytes. No encode, no decode, no
+compression loss; meant for services on the same host or network.
+
+This is the only copy of the codec. Each service's image gets it through the "shared"
+build context in docker-compose.yml.
+"""
+import struct
+from typing import Optional
+
+import cv2
+import numpy as np
+
+RAW_IMAGE_MAGIC = b"NYR1"
+RAW_IMAGE_HEADER = struct.Struct("<4s4sIII")  # magic, numpy dtype str, height, width, channels
+RAW_IMAGE_CONTENT_TYPE = "application/x-nyraa-raw"
+
+
+def is_raw_image(data: bytes) -> bool:
+    return data[:4] == RAW_IMAGE_MAGIC
+
+
+def pack_raw_image(image: np.ndarray) -> bytes:
+    """Header + pixel bytes for a uint8 (H, W) or (H, W, C) image."""
+    h, w = image.shape[:2]
+    channels = 1 if image.ndim == 2 else image.shape[2]
+    header = RAW_IMAGE_HEADER.pack(RAW_IMAGE_MAGIC, image.dtype.str.encode().ljust(4), h, w, channels)
+    return header + np.ascontiguousarray(image).tobytes()
+
+
+def unpack_raw_image(data: bytes) -> Optional[np.ndarray]:
+    """Writable (H, W, 3) BGR image from a raw payload; grey is expanded to BGR. None if malformed."""
+    if len(data) < RAW_IMAGE_HEADER.size:
+        return None
+    magic, dtype, h, w, channels = RAW_IMAGE_HEADER.unpack_from(data)
+    expected = h * w * channels
+    if (
+        magic != RAW_IMAGE_MAGIC
+        or dtype.strip() != b"|u1"
+        or channels not in (1, 3)
+        or len(data) - RAW_IMAGE_HEADER.size != expected
+    ):
+        return None
+    # frombuffer over bytes is read-only; downstream OpenCV calls may write in place, so own the pixels.
+    image = np.frombuffer(data, np.uint8, count=expected, offset=RAW_IMAGE_HEADER.size).reshape(h, w, channels)
+    if channels == 1:
+        return cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+    return image.copy()
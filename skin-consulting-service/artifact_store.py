@@ -0,0 +1,85 @@
+"""
+Short-lived in-memory store for rendered images (before/after simulations).
+
+Consult responses carry a URL to each image instead of base64 inside the JSON, and
+GET /artifacts/{artifact_id} serves the encoded bytes. Artifacts are immutable, so they
+can be cached by the browser for their whole lifetime. Entries expire after ttl_s and
+the oldest are evicted beyond max_bytes. Like sessions, artifacts live in process memory.
+"""
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+IMAGE_FORMATS = {
+    # format: (extension, media type, OpenCV quality flag)
+    "webp": (".webp", "image/webp", cv2.IMWRITE_WEBP_QUALITY),
+    "jpeg": (".jpg", "image/jpeg", cv2.IMWRITE_JPEG_QUALITY),
+}
+
+
+def encode_image(image: np.ndarray, fmt: str = "webp", quality: int = 85) -> Tuple[bytes, str]:
+    """Encode a BGR image; returns (bytes, media type). Empty bytes if the image is empty or encoding fails."""
+    ext, media_type, quality_flag = IMAGE_FORMATS[fmt]
+    if image is None or image.size == 0:
+        return b"", media_type
+    ok, buf = cv2.imencode(ext, image, [quality_flag, quality])
+    return (buf.tobytes() if ok else b""), media_type
+
+
+class ArtifactStore:
+    def __init__(self, ttl_s: float = 300.0, max_bytes: int = 128 * 1024 * 1024):
+        self.ttl_s = ttl_s
+        self.max_bytes = max_bytes
+        # artifact_id -> (created, media type, bytes); insertion order is age order
+        self._entries: "OrderedDict[str, Tuple[float, str, bytes]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.served = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def put(self, data: bytes, media_type: str) -> Optional[str]:
+        """Store encoded bytes; returns the artifact id, or None if they exceed the byte budget."""
+        if not data or len(data) > self.max_bytes:
+            return None
+        artifact_id = secrets.token_urlsafe(16)
+        with self._lock:
+            now = time.monotonic()
+            while self._entries:
+                created, _, oldest = next(iter(self._entries.values()))
+                if now - created <= self.ttl_s and self._bytes + len(data) <= self.max_bytes:
+                    break
+                self._entries.popitem(last=False)
+                self._bytes -= len(oldest)
+                if now - created > self.ttl_s:
+                    self.expired += 1
+                else:
+                    self.evictions += 1
+            self._entries[artifact_id] = (now, media_type, data)
+            self._bytes += len(data)
+        return artifact_id
+
+    def get(self, artifact_id: str) -> Optional[Tuple[bytes, str]]:
+        with self._lock:
+            entry = self._entries.get(artifact_id)
+            if entry is None or time.monotonic() - entry[0] > self.ttl_s:
+                return None
+            self.served += 1
+            return entry[2], entry[1]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_s": self.ttl_s,
+                "served": self.served,
+                "expired": self.expired,
+                "evictions": self.evictions,
+            }
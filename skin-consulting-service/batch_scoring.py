@@ -0,0 +1,308 @@
+"""
+Batch skin scoring for recalibration and re-scoring of stored uploads.
+
+Items come from a directory of images or from analysis_logs ids. Logged analyses
+reuse the landmarks stored in analysis_result, so FaceMesh runs only for images
+without them. Items are scored on a process pool with the same analyze_image as
+/consult-staff (quality gate, canonical face, six skin metrics, confidence), except
+that a photo failing the gate is still scored. Rows are streamed to CSV,
+or to a directory of Parquet part files (needs pyarrow). The output doubles as the
+checkpoint: rows are flushed every --checkpoint-every items, and a rerun with the
+same --output skips every item already scored and retries the ones that failed, so
+an item may have an error row followed by its scored row; the last row per key wins.
+
+Usage:
+    python batch_scoring.py --dir /app/uploads --output scores.csv
+    python batch_scoring.py --ids 12 15 100-250 --output scores.csv --workers 8
+    python batch_scoring.py --ids-file ids.txt --output scores_parquet --format parquet
+"""
+import argparse
+import asyncio
+import csv
+import json
+import multiprocessing
+import os
+import sys
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from itertools import islice
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set
+
+import cv2
+
+from consult_pool import analyze_image
+from face_region_extractor import available_cores, extract_face_regions, regions_from_landmarks
+from recommendation_engine import METRICS
+
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "/app/uploads")
+DB_HOST = os.getenv("DB_HOST", "db")
+DB_PORT = int(os.getenv("DB_PORT", "5432"))
+DB_NAME = os.getenv("DB_NAME", "nyraa_ai")
+DB_USER = os.getenv("DB_USER", "nyraa")
+DB_PASSWORD = os.getenv("DB_PASSWORD", "nyraa123")
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".bmp"}
+MIN_STORED_LANDMARKS = 468
+COLUMNS = [
+    "key",
+    "log_id",
+    "path",
+    "landmarks_source",
+    "face_detected",
+    *METRICS,
+    "confidence_score",
+    "manual_review_required",
+    "quality_passed",
+    "quality_issues",
+    "error",
+]
+
+
+@dataclass
+class BatchItem:
+    key: str  # unique per item; what checkpoints record
+    path: str
+    log_id: Optional[int] = None
+    landmarks: Optional[List[Dict[str, float]]] = None
+
+
+def _row(item: BatchItem, **values: Any) -> Dict[str, Any]:
+    row: Dict[str, Any] = {column: None for column in COLUMNS}
+    row.update(key=item.key, log_id=item.log_id, path=item.path, **values)
+    return row
+
+
+def score_item(item: BatchItem) -> Dict[str, Any]:
+    """Score one image. Never raises: failures are reported in the row's error column."""
+    try:
+        image = cv2.imread(item.path, cv2.IMREAD_COLOR)
+        if image is None:
+            return _row(item, error="unreadable image")
+        if item.landmarks and len(item.landmarks) >= MIN_STORED_LANDMARKS:
+            regions, source = regions_from_landmarks(image, item.landmarks), "stored"
+        else:
+            regions, source = extract_face_regions(image), "facemesh"
+        if not regions.face_detected:
+            return _row(item, landmarks_source=source, face_detected=False)
+
+        analysis = analyze_image(image, regions=regions, early_exit=False)
+        confidence, quality = analysis.confidence, analysis.quality
+        return _row(
+            item,
+            landmarks_source=source,
+            face_detected=True,
+            **analysis.scores.to_dict(),
+            confidence_score=confidence.confidence_score,
+            manual_review_required=confidence.manual_review_required,
+            quality_passed=quality.passed,
+            quality_issues=";".join(quality.issues),
+        )
+    except Exception as exc:
+        return _row(item, error=f"{type(exc).__name__}: {exc}")
+
+
+def _init_worker() -> None:
+    # One process per core already; OpenCV's own threads would only oversubscribe.
+    cv2.setNumThreads(1)
+
+
+def score_items(items: Iterable[BatchItem], workers: int = 1) -> Iterator[Dict[str, Any]]:
+    """
+    Yield one row per item, in completion order. With workers > 1, items are scored in
+    spawned processes (one FaceMesh each, created on first use) with a bounded number in flight.
+    """
+    items = iter(items)
+    if workers <= 1:
+        _init_worker()
+        for item in items:
+            yield score_item(item)
+        return
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker) as pool:
+        pending = {pool.submit(score_item, item) for item in islice(items, workers * 4)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+                for item in islice(items, 1):
+                    pending.add(pool.submit(score_item, item))
+
+
+def directory_items(root: str) -> List[BatchItem]:
+    base = Path(root)
+    paths = sorted(p for p in base.rglob("*") if p.is_file() and p.suffix.lower() in IMAGE_EXTENSIONS)
+    return [BatchItem(key=str(p.relative_to(base)), path=str(p)) for p in paths]
+
+
+async def _fetch_logs(ids: List[int]) -> List[Any]:
+    import asyncpg
+
+    conn = await asyncpg.connect(host=DB_HOST, port=DB_PORT, database=DB_NAME, user=DB_USER, password=DB_PASSWORD)
+    try:
+        return await conn.fetch(
+            "SELECT id, image_path, analysis_result -> 'landmarks' AS landmarks "
+            "FROM analysis_logs WHERE id = ANY($1::int[]) ORDER BY id",
+            ids,
+        )
+    finally:
+        await conn.close()
+
+
+def log_items(ids: List[int], upload_dir: str = UPLOAD_DIR) -> List[BatchItem]:
+    """Items for analysis_logs ids, with stored landmarks where the logged result has them."""
+    items = []
+    for record in asyncio.run(_fetch_logs(ids)):
+        landmarks = json.loads(record["landmarks"]) if record["landmarks"] else None
+        path = os.path.join(upload_dir, record["image_path"]) if record["image_path"] else ""
+        items.append(BatchItem(key=f"log:{record['id']}", path=path, log_id=record["id"], landmarks=landmarks))
+    return items
+
+
+def parse_ids(tokens: Iterable[str]) -> List[int]:
+    """Ids and inclusive ranges: ["12", "100-250"]."""
+    ids: List[int] = []
+    for token in tokens:
+        token = token.strip()
+        if not token:
+            continue
+        if "-" in token:
+            start, end = token.split("-", 1)
+            ids.extend(range(int(start), int(end) + 1))
+        else:
+            ids.append(int(token))
+    return sorted(set(ids))
+
+
+class CsvSink:
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._trim_partial_line()
+        is_new = not self.path.exists() or self.path.stat().st_size == 0
+        self._file = open(self.path, "a", newline="")
+        self._writer = csv.DictWriter(self._file, fieldnames=COLUMNS)
+        if is_new:
+            self._writer.writeheader()
+
+    def _trim_partial_line(self) -> None:
+        """Drop a row cut off by a crash, so the file resumes on a line boundary."""
+        if not self.path.exists():
+            return
+        with open(self.path, "rb+") as f:
+            data = f.read()
+            if data and not data.endswith(b"\n"):
+                f.truncate(data.rfind(b"\n") + 1)
+
+    def done_keys(self) -> Set[str]:
+        """Keys of rows written without an error; failed items are scored again on resume."""
+        with open(self.path, newline="") as f:
+            return {row["key"] for row in csv.DictReader(f) if not row["error"]}
+
+    def write(self, rows: List[Dict[str, Any]]) -> None:
+        self._writer.writerows(rows)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class ParquetSink:
+    """A directory of part-NNNNN.parquet files, one per checkpoint; each is written whole, then renamed."""
+
+    def __init__(self, path: str):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise SystemExit("--format parquet needs pyarrow (pip install pyarrow)")
+        self._pa, self._pq = pyarrow, pyarrow.parquet
+        self.schema = self._schema()
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._parts = len(list(self.path.glob("part-*.parquet")))
+
+    def _schema(self) -> Any:
+        """One fixed schema for every part, so a part of only errors or no-face rows has no null-typed columns."""
+        pa = self._pa
+        types = {
+            "log_id": pa.int64(),
+            "face_detected": pa.bool_(),
+            "confidence_score": pa.float64(),
+            "manual_review_required": pa.bool_(),
+            "quality_passed": pa.bool_(),
+            **{metric: pa.float64() for metric in METRICS},
+        }
+        return pa.schema([(column, types.get(column, pa.string())) for column in COLUMNS])
+
+    def done_keys(self) -> Set[str]:
+        """As CsvSink.done_keys: error rows do not count as done."""
+        keys: Set[str] = set()
+        for part in self.path.glob("part-*.parquet"):
+            table = self._pq.read_table(part, columns=["key", "error"]).to_pydict()
+            keys.update(key for key, error in zip(table["key"], table["error"]) if not error)
+        return keys
+
+    def write(self, rows: List[Dict[str, Any]]) -> None:
+        table = self._pa.Table.from_pylist(rows, schema=self.schema)
+        final = self.path / f"part-{self._parts:05d}.parquet"
+        tmp = final.with_suffix(".tmp")
+        self._pq.write_table(table, tmp)
+        os.replace(tmp, final)
+        self._parts += 1
+
+    def close(self) -> None:
+        pass
+
+
+def run_batch(items: List[BatchItem], sink: Any, workers: int, checkpoint_every: int = 100) -> Dict[str, int]:
+    """Score every item not already in sink, writing rows in checkpoint_every batches."""
+    done = sink.done_keys()
+    todo = [item for item in items if item.key not in done]
+    stats = {"total": len(items), "skipped": len(items) - len(todo), "scored": 0, "errors": 0}
+    buffer: List[Dict[str, Any]] = []
+    try:
+        for row in score_items(todo, workers):
+            buffer.append(row)
+            stats["scored"] += 1
+            stats["errors"] += bool(row["error"])
+            if len(buffer) >= checkpoint_every:
+                sink.write(buffer)
+                buffer = []
+    finally:
+        if buffer:
+            sink.write(buffer)
+        sink.close()
+    return stats
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--dir", help="score every image under this directory")
+    source.add_argument("--ids", nargs="+", help="analysis_logs ids or ranges (100-250)")
+    source.add_argument("--ids-file", help="file with one analysis_logs id or range per line")
+    parser.add_argument("--output", required=True, help="CSV file, or directory for --format parquet")
+    parser.add_argument("--format", choices=("csv", "parquet"), default="csv")
+    parser.add_argument("--workers", type=int, default=available_cores())
+    parser.add_argument("--checkpoint-every", type=int, default=100, help="rows per flush to the output")
+    parser.add_argument("--upload-dir", default=UPLOAD_DIR, help="where analysis_logs image_path is stored")
+    args = parser.parse_args()
+
+    if args.dir:
+        items = directory_items(args.dir)
+    else:
+        tokens = args.ids or Path(args.ids_file).read_text().split()
+        items = log_items(parse_ids(tokens), args.upload_dir)
+    if not items:
+        print("Nothing to score", file=sys.stderr)
+        return 1
+
+    sink = ParquetSink(args.output) if args.format == "parquet" else CsvSink(args.output)
+    stats = run_batch(items, sink, args.workers, max(1, args.checkpoint_every))
+    print(json.dumps(stats))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
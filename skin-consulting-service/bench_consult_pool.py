@@ -0,0 +1,103 @@
+"""
+Throughput of the consult pool at several worker counts.
+
+Runs ConsultPool.analyze (FaceMesh, canonical face, quality gate, scoring, confidence)
+on the given images with a fixed number of concurrent consults and prints one line of
+consults/s and latency per worker count. 0 workers is the in-process thread mode.
+Run it on the target machine (or inside the container with its CPU limit): the result
+depends on the cores actually available, which the last column reports.
+
+Usage:
+    python bench_consult_pool.py photos/ --workers 0 1 2 4 --requests 200
+    python bench_consult_pool.py photos/ --workers 4 --concurrency 16 --json
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import cv2
+import numpy as np
+
+from consult_pool import ConsultPool
+from face_region_extractor import available_cores
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".bmp"}
+
+
+def load_images(root: str, limit: int) -> List[np.ndarray]:
+    paths = sorted(p for p in Path(root).rglob("*") if p.is_file() and p.suffix.lower() in IMAGE_EXTENSIONS)
+    images = [cv2.imread(str(p), cv2.IMREAD_COLOR) for p in paths[:limit]]
+    return [image for image in images if image is not None]
+
+
+async def _drive(pool: ConsultPool, images: List[np.ndarray], requests: int, concurrency: int) -> List[float]:
+    latencies: List[float] = []
+    next_index = 0
+
+    async def client() -> None:
+        nonlocal next_index
+        while next_index < requests:
+            image = images[next_index % len(images)]
+            next_index += 1
+            started = time.perf_counter()
+            await pool.analyze(image)
+            latencies.append((time.perf_counter() - started) * 1000.0)
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return latencies
+
+
+def bench(images: List[np.ndarray], workers: int, requests: int, concurrency: int) -> Dict[str, Any]:
+    pool = ConsultPool(workers, max_queue=concurrency)
+    pool.start()
+    try:
+        asyncio.run(_drive(pool, images, min(len(images), concurrency), concurrency))  # first-use costs
+        started = time.perf_counter()
+        latencies = asyncio.run(_drive(pool, images, requests, concurrency))
+        elapsed = time.perf_counter() - started
+    finally:
+        pool.shutdown()
+    return {
+        "workers": workers,
+        "requests": requests,
+        "concurrency": concurrency,
+        "consults_per_s": round(requests / elapsed, 2),
+        "latency_ms_p50": round(float(np.percentile(latencies, 50)), 1),
+        "latency_ms_p95": round(float(np.percentile(latencies, 95)), 1),
+        "cores": available_cores(),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("images", help="directory of face photos")
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, 1, 2, 4])
+    parser.add_argument("--requests", type=int, default=200, help="consults per worker count")
+    parser.add_argument("--concurrency", type=int, default=8, help="consults in flight")
+    parser.add_argument("--max-images", type=int, default=50)
+    parser.add_argument("--json", action="store_true", help="one JSON object per line")
+    args = parser.parse_args()
+
+    images = load_images(args.images, args.max_images)
+    if not images:
+        print(f"No readable images under {args.images}", file=sys.stderr)
+        return 1
+    for workers in args.workers:
+        result = bench(images, workers, max(1, args.requests), max(1, args.concurrency))
+        if args.json:
+            print(json.dumps(result))
+        else:
+            print(
+                f"workers={result['workers']:<3} {result['consults_per_s']:>8.2f} consults/s  "
+                f"p50 {result['latency_ms_p50']:>7.1f} ms  p95 {result['latency_ms_p95']:>7.1f} ms  "
+                f"({result['cores']} cores available)"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
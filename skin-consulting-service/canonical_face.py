@@ -0,0 +1,115 @@
+"""
+Resolution normalization for skin scoring. The face is cropped around its landmarks
+and resized so the outer eye corners are CANONICAL_IOD_PX apart, whatever the camera
+or upload resolution. Scoring then costs about the same per request, and scale-
+dependent metrics (Laplacian variance, edge density, pixel-padded landmark boxes)
+are comparable across uploads. The Laplacian-variance thresholds in skin_scoring and
+confidence_engine were tuned at upload resolution; laplacian_threshold carries them to
+the scale they are measured at until they are recalibrated on canonical crops.
+Simulations keep rendering the original crop.
+"""
+import math
+import os
+from dataclasses import dataclass
+from typing import Dict, List
+
+import cv2
+import numpy as np
+
+from face_region_extractor import FaceRegions
+
+CANONICAL_IOD_PX = float(os.getenv("CANONICAL_IOD_PX", "128"))
+# Context around the landmark box, as a fraction of the box size per side.
+CANONICAL_PADDING = 0.12
+# Laplacian-variance thresholds (gate sharpness, blur score, texture) were tuned on uploads
+# with about THRESHOLD_TUNED_IOD_PX between the eye corners. Until they are recalibrated on
+# canonical crops, they are scaled as variance ~ (crop IOD) ** -LAPLACIAN_SCALE_EXPONENT.
+# Shrinking a natural-image (1/f spectrum) texture with INTER_AREA gives an exponent of 2-2.7,
+# so 2 errs towards passing photos; enlarging adds no detail and falls off closer to ** -4.
+# CANONICAL_THRESHOLDS=0 applies the tuned values unchanged, as before.
+THRESHOLD_TUNED_IOD_PX = float(os.getenv("THRESHOLD_TUNED_IOD_PX", "256"))
+LAPLACIAN_SCALE_EXPONENT = 2.0
+CANONICAL_THRESHOLDS = os.getenv("CANONICAL_THRESHOLDS", "1") == "1"
+# MediaPipe FaceMesh outer eye corners
+LEFT_EYE_OUTER = 33
+RIGHT_EYE_OUTER = 263
+
+
+@dataclass
+class CanonicalFace:
+    image: np.ndarray  # canonical face crop; also the "full image" for landmark-based metrics
+    regions: FaceRegions  # landmarks normalized to image, crop_bounds covering all of it
+    scale: float  # canonical px per source px
+    iod_px: float = 0.0  # inter-ocular distance in the upload (0 without eye landmarks)
+
+    @property
+    def crop_iod_px(self) -> float:
+        """Inter-ocular distance in this crop, what its Laplacian-variance thresholds are scaled to."""
+        return self.iod_px * self.scale
+
+
+def laplacian_threshold(value: float, iod_px: float = CANONICAL_IOD_PX) -> float:
+    """A Laplacian-variance threshold tuned at upload resolution, for a crop with iod_px between the eyes."""
+    if not CANONICAL_THRESHOLDS or iod_px <= 0:
+        return value
+    return value * (THRESHOLD_TUNED_IOD_PX / iod_px) ** LAPLACIAN_SCALE_EXPONENT
+
+
+def _inter_ocular_px(landmarks: List[Dict[str, float]], h: int, w: int) -> float:
+    if len(landmarks) <= max(LEFT_EYE_OUTER, RIGHT_EYE_OUTER):
+        return 0.0
+    left, right = landmarks[LEFT_EYE_OUTER], landmarks[RIGHT_EYE_OUTER]
+    return math.hypot((right["x"] - left["x"]) * w, (right["y"] - left["y"]) * h)
+
+
+def canonicalize(
+    image: np.ndarray, regions: FaceRegions, iod_px: float = CANONICAL_IOD_PX, upscale: bool = True
+) -> CanonicalFace:
+    """
+    Crop the face (landmark box plus CANONICAL_PADDING) and resize it to iod_px between
+    the eyes, the canonical inter-ocular distance by default. upscale=False only ever
+    shrinks: smaller faces keep their upload size. Without usable eye landmarks the input
+    is returned unscaled.
+    """
+    h, w = image.shape[:2]
+    landmarks = regions.landmarks
+    iod = _inter_ocular_px(landmarks, h, w)
+    if iod < 1.0:
+        return CanonicalFace(image=image, regions=regions, scale=1.0, iod_px=iod)
+
+    xs = [lm["x"] * w for lm in landmarks]
+    ys = [lm["y"] * h for lm in landmarks]
+    pad_x = CANONICAL_PADDING * (max(xs) - min(xs))
+    pad_y = CANONICAL_PADDING * (max(ys) - min(ys))
+    x_min = max(0, int(min(xs) - pad_x))
+    x_max = min(w, int(math.ceil(max(xs) + pad_x)))
+    y_min = max(0, int(min(ys) - pad_y))
+    y_max = min(h, int(math.ceil(max(ys) + pad_y)))
+    if x_max <= x_min or y_max <= y_min:
+        x_min, y_min, x_max, y_max = 0, 0, w, h
+
+    scale = iod_px / iod if upscale else min(1.0, iod_px / iod)
+    crop_w, crop_h = x_max - x_min, y_max - y_min
+    size = (max(1, round(crop_w * scale)), max(1, round(crop_h * scale)))
+    if size == (crop_w, crop_h):
+        canonical = image[y_min:y_max, x_min:x_max].copy()
+    else:
+        # INTER_AREA when shrinking: averaging, not sampling, so fine texture does not alias.
+        interpolation = cv2.INTER_AREA if scale < 1.0 else cv2.INTER_LINEAR
+        canonical = cv2.resize(image[y_min:y_max, x_min:x_max], size, interpolation=interpolation)
+
+    canonical_landmarks = [
+        {**lm, "x": (lm["x"] * w - x_min) / crop_w, "y": (lm["y"] * h - y_min) / crop_h} for lm in landmarks
+    ]
+    return CanonicalFace(
+        image=canonical,
+        regions=FaceRegions(
+            face_detected=True,
+            landmarks=canonical_landmarks,
+            face_crop=canonical,
+            crop_bounds={"x_min": 0, "y_min": 0, "x_max": size[0], "y_max": size[1]},
+            image_shape=(size[1], size[0]),
+        ),
+        scale=scale,
+        iod_px=iod,
+    )
@@ -1,14 +1,28 @@
 """
 Confidence scoring for skin analysis. Reduces score for uneven lighting, blur,
 partial face, or small skin region. Returns manual_review_required if < 60.
+check_quality is the cheap pre-scoring gate for photos that are not worth analysing.
 """
-from dataclasses import dataclass
-from typing import List, Dict
+import os
+from dataclasses import dataclass, field
+from typing import List, Dict, Optional
 
 import cv2
 import numpy as np
 
+from canonical_face import CANONICAL_IOD_PX, laplacian_threshold
 from face_region_extractor import FaceRegions
+from image_planes import ImagePlanes
+
+
+# Quality gate: looser than the confidence weights, so only clearly unusable photos are stopped.
+# It runs on the face shrunk to QUALITY_GATE_IOD_PX between the eyes (never enlarged).
+QUALITY_GATE_IOD_PX = float(os.getenv("QUALITY_GATE_IOD_PX", "64"))
+QUALITY_MIN_IOD_PX = float(os.getenv("QUALITY_MIN_IOD_PX", "40"))
+# Laplacian variance as tuned at upload resolution; compared after laplacian_threshold
+QUALITY_MIN_SHARPNESS = float(os.getenv("QUALITY_MIN_SHARPNESS", "60"))
+QUALITY_MAX_LIGHTING_STD = float(os.getenv("QUALITY_MAX_LIGHTING_STD", "20"))  # std of quadrant mean L
+QUALITY_MIN_BRIGHTNESS = float(os.getenv("QUALITY_MIN_BRIGHTNESS", "35"))  # mean skin L (0-255)
 
 
 @dataclass
@@ -17,38 +31,61 @@ class ConfidenceResult:
     manual_review_required: bool
 
 
-def _blur_score(face_crop: np.ndarray) -> float:
+@dataclass
+class QualityReport:
+    passed: bool
+    issues: List[str] = field(default_factory=list)
+    metrics: Dict[str, float] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, object]:
+        return {"passed": self.passed, "issues": self.issues, "metrics": self.metrics}
+
+
+def _blur_score(planes: Optional[ImagePlanes], crop_iod_px: float = CANONICAL_IOD_PX) -> float:
     """Laplacian variance as sharpness; low = blur. Return 0-1 (1 = sharp)."""
-    if face_crop is None or face_crop.size == 0:
+    if planes is None:
         return 0.0
-    gray = cv2.cvtColor(face_crop, cv2.COLOR_BGR2GRAY)
-    lap = cv2.Laplacian(gray, cv2.CV_64F)
-    var = np.var(lap)
-    # Typical: < 100 blurry, 100-500 ok, > 500 sharp
-    return float(np.clip((var - 50) / 450.0, 0.0, 1.0))
+    var = planes.laplacian_variance
+    # Typical at upload resolution: < 100 blurry, 100-500 ok, > 500 sharp; scaled to the crop.
+    low, high = laplacian_threshold(50.0, crop_iod_px), laplacian_threshold(500.0, crop_iod_px)
+    return float(np.clip((var - low) / (high - low), 0.0, 1.0))
 
 
-def _lighting_uniformity(face_crop: np.ndarray) -> float:
-    """Split face in quadrants; compare mean L. High variance = uneven. Return 0-1 (1 = even)."""
-    if face_crop is None or face_crop.size == 0:
+def _lighting_uniformity(planes: Optional[ImagePlanes]) -> float:
+    """Split face in quadrants; compare mean L of skin. High variance = uneven. Return 0-1 (1 = even)."""
+    if planes is None:
         return 0.0
-    h, w = face_crop.shape[:2]
+    h, w = planes.bgr.shape[:2]
     if h < 20 or w < 20:
         return 0.0
-    lab = cv2.cvtColor(face_crop, cv2.COLOR_BGR2LAB)
-    l_ch = lab[:, :, 0]
+    return float(np.clip(1.0 - _lighting_std(planes) / 20.0, 0.0, 1.0))
+
+
+def _lighting_std(planes: ImagePlanes) -> float:
+    """Std of the four quadrants' mean skin L; 0 = perfectly even."""
+    h, w = planes.bgr.shape[:2]
+    l_ch = planes.lightness
+    mask = planes.skin_mask
     mid_y, mid_x = h // 2, w // 2
-    q1 = np.mean(l_ch[:mid_y, :mid_x])
-    q2 = np.mean(l_ch[:mid_y, mid_x:])
-    q3 = np.mean(l_ch[mid_y:, :mid_x])
-    q4 = np.mean(l_ch[mid_y:, mid_x:])
-    std = np.std([q1, q2, q3, q4])
+    quadrants = [
+        (slice(None, mid_y), slice(None, mid_x)),
+        (slice(None, mid_y), slice(mid_x, None)),
+        (slice(mid_y, None), slice(None, mid_x)),
+        (slice(mid_y, None), slice(mid_x, None)),
+    ]
+    means = []
+    for rows, cols in quadrants:
+        # Skin pixels only, unless a quadrant has (almost) none
+        q_mask = mask[rows, cols] if mask is not None else None
+        if q_mask is not None and cv2.countNonZero(q_mask) < 50:
+            q_mask = None
+        means.append(cv2.mean(l_ch[rows, cols], mask=q_mask)[0])
     # std 0 = perfect, > 15 = quite uneven
-    return float(np.clip(1.0 - std / 20.0, 0.0, 1.0))
+    return float(np.std(means))
 
 
 def _face_completeness(regions: FaceRegions) -> float:
-    """Heuristic: enough landmarks and reasonable crop size. 0-1."""
+    """Heuristic: enough landmarks and reasonable crop size (as uploaded, not canonical). 0-1."""
     if not regions.face_detected or not regions.landmarks:
         return 0.0
     n_landmarks = len(regions.landmarks)
@@ -76,17 +113,26 @@ def _skin_region_size(regions: FaceRegions) -> float:
     return float(np.clip((area - 2500) / 87500.0, 0.0, 1.0))
 
 
-def compute_confidence(image: np.ndarray, regions: FaceRegions) -> ConfidenceResult:
+def compute_confidence(
+    image: np.ndarray,
+    regions: FaceRegions,
+    planes: Optional[ImagePlanes] = None,
+    crop_iod_px: float = CANONICAL_IOD_PX,
+) -> ConfidenceResult:
     """
     Combine blur, lighting uniformity, face completeness, and region size
     into a 0-100 confidence score. If < 60, set manual_review_required.
+    regions is the uploaded face (size checks); planes may hold the canonical or gate crop
+    (blur, lighting), with crop_iod_px between the eyes.
     """
     if not regions.face_detected:
         return ConfidenceResult(confidence_score=0.0, manual_review_required=True)
 
     face_crop = regions.face_crop
-    blur = _blur_score(face_crop) if face_crop is not None else 0.0
-    lighting = _lighting_uniformity(face_crop) if face_crop is not None else 0.0
+    if planes is None:
+        planes = ImagePlanes.for_face(regions)
+    blur = _blur_score(planes, crop_iod_px)
+    lighting = _lighting_uniformity(planes)
     completeness = _face_completeness(regions)
     size = _skin_region_size(regions) if face_crop is not None else 0.0
 
@@ -97,3 +143,32 @@ def compute_confidence(image: np.ndarray, regions: FaceRegions) -> ConfidenceRes
         confidence_score=score,
         manual_review_required=score < 60.0,
     )
+
+
+def check_quality(
+    iod_px: float, planes: Optional[ImagePlanes], crop_iod_px: float = QUALITY_GATE_IOD_PX
+) -> QualityReport:
+    """
+    Cheap gate run before scoring: face size (inter-ocular distance in the upload),
+    sharpness, lighting evenness and exposure on the planes of a small face crop with
+    crop_iod_px between the eyes. issues lists every failed check.
+    """
+    if planes is None:
+        return QualityReport(passed=False, issues=["no_face_crop"])
+    h, w = planes.bgr.shape[:2]
+    metrics = {
+        "inter_ocular_px": round(iod_px, 1),
+        "sharpness": round(planes.laplacian_variance, 1),
+        "lighting_std": round(_lighting_std(planes), 1) if h >= 20 and w >= 20 else 0.0,
+        "brightness": round(planes.masked_mean(planes.lightness), 1),
+    }
+    issues = []
+    if 0 < iod_px < QUALITY_MIN_IOD_PX:
+        issues.append("face_too_small")
+    if metrics["sharpness"] < laplacian_threshold(QUALITY_MIN_SHARPNESS, crop_iod_px):
+        issues.append("blurry")
+    if metrics["lighting_std"] > QUALITY_MAX_LIGHTING_STD:
+        issues.append("uneven_lighting")
+    if metrics["brightness"] < QUALITY_MIN_BRIGHTNESS:
+        issues.append("too_dark")
+    return QualityReport(passed=not issues, issues=issues, metrics=metrics)
@@ -0,0 +1,278 @@
+"""
+Process pool for the CPU-bound part of a consult: FaceMesh, canonical face, quality
+gate, skin scores, confidence and region luminance.
+
+Handlers are async, but OpenCV and MediaPipe hold the GIL for much of their work, so
+threads in one uvicorn worker serialize consults. ConsultPool runs analyze_image in
+CONSULT_WORKERS spawned processes. Each worker loads and warms its own FaceMesh at
+start-up. The decoded image is copied once into a shared-memory block that the worker
+maps, instead of being pickled through the executor's pipe. Only the small result
+(landmarks, scores, reports) comes back. The parent keeps the image and rebuilds the
+face crop from the landmarks for sessions and simulations. At most CONSULT_QUEUE_DEPTH
+consults may be running or waiting; beyond that, analyze raises ConsultPoolBusy.
+If a worker dies (OOM kill, native crash), the executor is broken for good: the pool
+rebuilds and re-warms it in the background and raises ConsultPoolUnavailable until
+it is back, or for good if the rebuild fails (status "failed").
+With CONSULT_WORKERS=0 the same analysis runs on a thread in this process.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from multiprocessing import shared_memory
+from typing import Any, Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from canonical_face import canonicalize
+from confidence_engine import (
+    QUALITY_GATE_IOD_PX,
+    ConfidenceResult,
+    QualityReport,
+    check_quality,
+    compute_confidence,
+)
+from face_region_extractor import FaceRegions, extract_face_regions, regions_from_landmarks
+from image_planes import ImagePlanes
+from skin_scoring import SkinScores, compute_region_luminance, compute_skin_scores
+
+
+logger = logging.getLogger(__name__)
+
+
+class ConsultPoolBusy(Exception):
+    """Raised when CONSULT_QUEUE_DEPTH consults are already running or waiting."""
+
+
+class ConsultPoolUnavailable(Exception):
+    """Raised while the workers are being rebuilt after a crash, or after the rebuild failed."""
+
+
+@dataclass
+class FaceAnalysis:
+    regions: FaceRegions
+    quality: Optional[QualityReport] = None  # None when the gate was not run
+    confidence: Optional[ConfidenceResult] = None
+    scores: Optional[SkinScores] = None  # None without a face, after a gate rejection, or when not requested
+    region_luminance: Dict[str, Dict[str, float]] = field(default_factory=dict)
+
+    @property
+    def rejected(self) -> bool:
+        return self.quality is not None and not self.quality.passed
+
+
+def analyze_image(
+    image: np.ndarray,
+    gate: bool = True,
+    score: bool = True,
+    staff: bool = True,
+    regions: Optional[FaceRegions] = None,
+    early_exit: bool = True,
+) -> FaceAnalysis:
+    """
+    Detect the face and, unless the quality gate (gate=True) rejects the photo, normalize
+    it to the canonical size and score it. staff=False skips confidence and region luminance.
+    regions already known for this image (stored landmarks) skip FaceMesh. early_exit=False
+    scores a rejected photo anyway, keeping the gate's report (batch re-scoring).
+    """
+    if regions is None:
+        regions = extract_face_regions(image)
+    if not regions.face_detected:
+        return FaceAnalysis(regions=regions)
+    analysis = FaceAnalysis(regions=regions)
+    if gate:
+        # The gate looks at a shrunken crop; a rejected photo never builds the canonical face.
+        small = canonicalize(image, regions, QUALITY_GATE_IOD_PX, upscale=False)
+        small_planes = ImagePlanes.for_face(small.regions)
+        analysis.quality = check_quality(small.iod_px, small_planes, small.crop_iod_px)
+        if analysis.rejected and early_exit:
+            analysis.confidence = compute_confidence(image, regions, small_planes, small.crop_iod_px)
+            return analysis
+    if not (score or staff):
+        return analysis
+    face = canonicalize(image, regions)
+    planes = ImagePlanes.for_face(face.regions)
+    if staff:
+        # Blur and lighting come from the canonical planes; face-size checks from the uploaded crop.
+        analysis.confidence = compute_confidence(image, regions, planes, face.crop_iod_px)
+    if not score:
+        return analysis
+    analysis.scores = compute_skin_scores(face.image, face.regions, planes)
+    if staff:
+        analysis.region_luminance = compute_region_luminance(face.image, face.regions, planes)
+    return analysis
+
+
+def _init_worker() -> None:
+    # One process per core: OpenCV's own thread pool would only oversubscribe.
+    cv2.setNumThreads(1)
+    warm_up()
+
+
+def warm_up() -> None:
+    """Create this process's FaceMesh and run it and scoring once on a synthetic frame."""
+    image = np.full((256, 256, 3), 128, dtype=np.uint8)
+    extract_face_regions(image)
+    regions = FaceRegions(
+        face_detected=True,
+        landmarks=[],
+        face_crop=image,
+        crop_bounds={"x_min": 0, "y_min": 0, "x_max": 256, "y_max": 256},
+        image_shape=(256, 256),
+    )
+    planes = ImagePlanes.for_face(regions)
+    compute_skin_scores(image, regions, planes)
+    compute_confidence(image, regions, planes)
+
+
+def _worker_pid() -> int:
+    return os.getpid()
+
+
+def _analyze_shared(name: str, shape: Tuple[int, ...], kwargs: Dict[str, Any]) -> FaceAnalysis:
+    """Worker side: map the parent's image, analyze it, and return the result without the pixels."""
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        analysis = analyze_image(np.ndarray(shape, dtype=np.uint8, buffer=block.buf), **kwargs)
+        analysis.regions.face_crop = None  # the parent rebuilds it from its own copy of the image
+        return analysis
+    finally:
+        try:
+            block.close()
+        except BufferError:
+            pass  # a failed analysis' traceback still references the buffer; it is unmapped with it
+
+
+class ConsultPool:
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = max(0, workers)
+        self.max_queue = max(1, max_queue)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.status = "starting"  # starting | ready | restarting | failed | stopped
+        self.restarts = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.busy_rejections = 0
+        self.latency_ms_total = 0.0
+        self.latency_ms_max = 0.0
+
+    def start(self) -> None:
+        """Start the worker processes and wait until every one has loaded and warmed FaceMesh (blocking)."""
+        if self.workers == 0:
+            warm_up()
+        else:
+            self._executor = self._new_executor()
+        self.status = "ready"
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+        )
+        try:
+            # Workers start on demand; with none idle, each submission starts one, and its initializer warms it first.
+            for future in [executor.submit(_worker_pid) for _ in range(self.workers)]:
+                future.result()
+        except BaseException:
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        return executor
+
+    def _restart(self, broken: ProcessPoolExecutor) -> None:
+        """Replace a broken executor once, however many consults saw it break."""
+        with self._lock:
+            if self._executor is not broken or self.status != "ready":
+                return
+            self.status = "restarting"
+        logger.error("consult worker died; rebuilding the pool of %d workers", self.workers)
+        threading.Thread(target=self._rebuild, args=(broken,), name="consult-pool-rebuild", daemon=True).start()
+
+    def _rebuild(self, broken: ProcessPoolExecutor) -> None:
+        broken.shutdown(wait=False, cancel_futures=True)
+        try:
+            executor = self._new_executor()
+        except Exception:
+            logger.exception("consult pool rebuild failed")
+            with self._lock:
+                self.status = "failed"
+            return
+        with self._lock:
+            if self.status == "stopped":
+                executor.shutdown(wait=False, cancel_futures=True)
+                return
+            self._executor = executor
+            self.restarts += 1
+            self.status = "ready"
+        logger.info("consult pool rebuilt (%d restarts)", self.restarts)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            self.status = "stopped"
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _enter(self) -> None:
+        with self._lock:
+            if self.status in ("restarting", "failed", "stopped"):
+                raise ConsultPoolUnavailable(f"consult workers are {self.status}")
+            if self.in_flight >= self.max_queue:
+                self.busy_rejections += 1
+                raise ConsultPoolBusy(f"{self.in_flight} consults in progress")
+            self.in_flight += 1
+
+    def _exit(self, started: float) -> None:
+        elapsed = (time.perf_counter() - started) * 1000.0
+        with self._lock:
+            self.in_flight -= 1
+            self.completed += 1
+            self.latency_ms_total += elapsed
+            self.latency_ms_max = max(self.latency_ms_max, elapsed)
+
+    async def analyze(self, image: np.ndarray, **kwargs: Any) -> FaceAnalysis:
+        """analyze_image on a worker process (or a thread with CONSULT_WORKERS=0); see analyze_image for kwargs."""
+        self._enter()
+        started = time.perf_counter()
+        try:
+            executor = self._executor
+            if executor is None:
+                return await asyncio.to_thread(analyze_image, image, **kwargs)
+            block = shared_memory.SharedMemory(create=True, size=max(1, image.nbytes))
+            try:
+                np.ndarray(image.shape, dtype=np.uint8, buffer=block.buf)[...] = image
+                future = executor.submit(_analyze_shared, block.name, image.shape, kwargs)
+                analysis = await asyncio.wrap_future(future)
+            except BrokenProcessPool as exc:
+                self._restart(executor)
+                raise ConsultPoolUnavailable("a consult worker died; restarting workers") from exc
+            finally:
+                block.close()
+                block.unlink()
+            if analysis.regions.face_detected:
+                analysis.regions = regions_from_landmarks(image, analysis.regions.landmarks)
+            return analysis
+        finally:
+            self._exit(started)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "mode": "processes" if self.workers else "threads",
+                "status": self.status,
+                "workers": self.workers,
+                "restarts": self.restarts,
+                "max_queue": self.max_queue,
+                "in_flight": self.in_flight,
+                "completed": self.completed,
+                "busy_rejections": self.busy_rejections,
+                "latency_ms_mean": round(self.latency_ms_total / self.completed, 1) if self.completed else 0.0,
+                "latency_ms_max": round(self.latency_ms_max, 1),
+            }
@@ -1,14 +1,26 @@
 """
 Face detection and region extraction using MediaPipe FaceMesh.
 Produces face crop and landmark indices for under-eye and cheek regions.
+FaceMesh instances are pooled and reused across requests (one graph load per instance).
 """
+import math
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
 from dataclasses import dataclass
-from typing import List, Dict, Any, Optional
+from typing import TYPE_CHECKING, List, Dict, Any, Iterator, Optional
 
 import cv2
 import numpy as np
 import mediapipe as mp
 
+from region_stats import landmark_rect
+
+if TYPE_CHECKING:
+    from image_planes import ImagePlanes
+
 
 # MediaPipe FaceMesh region indices (468 landmarks)
 UNDER_EYE_LEFT = [243, 112, 26, 23, 24, 110, 25, 31, 228, 229, 230, 231, 232, 233]
@@ -18,6 +30,20 @@ CHEEK_RIGHT = [454, 323]
 # Upper lip / chin for facial hair density
 UPPER_LIP = [61, 185, 40, 39, 37, 0, 267, 269, 270, 409, 291]
 LOWER_FACE = [152, 148, 176, 149, 150, 136, 172, 58, 132, 93, 234, 127, 162, 21, 54, 103, 67, 109]
+# Forehead band above the brows and the nose bridge/tip; together they form the T-zone
+FOREHEAD = [10, 109, 67, 103, 104, 69, 108, 151, 337, 299, 333, 297, 338]
+NOSE = [168, 6, 197, 195, 5, 4, 1, 45, 275, 48, 278]
+# Ordered contours for the skin mask: face oval minus eyes, brows and lips
+FACE_OVAL = [
+    10, 338, 297, 332, 284, 251, 389, 356, 454, 323, 361, 288, 397, 365, 379, 378, 400, 377,
+    152, 148, 176, 149, 150, 136, 172, 58, 132, 93, 234, 127, 162, 21, 54, 103, 67, 109,
+]
+LEFT_EYE = [33, 246, 161, 160, 159, 158, 157, 173, 133, 155, 154, 153, 145, 144, 163, 7]
+RIGHT_EYE = [263, 466, 388, 387, 386, 385, 384, 398, 362, 382, 381, 380, 374, 373, 390, 249]
+LEFT_BROW = [70, 63, 105, 66, 107, 55, 65, 52, 53, 46]
+RIGHT_BROW = [300, 293, 334, 296, 336, 285, 295, 282, 283, 276]
+LIPS = [61, 185, 40, 39, 37, 0, 267, 269, 270, 409, 291, 375, 321, 405, 314, 17, 84, 181, 91, 146]
+SKIN_EXCLUDE = [LEFT_EYE, RIGHT_EYE, LEFT_BROW, RIGHT_BROW, LIPS]
 
 
 @dataclass
@@ -29,6 +55,148 @@ class FaceRegions:
     image_shape: tuple  # (h, w)
 
 
+class FaceMeshPool:
+    """
+    Fixed-size pool of static-image FaceMesh instances. A FaceMesh is not safe for
+    concurrent process() calls, so each caller checks one out exclusively; callers
+    beyond the pool size wait for an instance to be returned.
+    """
+
+    def __init__(self, size: int, max_num_faces: int = 1):
+        self.size = max(1, size)
+        self.max_num_faces = max_num_faces
+        self._idle: "queue.Queue[Any]" = queue.Queue()
+        self._all: List[Any] = []
+        self._lock = threading.Lock()
+        self.load_ms: List[float] = []
+        self.inference_count = 0
+        self.inference_ms_total = 0.0
+        self.inference_ms_max = 0.0
+
+    def _create(self) -> Any:
+        started = time.perf_counter()
+        mesh = mp.solutions.face_mesh.FaceMesh(static_image_mode=True, max_num_faces=self.max_num_faces)
+        self.load_ms.append(round((time.perf_counter() - started) * 1000.0, 1))
+        self._all.append(mesh)
+        return mesh
+
+    def fill(self) -> None:
+        """Create every instance up front (startup), so no request pays a graph load."""
+        with self._lock:
+            while len(self._all) < self.size:
+                self._idle.put(self._create())
+
+    def warm(self, rgb: np.ndarray) -> None:
+        """Run every instance once (startup only, before traffic) to finish graph initialization."""
+        with self._lock:
+            meshes = list(self._all)
+        for mesh in meshes:
+            mesh.process(rgb)
+
+    @contextmanager
+    def acquire(self) -> Iterator[Any]:
+        try:
+            mesh = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                mesh = self._create() if len(self._all) < self.size else None
+            if mesh is None:
+                mesh = self._idle.get()
+        try:
+            yield mesh
+        finally:
+            self._idle.put(mesh)
+
+    def process(self, rgb: np.ndarray) -> Any:
+        with self.acquire() as mesh:
+            started = time.perf_counter()
+            results = mesh.process(rgb)
+            elapsed = (time.perf_counter() - started) * 1000.0
+        with self._lock:
+            self.inference_count += 1
+            self.inference_ms_total += elapsed
+            self.inference_ms_max = max(self.inference_ms_max, elapsed)
+        return results
+
+    def close(self) -> None:
+        with self._lock:
+            for mesh in self._all:
+                mesh.close()
+            self._all.clear()
+            self._idle = queue.Queue()
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "size": self.size,
+                "created": len(self._all),
+                "idle": self._idle.qsize(),
+                "load_ms": list(self.load_ms),
+                "inference_count": self.inference_count,
+                "inference_ms_mean": round(self.inference_ms_total / self.inference_count, 1)
+                if self.inference_count else 0.0,
+                "inference_ms_max": round(self.inference_ms_max, 1),
+            }
+
+
+def _cgroup_cpu_limit() -> Optional[float]:
+    """CPUs allowed by the container's CFS quota (cgroup v2, then v1); None when unlimited or unknown."""
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()[:2]
+        return None if quota == "max" else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+            period = int(f.read())
+        return quota / period if quota > 0 and period > 0 else None
+    except (OSError, ValueError):
+        return None
+
+
+def available_cores() -> int:
+    """Cores this process may run on: CPU affinity, further capped by a container CPU quota."""
+    if hasattr(os, "sched_getaffinity"):
+        cores = len(os.sched_getaffinity(0))
+    else:
+        cores = os.cpu_count() or 1
+    limit = _cgroup_cpu_limit()
+    if limit is not None:
+        cores = min(cores, max(1, math.ceil(limit)))
+    return cores
+
+
+# One pool per max_num_faces setting; sized to the cores available to this process.
+FACE_MESH_POOL_SIZE = int(os.getenv("FACE_MESH_POOL_SIZE", "0")) or available_cores()
+_pools: Dict[int, FaceMeshPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_face_mesh_pool(max_faces: int = 1) -> FaceMeshPool:
+    with _pools_lock:
+        pool = _pools.get(max_faces)
+        if pool is None:
+            pool = FaceMeshPool(FACE_MESH_POOL_SIZE, max_num_faces=max_faces)
+            _pools[max_faces] = pool
+        return pool
+
+
+def close_face_mesh_pools() -> None:
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
+
+
+def face_mesh_metrics() -> Dict[str, Any]:
+    with _pools_lock:
+        pools = dict(_pools)
+    return {str(max_faces): pool.metrics() for max_faces, pool in pools.items()}
+
+
 def _landmarks_to_bbox(
     landmarks: List[Dict[str, float]], h: int, w: int, padding: float = 0.12
 ) -> tuple:
@@ -41,6 +209,29 @@ def _landmarks_to_bbox(
     return x_min, y_min, x_max, y_max
 
 
+def regions_from_landmarks(image: np.ndarray, landmarks: List[Dict[str, float]]) -> FaceRegions:
+    """FaceRegions for landmarks already known for this image (normalized x, y), without running FaceMesh."""
+    h, w = image.shape[:2]
+    x_min, y_min, x_max, y_max = _landmarks_to_bbox(landmarks, h, w)
+    if x_max <= x_min or y_max <= y_min:
+        return FaceRegions(
+            face_detected=True,
+            landmarks=landmarks,
+            face_crop=image,
+            crop_bounds={"x_min": 0, "y_min": 0, "x_max": w, "y_max": h},
+            image_shape=(h, w),
+        )
+
+    face_crop = image[y_min:y_max, x_min:x_max].copy()
+    return FaceRegions(
+        face_detected=True,
+        landmarks=landmarks,
+        face_crop=face_crop,
+        crop_bounds={"x_min": x_min, "y_min": y_min, "x_max": x_max, "y_max": y_max},
+        image_shape=(h, w),
+    )
+
+
 def extract_face_regions(image: np.ndarray) -> FaceRegions:
     """
     Run MediaPipe FaceMesh on image; return face crop and normalized landmarks.
@@ -56,12 +247,8 @@ def extract_face_regions(image: np.ndarray) -> FaceRegions:
             image_shape=image.shape[:2] if image is not None else (0, 0),
         )
 
-    h, w = image.shape[:2]
     rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-    mp_face = mp.solutions.face_mesh
-    face_mesh = mp_face.FaceMesh(static_image_mode=True, max_num_faces=1)
-    results = face_mesh.process(rgb)
-    face_mesh.close()
+    results = get_face_mesh_pool().process(rgb)
 
     if not results.multi_face_landmarks:
         return FaceRegions(
@@ -69,31 +256,13 @@ def extract_face_regions(image: np.ndarray) -> FaceRegions:
             landmarks=[],
             face_crop=None,
             crop_bounds=None,
-            image_shape=(h, w),
+            image_shape=image.shape[:2],
         )
 
     landmarks = []
     for lm in results.multi_face_landmarks[0].landmark:
         landmarks.append({"x": float(lm.x), "y": float(lm.y)})
-
-    x_min, y_min, x_max, y_max = _landmarks_to_bbox(landmarks, h, w)
-    if x_max <= x_min or y_max <= y_min:
-        return FaceRegions(
-            face_detected=True,
-            landmarks=landmarks,
-            face_crop=image,
-            crop_bounds={"x_min": 0, "y_min": 0, "x_max": w, "y_max": h},
-            image_shape=(h, w),
-        )
-
-    face_crop = image[y_min:y_max, x_min:x_max].copy()
-    return FaceRegions(
-        face_detected=True,
-        landmarks=landmarks,
-        face_crop=face_crop,
-        crop_bounds={"x_min": x_min, "y_min": y_min, "x_max": x_max, "y_max": y_max},
-        image_shape=(h, w),
-    )
+    return regions_from_landmarks(image, landmarks)
 
 
 def get_region_mask(
@@ -117,19 +286,49 @@ def get_region_mask(
     return mask
 
 
-def get_region_mean_luminance(image: np.ndarray, landmarks: List[Dict[str, float]], indices: List[int]) -> float:
-    """Mean luminance (LAB L) in the region; 0 if invalid."""
-    h, w = image.shape[:2]
-    xs = [landmarks[i]["x"] * w for i in indices if i < len(landmarks)]
-    ys = [landmarks[i]["y"] * h for i in indices if i < len(landmarks)]
-    if not xs:
-        return 0.0
-    x_min = max(0, int(min(xs)) - 5)
-    x_max = min(w, int(max(xs)) + 5)
-    y_min = max(0, int(min(ys)) - 5)
-    y_max = min(h, int(max(ys)) + 5)
-    if x_max <= x_min or y_max <= y_min:
+def get_skin_mask(
+    shape: tuple,
+    landmarks: List[Dict[str, float]],
+    image_shape: tuple,
+    origin: tuple = (0, 0),
+) -> Optional[np.ndarray]:
+    """
+    uint8 mask (255 = skin) of size shape[:2] for a crop whose top-left is origin in an
+    image of image_shape: face oval minus eyes, brows and lips, each excluded with a
+    margin for lashes and lip edges. None if there are not enough landmarks.
+    """
+    if len(landmarks) <= max(max(FACE_OVAL), max(max(c) for c in SKIN_EXCLUDE)):
+        return None
+    img_h, img_w = image_shape[:2]
+    ox, oy = origin
+
+    def polygon(indices: List[int]) -> np.ndarray:
+        return np.array(
+            [[landmarks[i]["x"] * img_w - ox, landmarks[i]["y"] * img_h - oy] for i in indices], dtype=np.int32
+        )
+
+    mask = np.zeros(shape[:2], dtype=np.uint8)
+    cv2.fillPoly(mask, [polygon(FACE_OVAL)], 255)
+    excluded = [polygon(c) for c in SKIN_EXCLUDE]
+    cv2.fillPoly(mask, excluded, 0)
+    margin = max(1, int(0.01 * max(shape[:2])))
+    cv2.polylines(mask, excluded, isClosed=True, color=0, thickness=2 * margin + 1)
+    return mask
+
+
+def get_region_mean_luminance(
+    image: np.ndarray,
+    landmarks: List[Dict[str, float]],
+    indices: List[int],
+    planes: Optional["ImagePlanes"] = None,
+) -> float:
+    """Mean luminance (LAB L) in the region; 0 if invalid. O(1) from planes' L summed-area table when the region lies in it."""
+    rect = landmark_rect(landmarks, indices, image.shape)
+    if rect is None:
         return 0.0
-    crop = image[y_min:y_max, x_min:x_max]
-    lab = cv2.cvtColor(crop, cv2.COLOR_BGR2LAB)
-    return float(np.mean(lab[:, :, 0]))
+    mean = planes.lightness_stats.mean(*rect) if planes is not None else None
+    if mean is None:
+        x_min, y_min, x_max, y_max = rect
+        crop = image[y_min:y_max, x_min:x_max]
+        mean = float(np.mean(cv2.cvtColor(crop, cv2.COLOR_BGR2LAB)[:, :, 0]))
+    return mean
@@ -0,0 +1,107 @@
+"""
+Per-request colour planes of the face crop. LAB, HSV, gray, the Laplacian and the
+skin mask are computed lazily, at most once each, and shared by skin scoring and
+confidence. Whole-face colour statistics are masked reductions over skin pixels only.
+Colour conversions are per-pixel, so a sub-rectangle of a converted plane equals the
+conversion of that sub-rectangle: landmark regions inside the crop are read from the
+shared planes instead of being converted again.
+"""
+from functools import cached_property
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from face_region_extractor import FaceRegions, get_skin_mask
+from region_stats import RegionStats
+
+
+MIN_SKIN_PIXELS = 500  # below this the mask is not trusted and whole-crop statistics are used
+
+
+class ImagePlanes:
+    def __init__(
+        self,
+        bgr: np.ndarray,
+        origin: Tuple[int, int] = (0, 0),
+        landmarks: Optional[List[Dict[str, float]]] = None,
+        image_shape: Optional[Tuple[int, int]] = None,
+    ):
+        self.bgr = bgr
+        self.origin = origin  # (x, y) of bgr[0, 0] in the original image
+        self.landmarks = landmarks or []  # normalized to the original image
+        self.image_shape = image_shape or bgr.shape[:2]
+
+    @classmethod
+    def for_face(cls, regions: FaceRegions) -> Optional["ImagePlanes"]:
+        if regions.face_crop is None or regions.face_crop.size == 0:
+            return None
+        bounds = regions.crop_bounds or {"x_min": 0, "y_min": 0}
+        return cls(regions.face_crop, (bounds["x_min"], bounds["y_min"]), regions.landmarks, regions.image_shape)
+
+    @cached_property
+    def lab(self) -> np.ndarray:
+        return cv2.cvtColor(self.bgr, cv2.COLOR_BGR2LAB)
+
+    @cached_property
+    def lightness(self) -> np.ndarray:
+        return cv2.extractChannel(self.lab, 0)
+
+    @cached_property
+    def lightness_stats(self) -> RegionStats:
+        """Summed-area tables of L and L^2: O(1) mean/variance for any rectangle inside the crop."""
+        return RegionStats(self.lightness, self.origin)
+
+    @cached_property
+    def hsv(self) -> np.ndarray:
+        return cv2.cvtColor(self.bgr, cv2.COLOR_BGR2HSV)
+
+    @cached_property
+    def gray(self) -> np.ndarray:
+        return cv2.cvtColor(self.bgr, cv2.COLOR_BGR2GRAY)
+
+    @cached_property
+    def laplacian(self) -> np.ndarray:
+        return cv2.Laplacian(self.gray, cv2.CV_64F)
+
+    @cached_property
+    def skin_mask(self) -> Optional[np.ndarray]:
+        """uint8 face-oval mask without eyes, brows and lips (255 = skin); None without enough landmarks or skin."""
+        mask = get_skin_mask(self.bgr.shape, self.landmarks, self.image_shape, self.origin)
+        if mask is None or cv2.countNonZero(mask) < MIN_SKIN_PIXELS:
+            return None
+        return mask
+
+    @cached_property
+    def skin_pixels(self) -> int:
+        return cv2.countNonZero(self.skin_mask) if self.skin_mask is not None else self.bgr.shape[0] * self.bgr.shape[1]
+
+    def masked_mean(self, plane: np.ndarray) -> float:
+        """Mean of a single-channel plane over skin pixels (whole plane without a mask)."""
+        return float(cv2.mean(plane, mask=self.skin_mask)[0])
+
+    def skin_fraction(self, binary: np.ndarray) -> float:
+        """Fraction of skin pixels where a boolean plane is set."""
+        if self.skin_mask is not None:
+            binary = binary & (self.skin_mask > 0)
+        return float(np.count_nonzero(binary)) / max(1, self.skin_pixels)
+
+    @cached_property
+    def laplacian_variance(self) -> float:
+        """Whole-crop Laplacian variance: what the blur, gate and texture thresholds were tuned on."""
+        _, std = cv2.meanStdDev(self.laplacian)
+        return float(std[0, 0] ** 2)
+
+    def region(self, plane: str, x_min: int, y_min: int, x_max: int, y_max: int) -> Optional[np.ndarray]:
+        """
+        Slice of a per-pixel plane ("lab", "lightness", "hsv", "gray", "skin_mask") for a
+        rectangle in original-image coordinates; None if the rectangle is not fully inside
+        this crop (or the plane is unavailable).
+        """
+        ox, oy = self.origin
+        h, w = self.bgr.shape[:2]
+        x0, y0, x1, y1 = x_min - ox, y_min - oy, x_max - ox, y_max - oy
+        if x0 < 0 or y0 < 0 or x1 > w or y1 > h:
+            return None
+        values = getattr(self, plane)
+        return values[y0:y1, x0:x1] if values is not None else None
@@ -2,123 +2,526 @@
 NYRAA AI Skin Consulting Service.
 POST /consult-staff: full analysis (scores, confidence, top_3_services, roadmap, projection).
 POST /consult-customer: before/after base64, top service, disclaimer.
+POST /consult: both of the above from one detection and scoring pass.
+POST /simulate-scenarios: after images for several services and product timeline days.
+POST /simulate: the same from a consult's session_token, without re-upload or re-detection.
+GET /artifacts/{artifact_id}: rendered images referenced by URL from the responses above.
+The consult endpoints stop after a cheap quality gate when the photo is unusable (force=true skips it).
 """
+import asyncio
 import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+
 import cv2
 import numpy as np
-from fastapi import FastAPI, UploadFile, File, HTTPException
-
-from face_region_extractor import extract_face_regions
-from skin_scoring import compute_skin_scores, SkinScores
-from confidence_engine import compute_confidence
-from recommendation_engine import (
-    get_top_3_services,
-    get_suggested_roadmap,
-    get_improvement_projection,
+from fastapi import FastAPI, UploadFile, File, HTTPException, Query
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel
+
+from face_region_extractor import (
+    FaceRegions,
+    available_cores,
+    get_face_mesh_pool,
+    close_face_mesh_pools,
+    face_mesh_metrics,
 )
-from simulation_engine import get_before_after_base64
+from skin_scoring import SkinScores
+from consult_pool import ConsultPool, ConsultPoolBusy, ConsultPoolUnavailable, FaceAnalysis
+from recommendation_engine import ConsultRecommendations, recommend
+from simulation_engine import crop_mean, get_before_after_base64, render_scenarios, simulate_service_impact
+from session_cache import ConsultSession, SessionCache
+from artifact_store import IMAGE_FORMATS, ArtifactStore, encode_image
+from raw_image import is_raw_image, unpack_raw_image
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+QUALITY_GATE_ENABLED = os.getenv("QUALITY_GATE_ENABLED", "1") == "1"
+# Processes for detection and scoring (0 = threads in this process); consults beyond the queue depth get 503.
+# Each worker holds its own FaceMesh and OpenCV (hundreds of MB), so the default follows the container's
+# CPU allowance, not the host's core count, and is capped at CONSULT_MAX_WORKERS.
+CONSULT_MAX_WORKERS = int(os.getenv("CONSULT_MAX_WORKERS", "8"))
+CONSULT_WORKERS = int(os.getenv("CONSULT_WORKERS", str(min(available_cores(), CONSULT_MAX_WORKERS))))
+CONSULT_QUEUE_DEPTH = int(os.getenv("CONSULT_QUEUE_DEPTH", "0")) or 4 * max(1, CONSULT_WORKERS)
+SIMULATION_WORKERS = int(os.getenv("SIMULATION_WORKERS", "0")) or min(4, available_cores())
+MAX_SCENARIOS = int(os.getenv("MAX_SCENARIOS", "12"))
+DEFAULT_PRODUCT_DAYS = [7, 30, 60]
+
+_simulation_pool: Optional[ThreadPoolExecutor] = None
+consult_pool = ConsultPool(CONSULT_WORKERS, CONSULT_QUEUE_DEPTH)
+
+sessions = SessionCache(
+    ttl_s=float(os.getenv("SESSION_TTL_S", "900")),
+    max_entries=int(os.getenv("SESSION_MAX_ENTRIES", "256")),
+    max_bytes=int(os.getenv("SESSION_MAX_MB", "256")) * 1024 * 1024,
+)
+
+ARTIFACT_FORMAT = os.getenv("ARTIFACT_FORMAT", "webp").lower()
+ARTIFACT_QUALITY = int(os.getenv("ARTIFACT_QUALITY", "85"))
+if ARTIFACT_FORMAT not in IMAGE_FORMATS:
+    raise ValueError(f"ARTIFACT_FORMAT must be one of {', '.join(IMAGE_FORMATS)}, got {ARTIFACT_FORMAT!r}")
+
+artifacts = ArtifactStore(
+    ttl_s=float(os.getenv("ARTIFACT_TTL_S", "600")),
+    max_bytes=int(os.getenv("ARTIFACT_MAX_MB", "128")) * 1024 * 1024,
+)
+
+
+class SimulateRequest(BaseModel):
+    session_token: str
+    services: Optional[List[str]] = None  # default: the session's top 3 recommended services
+    product_days: List[int] = DEFAULT_PRODUCT_DAYS
+    inline: bool = False  # base64 images in the JSON instead of artifact URLs
+
+
+model_state: Dict[str, Any] = {"status": "loading", "load_ms": None, "warmup_ms": None, "error": None}
+
+
+def _load_and_warm() -> None:
+    """
+    Start the consult workers; each loads FaceMesh and runs it and scoring once before the
+    service is ready. With CONSULT_WORKERS=0, fill and warm this process's FaceMesh pool instead.
+    """
+    started = time.perf_counter()
+    if consult_pool.workers == 0:
+        pool = get_face_mesh_pool()
+        pool.fill()
+        model_state["load_ms"] = round((time.perf_counter() - started) * 1000.0, 1)
+        model_state["face_mesh_pool_size"] = pool.size
+        started = time.perf_counter()
+        pool.warm(np.full((256, 256, 3), 128, dtype=np.uint8))
+    consult_pool.start()
+    model_state["consult_workers"] = consult_pool.workers
+    model_state["warmup_ms"] = round((time.perf_counter() - started) * 1000.0, 1)
+
+
+async def _load_model() -> None:
+    try:
+        await asyncio.to_thread(_load_and_warm)
+        model_state["status"] = "ready"
+        logger.info("skin consulting ready: %s", model_state)
+    except Exception as exc:
+        model_state["status"] = "failed"
+        model_state["error"] = str(exc)
+        logger.exception("skin consulting warmup failed")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global _simulation_pool
+    _simulation_pool = ThreadPoolExecutor(max_workers=SIMULATION_WORKERS, thread_name_prefix="simulation")
+    loader = asyncio.create_task(_load_model())
+    yield
+    loader.cancel()
+    consult_pool.shutdown()
+    close_face_mesh_pools()
+    _simulation_pool.shutdown(wait=False, cancel_futures=True)
+
+
 app = FastAPI(
     title="NYRAA AI Skin Consulting Service",
     version="1.0.0",
     description="Deep skin analysis, recommendations, and simulation for staff and customer.",
+    lifespan=lifespan,
 )
 
 
 def _decode_image(contents: bytes) -> np.ndarray:
+    if is_raw_image(contents):
+        return unpack_raw_image(contents)
     arr = np.frombuffer(contents, np.uint8)
     return cv2.imdecode(arr, cv2.IMREAD_COLOR)
 
 
-@app.post("/consult-staff")
-async def consult_staff(file: UploadFile = File(...)):
-    """
-    Staff mode: skin_scores, confidence_score, manual_review_required,
-    top_3_services, suggested_roadmap, improvement_projection.
-    """
+def _require_ready() -> None:
+    if model_state["status"] != "ready":
+        raise HTTPException(status_code=503, detail=f"Skin consulting service is {model_state['status']}")
+
+
+DISCLAIMER = "This visualization is a digital simulation. Results may vary."
+
+STAFF_NO_FACE = {
+    "face_detected": False,
+    "skin_scores": None,
+    "region_luminance": {},
+    "confidence_score": 0.0,
+    "manual_review_required": True,
+    "top_3_services": [],
+    "suggested_roadmap": [],
+    "improvement_projection": {},
+}
+
+
+def _customer_no_face(inline: bool) -> Dict[str, Any]:
+    field = "base64" if inline else "url"
+    return {
+        "face_detected": False,
+        f"before_image_{field}": "",
+        f"after_image_{field}": "",
+        "top_recommended_service": None,
+        "disclaimer": DISCLAIMER,
+    }
+
+
+async def _read_image(file: UploadFile) -> np.ndarray:
     contents = await file.read()
     if not contents:
         raise HTTPException(status_code=400, detail="Empty file uploaded")
 
-    image = _decode_image(contents)
+    image = await asyncio.to_thread(_decode_image, contents)
     if image is None:
         raise HTTPException(status_code=400, detail="Unable to decode image")
+    return image
+
+
+async def _analyze(image: np.ndarray, force: bool = False, **kwargs: Any) -> FaceAnalysis:
+    """
+    Detection, quality gate and scoring on the consult pool. The gate (face size, sharpness,
+    lighting on the canonical, downscaled crop) runs before scoring unless disabled or forced off.
+    """
+    try:
+        analysis = await consult_pool.analyze(image, gate=QUALITY_GATE_ENABLED and not force, **kwargs)
+    except ConsultPoolBusy:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many consults in progress, retry shortly",
+            headers={"Retry-After": "1"},
+        )
+    except ConsultPoolUnavailable as exc:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Skin consulting is unavailable: {exc}",
+            headers={"Retry-After": "5"},
+        )
+    if analysis.rejected:
+        logger.info("quality gate rejected photo: %s %s", analysis.quality.issues, analysis.quality.metrics)
+    return analysis
+
+
+def _quality(analysis: FaceAnalysis) -> Optional[Dict[str, Any]]:
+    return analysis.quality.to_dict() if analysis.quality else None
+
+
+def _staff_rejected(analysis: FaceAnalysis) -> Dict[str, Any]:
+    # Confidence reuses the gate's planes, so it is nearly free; everything else is skipped.
+    return {
+        **STAFF_NO_FACE,
+        "face_detected": True,
+        "quality": _quality(analysis),
+        "confidence_score": analysis.confidence.confidence_score,
+    }
 
-    regions = extract_face_regions(image)
-    if not regions.face_detected:
-        return {
-            "face_detected": False,
-            "skin_scores": None,
-            "confidence_score": 0.0,
-            "manual_review_required": True,
-            "top_3_services": [],
-            "suggested_roadmap": [],
-            "improvement_projection": {},
-        }
 
-    scores = compute_skin_scores(image, regions)
-    confidence = compute_confidence(image, regions)
-    top_3 = get_top_3_services(scores)
-    roadmap = get_suggested_roadmap(scores)
-    projection = get_improvement_projection(scores)
+def _customer_rejected(inline: bool, analysis: FaceAnalysis) -> Dict[str, Any]:
+    return {**_customer_no_face(inline), "face_detected": True, "quality": _quality(analysis)}
 
+
+def _staff_payload(analysis: FaceAnalysis, recs: ConsultRecommendations) -> Dict[str, Any]:
+    confidence = analysis.confidence
     return {
         "face_detected": True,
-        "skin_scores": scores.to_dict(),
+        "skin_scores": analysis.scores.to_dict(),
+        "region_luminance": analysis.region_luminance,
         "confidence_score": confidence.confidence_score,
         "manual_review_required": confidence.manual_review_required,
-        "top_3_services": top_3,
-        "suggested_roadmap": roadmap,
-        "improvement_projection": projection,
+        "top_3_services": recs.top_3_services,
+        "suggested_roadmap": recs.suggested_roadmap,
+        "improvement_projection": recs.improvement_projection,
+        "quality": _quality(analysis),
+    }
+
+
+def _store_image(image: np.ndarray) -> str:
+    """Encode as ARTIFACT_FORMAT, store, and return its URL path ("" if it could not be stored)."""
+    data, media_type = encode_image(image, ARTIFACT_FORMAT, ARTIFACT_QUALITY)
+    artifact_id = artifacts.put(data, media_type)
+    return f"/artifacts/{artifact_id}" if artifact_id else ""
+
+
+def _top_services(recs: ConsultRecommendations) -> List[str]:
+    return [s["service"] for s in recs.top_3_services] or ["Fruit Facial"]
+
+
+def _customer_payload(regions: FaceRegions, recs: ConsultRecommendations, inline: bool = False) -> Dict[str, Any]:
+    top_service = _top_services(recs)[0]
+
+    if inline:
+        before_b64, after_b64 = get_before_after_base64(
+            regions.face_crop,
+            top_service,
+            use_product_simulation=False,
+        )
+        images = {"before_image_base64": before_b64, "after_image_base64": after_b64}
+    else:
+        after = simulate_service_impact(regions.face_crop, top_service)
+        images = {"before_image_url": _store_image(regions.face_crop), "after_image_url": _store_image(after)}
+
+    return {
+        "face_detected": True,
+        **images,
+        "top_recommended_service": top_service,
+        "disclaimer": DISCLAIMER,
+    }
+
+
+async def _customer_result(analysis: FaceAnalysis, recs: ConsultRecommendations, inline: bool) -> Dict[str, Any]:
+    # Rendering and encoding run off the event loop.
+    payload = await asyncio.to_thread(_customer_payload, analysis.regions, recs, inline)
+    return {**payload, "quality": _quality(analysis)}
+
+
+def _open_session(regions: FaceRegions, scores: SkinScores) -> Optional[str]:
+    """Cache the analysed face for /simulate; returns the session token (None if not cached)."""
+    face_crop = np.ascontiguousarray(regions.face_crop)  # detach from the full upload
+    lab = cv2.cvtColor(face_crop, cv2.COLOR_BGR2LAB)  # simulations render the uploaded crop, not the canonical one
+    return sessions.put(ConsultSession(face_crop, lab, crop_mean(face_crop), regions.landmarks, scores))
+
+
+async def _session_token(analysis: FaceAnalysis, session: bool) -> Optional[str]:
+    """A session only when the caller will simulate from it (session=true); built off the event loop."""
+    if not session:
+        return None
+    return await asyncio.to_thread(_open_session, analysis.regions, analysis.scores)
+
+
+def _scenario_encoding(inline: bool) -> Dict[str, Any]:
+    """render_scenarios encode / field arguments for the requested image mode."""
+    return {"encode": None, "field": "base64"} if inline else {"encode": _store_image, "field": "url"}
+
+
+def _check_scenarios(services: List[str], product_days: List[int]) -> None:
+    if any(d < 1 or d > 365 for d in product_days):
+        raise HTTPException(status_code=400, detail="product_days must be between 1 and 365")
+    if len(services) + len(set(product_days)) > MAX_SCENARIOS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_SCENARIOS} scenarios per request")
+
+
+@app.post("/consult-staff")
+async def consult_staff(
+    file: UploadFile = File(...),
+    force: bool = Query(False),
+    session: bool = Query(False),
+):
+    """
+    Staff mode: skin_scores, confidence_score, manual_review_required,
+    top_3_services, suggested_roadmap, improvement_projection.
+    A photo failing the quality gate returns quality.issues and no scores unless force=true.
+    session=true caches the face for /simulate and returns its session_token.
+    """
+    _require_ready()
+    image = await _read_image(file)
+
+    analysis = await _analyze(image, force)
+    if not analysis.regions.face_detected:
+        return dict(STAFF_NO_FACE)
+    if analysis.rejected:
+        return {**_staff_rejected(analysis), "session_token": None}
+    return {
+        **_staff_payload(analysis, recommend(analysis.scores)),
+        "session_token": await _session_token(analysis, session),
     }
 
 
 @app.post("/consult-customer")
-async def consult_customer(file: UploadFile = File(...)):
+async def consult_customer(
+    file: UploadFile = File(...),
+    inline: bool = Query(False),
+    force: bool = Query(False),
+    session: bool = Query(False),
+):
     """
-    Customer mode: before image (base64), after simulated image (base64),
-    top recommended service, disclaimer.
+    Customer mode: before image and after simulated image (artifact URLs, or base64 with
+    inline=true), top recommended service, disclaimer. Nothing is rendered for a photo
+    failing the quality gate unless force=true. session=true returns a session_token.
     """
-    contents = await file.read()
-    if not contents:
-        raise HTTPException(status_code=400, detail="Empty file uploaded")
+    _require_ready()
+    image = await _read_image(file)
 
-    image = _decode_image(contents)
-    if image is None:
-        raise HTTPException(status_code=400, detail="Unable to decode image")
+    analysis = await _analyze(image, force, staff=False)
+    if not analysis.regions.face_detected:
+        return _customer_no_face(inline)
+    if analysis.rejected:
+        return {**_customer_rejected(inline, analysis), "session_token": None}
+    return {
+        **await _customer_result(analysis, recommend(analysis.scores), inline),
+        "session_token": await _session_token(analysis, session),
+    }
+
+
+@app.post("/consult")
+async def consult(
+    file: UploadFile = File(...),
+    include_staff: bool = Query(True),
+    include_customer: bool = Query(True),
+    inline: bool = Query(False),
+    force: bool = Query(False),
+    session: bool = Query(False),
+):
+    """
+    Staff and customer results from a single decode, face detection and scoring pass.
+    Returns {"staff": ..., "customer": ..., "session_token": ...}; a part excluded by its flag is omitted.
+    Both parts carry the quality gate's result; a failing photo is not scored unless force=true.
+    session_token is null unless session=true.
+    """
+    if not include_staff and not include_customer:
+        raise HTTPException(status_code=400, detail="At least one of include_staff or include_customer must be true")
+    _require_ready()
+    image = await _read_image(file)
+
+    analysis = await _analyze(image, force, staff=include_staff)
+    result: Dict[str, Any] = {}
+    if not analysis.regions.face_detected:
+        if include_staff:
+            result["staff"] = dict(STAFF_NO_FACE)
+        if include_customer:
+            result["customer"] = _customer_no_face(inline)
+        return result
+
+    if analysis.rejected:
+        if include_staff:
+            result["staff"] = _staff_rejected(analysis)
+        if include_customer:
+            result["customer"] = _customer_rejected(inline, analysis)
+        result["session_token"] = None
+        return result
+
+    recs = recommend(analysis.scores)
+    if include_staff:
+        result["staff"] = _staff_payload(analysis, recs)
+    if include_customer:
+        result["customer"] = await _customer_result(analysis, recs, inline)
+    result["session_token"] = await _session_token(analysis, session)
+    return result
 
-    regions = extract_face_regions(image)
+
+@app.post("/simulate-scenarios")
+async def simulate_scenarios(
+    file: UploadFile = File(...),
+    services: Optional[List[str]] = Query(None),
+    product_days: List[int] = Query(DEFAULT_PRODUCT_DAYS),
+    inline: bool = Query(False),
+):
+    """
+    Before image and one after image per scenario, rendered in parallel from one decoded crop.
+    services defaults to the top 3 recommended services; product_days to 7, 30 and 60.
+    """
+    _require_ready()
+    _check_scenarios(services or [], product_days)
+    image = await _read_image(file)
+
+    analysis = await _analyze(image, force=True, score=not services, staff=False)
+    regions = analysis.regions
     if not regions.face_detected:
         return {
             "face_detected": False,
-            "before_image_base64": "",
-            "after_image_base64": "",
-            "top_recommended_service": None,
-            "disclaimer": "This visualization is a digital simulation. Results may vary.",
+            "before_image_base64" if inline else "before_image_url": "",
+            "services": [],
+            "product_timeline": [],
+            "disclaimer": DISCLAIMER,
         }
 
-    scores = compute_skin_scores(image, regions)
-    top_3 = get_top_3_services(scores)
-    top_service = top_3[0]["service"] if top_3 else "Fruit Facial"
+    if not services:
+        services = _top_services(recommend(analysis.scores))
+    _check_scenarios(services, product_days)
 
-    before_b64, after_b64 = get_before_after_base64(
+    rendered = await asyncio.to_thread(
+        render_scenarios,
         regions.face_crop,
-        top_service,
-        use_product_simulation=False,
+        services,
+        product_days,
+        _simulation_pool,
+        **_scenario_encoding(inline),
     )
+    return {"face_detected": True, **rendered, "disclaimer": DISCLAIMER}
 
-    return {
-        "face_detected": True,
-        "before_image_base64": before_b64,
-        "after_image_base64": after_b64,
-        "top_recommended_service": top_service,
-        "disclaimer": "This visualization is a digital simulation. Results may vary.",
-    }
+
+@app.post("/simulate")
+async def simulate(body: SimulateRequest):
+    """
+    Render services / product timeline days for a face cached by a consult (session_token).
+    No upload, face detection or scoring; 404 once the session has expired or been evicted.
+    """
+    session = sessions.get(body.session_token)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired session_token")
+    services = body.services
+    if services is None:
+        services = _top_services(recommend(session.scores))
+    _check_scenarios(services, body.product_days)
+
+    rendered = await asyncio.to_thread(
+        render_scenarios,
+        session.face_crop,
+        services,
+        body.product_days,
+        _simulation_pool,
+        session.lab,
+        session.mean_before,
+        **_scenario_encoding(body.inline),
+    )
+    return {"face_detected": True, "session_token": body.session_token, **rendered, "disclaimer": DISCLAIMER}
 
 
 @app.get("/health")
 async def health():
     return {"status": "ok", "service": "skin-consulting"}
+
+
+@app.get("/metrics/face-mesh")
+async def face_mesh_pool_metrics():
+    """FaceMesh pool size, per-instance load times and inference timings (this process; CONSULT_WORKERS=0 only)."""
+    return face_mesh_metrics()
+
+
+@app.get("/metrics/consult-pool")
+async def consult_pool_metrics():
+    """Consult workers, queue depth limit, consults in flight, completed, rejected as busy, and latency."""
+    return consult_pool.stats()
+
+
+@app.get("/artifacts/{artifact_id}")
+async def get_artifact(artifact_id: str):
+    """Rendered image bytes. Artifacts never change, so clients may cache them for their whole lifetime."""
+    artifact = artifacts.get(artifact_id)
+    if artifact is None:
+        raise HTTPException(status_code=404, detail="Artifact not found or expired")
+    data, media_type = artifact
+    return Response(
+        content=data,
+        media_type=media_type,
+        headers={"Cache-Control": f"private, max-age={int(artifacts.ttl_s)}, immutable"},
+    )
+
+
+@app.get("/metrics/artifacts")
+async def artifact_metrics():
+    """Artifact store entries, bytes, serves, expiries and evictions."""
+    return artifacts.stats()
+
+
+@app.get("/metrics/sessions")
+async def session_metrics():
+    """Session cache size, byte budget, hits, misses, expiries and evictions."""
+    return sessions.stats()
+
+
+@app.get("/health/live")
+async def health_live():
+    return {"status": "ok", "service": "skin-consulting"}
+
+
+@app.get("/health/ready")
+async def health_ready():
+    """
+    200 once FaceMesh and scoring have been warmed up; 503 while loading, after a failure, or
+    while the consult workers are rebuilt after a crash (for good if the rebuild failed).
+    """
+    ready = model_state["status"] == "ready" and consult_pool.status == "ready"
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"service": "skin-consulting", **model_state, "consult_pool": consult_pool.status},
+    )
@@ -1,12 +1,38 @@
 """
 Service recommendation rules from skin scores. Each recommendation includes
-reason, expected effect, and estimated improvement %. Builds top_3_services and suggested_roadmap.
+reason, expected effect, and estimated improvement %. Builds top_3_services,
+suggested_roadmap and improvement_projection.
+
+Rules live in config/consult_rules.json (or CONSULT_RULES_CONFIG) and are compiled
+once into a rule table: one column per rule holding its metric, comparison and
+threshold, already sorted by estimated improvement, plus a rule x metric matrix of
+projection deltas. Evaluating the table against an (N, 6) array of score rows is a
+few NumPy comparisons and one matrix product, so a request evaluates the rules once
+and bulk re-scoring of stored consults runs at the same per-row cost.
 """
-from dataclasses import dataclass
-from typing import List, Dict, Any
+import json
+import os
+from dataclasses import dataclass, fields
+from pathlib import Path
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
 
 from skin_scoring import SkinScores
 
+CONSULT_RULES_CONFIG = os.getenv(
+    "CONSULT_RULES_CONFIG", str(Path(__file__).resolve().parent / "config" / "consult_rules.json")
+)
+METRICS = tuple(f.name for f in fields(SkinScores))
+OPERATORS = (">", ">=", "<", "<=")
+TOP_N = 3
+
+
+class RuleConfigError(ValueError):
+    def __init__(self, errors: List[str]):
+        self.errors = errors
+        super().__init__("Invalid consult rules: " + "; ".join(errors))
+
 
 @dataclass
 class ServiceRecommendation:
@@ -16,97 +42,156 @@ class ServiceRecommendation:
     estimated_improvement_pct: float
 
 
-def _recommendations(scores: SkinScores) -> List[ServiceRecommendation]:
-    out: List[ServiceRecommendation] = []
-
-    if scores.pigmentation_density > 45:
-        out.append(ServiceRecommendation(
-            service="De-Tan Facial",
-            reason=f"Pigmentation density score is {scores.pigmentation_density:.0f} (above 45).",
-            expected_effect="Reduce tan and dark spots; improve tone uniformity.",
-            estimated_improvement_pct=25.0,
-        ))
-
-    if scores.brightness < 60:
-        out.append(ServiceRecommendation(
-            service="Fruit Facial",
-            reason=f"Brightness score is {scores.brightness:.0f} (below 60).",
-            expected_effect="Add glow and mild hydration; smooth skin.",
-            estimated_improvement_pct=20.0,
-        ))
-
-    if scores.redness > 50:
-        out.append(ServiceRecommendation(
-            service="Acne Treatment",
-            reason=f"Redness score is {scores.redness:.0f} (above 50).",
-            expected_effect="Calm redness and reduce acne-related inflammation.",
-            estimated_improvement_pct=30.0,
-        ))
-
-    if scores.facial_hair_density > 55:
-        out.append(ServiceRecommendation(
-            service="Threading / Waxing",
-            reason=f"Facial hair density score is {scores.facial_hair_density:.0f} (high).",
-            expected_effect="Clean brow edges and upper lip; smoother finish.",
-            estimated_improvement_pct=15.0,
-        ))
-
-    # Gold/Diamond: optional for dull skin (brightness low, not covered by fruit only once)
-    if scores.brightness < 50 and not any(r.service == "Gold/Diamond Facial" for r in out):
-        out.append(ServiceRecommendation(
-            service="Gold/Diamond Facial",
-            reason=f"Brightness score is {scores.brightness:.0f}; premium boost recommended.",
-            expected_effect="Brightness boost and slight reflectivity enhancement.",
-            estimated_improvement_pct=22.0,
-        ))
-
-    return out
+@dataclass
+class ConsultRecommendations:
+    top_3_services: List[Dict[str, Any]]
+    suggested_roadmap: List[str]
+    improvement_projection: Dict[str, float]
+
+
+def _number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def validate_rules(data: Any) -> List[Dict[str, Any]]:
+    """Check the parsed JSON document and return its rule list; raise RuleConfigError listing every problem."""
+    if not isinstance(data, dict) or not isinstance(data.get("rules"), list):
+        raise RuleConfigError(['top level must be an object with a "rules" array'])
+    errors: List[str] = []
+    for i, rule in enumerate(data["rules"]):
+        where = f"rules[{i}]"
+        if not isinstance(rule, dict):
+            errors.append(f"{where}: must be an object")
+            continue
+        for key in ("service", "reason", "expected_effect"):
+            if not isinstance(rule.get(key), str):
+                errors.append(f"{where}.{key}: must be a string")
+        if not _number(rule.get("estimated_improvement_pct")):
+            errors.append(f"{where}.estimated_improvement_pct: must be a number")
+        when = rule.get("when")
+        if not isinstance(when, dict):
+            errors.append(f"{where}.when: must be an object with metric, op and value")
+        else:
+            if when.get("metric") not in METRICS:
+                errors.append(f"{where}.when.metric: must be one of {', '.join(METRICS)}")
+            if when.get("op") not in OPERATORS:
+                errors.append(f"{where}.when.op: must be one of {', '.join(OPERATORS)}")
+            if not _number(when.get("value")):
+                errors.append(f"{where}.when.value: must be a number")
+        projection = rule.get("projection", {})
+        if not isinstance(projection, dict):
+            errors.append(f"{where}.projection: must be an object")
+        else:
+            for metric, delta in projection.items():
+                if metric not in METRICS:
+                    errors.append(f"{where}.projection: unknown metric {metric!r}")
+                elif not _number(delta):
+                    errors.append(f"{where}.projection.{metric}: must be a number")
+        if isinstance(rule.get("reason"), str):
+            try:
+                rule["reason"].format(score=0.0)
+            except (KeyError, IndexError, ValueError) as exc:
+                errors.append(f"{where}.reason: bad placeholder ({exc}); only {{score}} is available")
+    if errors:
+        raise RuleConfigError(errors)
+    return data["rules"]
+
+
+class RuleTable:
+    def __init__(self, rules: List[Dict[str, Any]]):
+        # Stable sort: rules with equal improvement keep their file order.
+        pct = np.array([r["estimated_improvement_pct"] for r in rules], dtype=np.float64)
+        order = np.argsort(-pct, kind="stable")
+        self.rules = [rules[i] for i in order]
+        self.services = [r["service"] for r in self.rules]
+        self.improvement_pct = pct[order]
+        self.metric_index = np.array([METRICS.index(r["when"]["metric"]) for r in self.rules], dtype=np.intp)
+        self.threshold = np.array([r["when"]["value"] for r in self.rules], dtype=np.float64)
+        ops = [r["when"]["op"] for r in self.rules]
+        # Each operator is the union of <, == and >; a rule fires on the parts it accepts.
+        self._accept_lt = np.array(["<" in op for op in ops], dtype=bool)
+        self._accept_gt = np.array([">" in op for op in ops], dtype=bool)
+        self._accept_eq = np.array(["=" in op for op in ops], dtype=bool)
+        self.deltas = np.zeros((len(self.rules), len(METRICS)), dtype=np.float64)
+        for row, rule in enumerate(self.rules):
+            for metric, delta in rule.get("projection", {}).items():
+                self.deltas[row, METRICS.index(metric)] = delta
+
+    def fired(self, rows: np.ndarray) -> np.ndarray:
+        """(N, R) bool: which rules fire for each score row. Columns are in ranking order."""
+        values = np.asarray(rows, dtype=np.float64)[:, self.metric_index]
+        return (
+            (self._accept_lt & (values < self.threshold))
+            | (self._accept_gt & (values > self.threshold))
+            | (self._accept_eq & (values == self.threshold))
+        )
+
+    def project(self, rows: np.ndarray, fired: np.ndarray) -> np.ndarray:
+        """(N, 6) projected scores: the fired rules' deltas summed per metric, clipped to 0-100."""
+        return np.clip(np.asarray(rows, dtype=np.float64) + fired @ self.deltas, 0.0, 100.0)
+
+    @staticmethod
+    def top(fired: np.ndarray, n: int = TOP_N) -> np.ndarray:
+        """(N, R) bool: the first n fired rules of each row, i.e. its top n services."""
+        return fired & (np.cumsum(fired, axis=1) <= n)
+
+    def recommend(self, scores: SkinScores) -> ConsultRecommendations:
+        """Evaluate the table once for one consult and build all three response fields."""
+        row = scores_to_rows([scores])
+        fired = self.fired(row)
+        projected = self.project(row, fired)[0]
+        recs = [
+            ServiceRecommendation(
+                service=self.services[i],
+                reason=self.rules[i]["reason"].format(score=row[0, self.metric_index[i]]),
+                expected_effect=self.rules[i]["expected_effect"],
+                estimated_improvement_pct=float(self.improvement_pct[i]),
+            )
+            for i in np.flatnonzero(fired[0])
+        ]
+        return ConsultRecommendations(
+            top_3_services=[
+                {
+                    "service": r.service,
+                    "reason": r.reason,
+                    "expected_effect": r.expected_effect,
+                    "estimated_improvement_pct": round(r.estimated_improvement_pct, 1),
+                }
+                for r in recs[:TOP_N]
+            ],
+            suggested_roadmap=[r.service for r in recs],
+            improvement_projection={m: round(float(v), 1) for m, v in zip(METRICS, projected)},
+        )
+
+
+def scores_to_rows(scores: Sequence[SkinScores]) -> np.ndarray:
+    """(N, 6) float array of score rows, columns in METRICS order."""
+    return np.array([[getattr(s, m) for m in METRICS] for s in scores], dtype=np.float64).reshape(-1, len(METRICS))
+
+
+def load_rules(path: str = CONSULT_RULES_CONFIG) -> RuleTable:
+    with open(path, "rb") as f:
+        return RuleTable(validate_rules(json.load(f)))
+
+
+RULES = load_rules()
+
+
+def recommend(scores: SkinScores) -> ConsultRecommendations:
+    """top_3_services, suggested_roadmap and improvement_projection from a single rule evaluation."""
+    return RULES.recommend(scores)
 
 
 def get_top_3_services(scores: SkinScores) -> List[Dict[str, Any]]:
     """Return up to 3 service recommendations with reason, effect, improvement %."""
-    recs = _recommendations(scores)
-    # Sort by estimated improvement descending, take 3
-    recs.sort(key=lambda r: r.estimated_improvement_pct, reverse=True)
-    top = recs[:3]
-    return [
-        {
-            "service": r.service,
-            "reason": r.reason,
-            "expected_effect": r.expected_effect,
-            "estimated_improvement_pct": round(r.estimated_improvement_pct, 1),
-        }
-        for r in top
-    ]
+    return recommend(scores).top_3_services
 
 
 def get_suggested_roadmap(scores: SkinScores) -> List[str]:
     """Ordered list of service names as a suggested sequence (e.g. De-Tan then Fruit)."""
-    recs = _recommendations(scores)
-    recs.sort(key=lambda r: r.estimated_improvement_pct, reverse=True)
-    return [r.service for r in recs]
+    return recommend(scores).suggested_roadmap
 
 
 def get_improvement_projection(scores: SkinScores) -> Dict[str, float]:
     """Projected score changes after following recommendations (example ranges)."""
-    recs = _recommendations(scores)
-    proj = {
-        "brightness": scores.brightness,
-        "pigmentation_density": scores.pigmentation_density,
-        "redness": scores.redness,
-        "texture_roughness": scores.texture_roughness,
-        "dark_circle_index": scores.dark_circle_index,
-        "facial_hair_density": scores.facial_hair_density,
-    }
-    for r in recs:
-        if "De-Tan" in r.service:
-            proj["pigmentation_density"] = max(0, proj["pigmentation_density"] - 20)
-        if "Fruit" in r.service:
-            proj["brightness"] = min(100, proj["brightness"] + 15)
-        if "Acne" in r.service:
-            proj["redness"] = max(0, proj["redness"] - 25)
-        if "Threading" in r.service or "Waxing" in r.service:
-            proj["facial_hair_density"] = max(0, proj["facial_hair_density"] - 30)
-        if "Gold" in r.service or "Diamond" in r.service:
-            proj["brightness"] = min(100, proj["brightness"] + 10)
-    return {k: round(v, 1) for k, v in proj.items()}
+    return recommend(scores).improvement_projection
@@ -0,0 +1,91 @@
+"""
+Summed-area tables over one image plane. After a single pass to build the integral of
+the plane and of its square, the mean and variance of any axis-aligned rectangle are
+four lookups each, so landmark regions cost the same however many are scored. A union
+of overlapping rectangles is answered exactly by inclusion-exclusion over their
+intersections, so shared pixels are counted once.
+"""
+from itertools import combinations
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+
+class RegionStats:
+    def __init__(self, plane: np.ndarray, origin: Tuple[int, int] = (0, 0)):
+        self.origin = origin  # (x, y) of plane[0, 0] in the original image
+        self.height, self.width = plane.shape[:2]
+        # (h+1, w+1) tables; integral2 keeps uint8 sums exact (int32 sum, float64 squares).
+        self._sum, self._sqsum = cv2.integral2(plane, sdepth=cv2.CV_64F, sqdepth=cv2.CV_64F)
+
+    def _local(self, x_min: int, y_min: int, x_max: int, y_max: int) -> Optional[Tuple[int, int, int, int]]:
+        ox, oy = self.origin
+        x0, y0, x1, y1 = x_min - ox, y_min - oy, x_max - ox, y_max - oy
+        if x0 < 0 or y0 < 0 or x1 > self.width or y1 > self.height or x1 <= x0 or y1 <= y0:
+            return None
+        return x0, y0, x1, y1
+
+    @staticmethod
+    def _box(table: np.ndarray, x0: int, y0: int, x1: int, y1: int) -> float:
+        return float(table[y1, x1] - table[y0, x1] - table[y1, x0] + table[y0, x0])
+
+    def _moments(self, x0: int, y0: int, x1: int, y1: int) -> Tuple[int, float, float]:
+        return (x1 - x0) * (y1 - y0), self._box(self._sum, x0, y0, x1, y1), self._box(self._sqsum, x0, y0, x1, y1)
+
+    @staticmethod
+    def _finish(area: float, total: float, sq_total: float) -> Tuple[float, float]:
+        mean = total / area
+        return mean, max(0.0, sq_total / area - mean * mean)
+
+    def stats(self, x_min: int, y_min: int, x_max: int, y_max: int) -> Optional[Tuple[float, float]]:
+        """(mean, variance) of a rectangle in original-image coordinates; None if it is not inside the plane."""
+        local = self._local(x_min, y_min, x_max, y_max)
+        if local is None:
+            return None
+        return self._finish(*self._moments(*local))
+
+    def union_stats(self, rects: Sequence[Tuple[int, int, int, int]]) -> Optional[Tuple[float, float]]:
+        """
+        (mean, variance) over the union of rectangles, each pixel counted once however many
+        rectangles cover it; None if any rectangle is not inside the plane.
+        """
+        local = [self._local(*rect) for rect in rects]
+        if not local or any(r is None for r in local):
+            return None
+        area = total = sq_total = 0.0
+        for k in range(1, len(local) + 1):
+            sign = 1.0 if k % 2 else -1.0
+            for group in combinations(local, k):
+                x0, y0 = max(r[0] for r in group), max(r[1] for r in group)
+                x1, y1 = min(r[2] for r in group), min(r[3] for r in group)
+                if x1 <= x0 or y1 <= y0:
+                    continue
+                a, s, sq = self._moments(x0, y0, x1, y1)
+                area, total, sq_total = area + sign * a, total + sign * s, sq_total + sign * sq
+        return self._finish(area, total, sq_total)
+
+    def mean(self, x_min: int, y_min: int, x_max: int, y_max: int) -> Optional[float]:
+        result = self.stats(x_min, y_min, x_max, y_max)
+        return result[0] if result is not None else None
+
+
+def landmark_rect(
+    landmarks: List[Dict[str, float]],
+    indices: Sequence[int],
+    shape: Tuple[int, ...],
+    padding: int = 5,
+) -> Optional[Tuple[int, int, int, int]]:
+    """Padded bounding box (x_min, y_min, x_max, y_max) of landmark indices, clipped to the image; None if empty."""
+    h, w = shape[:2]
+    xs = [landmarks[i]["x"] * w for i in indices if i < len(landmarks)]
+    ys = [landmarks[i]["y"] * h for i in indices if i < len(landmarks)]
+    if not xs:
+        return None
+    x_min = max(0, int(min(xs)) - padding)
+    x_max = min(w, int(max(xs)) + padding)
+    y_min = max(0, int(min(ys)) - padding)
+    y_max = min(h, int(max(ys)) + padding)
+    if x_max <= x_min or y_max <= y_min:
+        return None
+    return x_min, y_min, x_max, y_max
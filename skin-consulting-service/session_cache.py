@@ -0,0 +1,94 @@
+"""
+Session-scoped cache of analysed faces for interactive simulation.
+
+A consult stores the face crop, landmarks, skin scores and the crop's LAB plane under
+a random token. Staff then try further services on the same customer with POST
+/simulate and the token alone: no upload, no FaceMesh, no scoring. Entries expire
+after ttl_s, and the least recently used are evicted beyond max_entries or max_bytes.
+Sessions live in process memory, so they are only valid on the worker that issued them.
+"""
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from skin_scoring import SkinScores
+
+
+@dataclass
+class ConsultSession:
+    face_crop: np.ndarray
+    lab: np.ndarray
+    mean_before: float
+    landmarks: List[Dict[str, float]]
+    scores: SkinScores
+    created: float = field(default_factory=time.monotonic)
+
+    @property
+    def nbytes(self) -> int:
+        return self.face_crop.nbytes + self.lab.nbytes
+
+
+class SessionCache:
+    def __init__(self, ttl_s: float = 900.0, max_entries: int = 256, max_bytes: int = 256 * 1024 * 1024):
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, ConsultSession]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def put(self, session: ConsultSession) -> Optional[str]:
+        """Store a session and return its token; None if caching is disabled or it exceeds the byte budget."""
+        if self.max_entries <= 0 or session.nbytes > self.max_bytes:
+            return None
+        token = secrets.token_urlsafe(16)
+        with self._lock:
+            now = time.monotonic()
+            for stale in [t for t, s in self._entries.items() if now - s.created > self.ttl_s]:
+                self._bytes -= self._entries.pop(stale).nbytes
+                self.expired += 1
+            self._entries[token] = session
+            self._bytes += session.nbytes
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+                self.evictions += 1
+        return token
+
+    def get(self, token: str) -> Optional[ConsultSession]:
+        with self._lock:
+            session = self._entries.get(token)
+            if session is not None and time.monotonic() - session.created > self.ttl_s:
+                del self._entries[token]
+                self._bytes -= session.nbytes
+                self.expired += 1
+                session = None
+            if session is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return session
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_s": self.ttl_s,
+                "hits": self.hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "evictions": self.evictions,
+            }
@@ -1,15 +1,22 @@
 """
 Service and product impact simulation on face image. Max 50% visual correction;
 no over-whitening. Returns before/after as base64.
+Pointwise LAB channel adjustments are precompiled into 256-entry uint8 tables and
+applied with cv2.LUT; only the bilateral filters are per-pixel kernels, and no
+float copy of the image is made unless the 50% cap actually has to scale the change.
 """
 import base64
-from typing import Tuple
+from concurrent.futures import Executor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
 
 import cv2
 import numpy as np
 
 
 MAX_CORRECTION = 0.5  # 50% cap
+MAX_L = 95.0  # no over-whitening: cap on the 8-bit LAB L channel
+
+_LEVELS = np.arange(256, dtype=np.float32)
 
 
 def _to_base64(image: np.ndarray, fmt: str = ".jpg") -> str:
@@ -22,114 +29,125 @@ def _to_base64(image: np.ndarray, fmt: str = ".jpg") -> str:
     return base64.b64encode(buf.tobytes()).decode("utf-8")
 
 
-def _cap_correction(before: np.ndarray, after: np.ndarray) -> np.ndarray:
-    """Limit per-pixel change so overall correction does not exceed 50%. Never darken on average."""
-    before = np.clip(before.astype(np.float32), 0, 255)
-    after = np.clip(after.astype(np.float32), 0, 255)
-    delta = after - before
+def _channel_lut(l=None, a=None, b=None) -> np.ndarray:
+    """
+    3-channel cv2.LUT table from per-channel float32 curves over 0..255 (identity when None).
+    Values are clipped and truncated to uint8, exactly like the float pipeline they replace.
+    """
+    curves = [_LEVELS if c is None else c for c in (l, a, b)]
+    return np.clip(np.stack(curves, axis=-1), 0, 255).astype(np.uint8).reshape(1, 256, 3)
+
+
+def crop_mean(image: np.ndarray) -> float:
+    """Mean over all pixels and channels, in one pass."""
+    channels = 1 if image.ndim == 2 else image.shape[2]
+    return float(sum(cv2.mean(image)[:channels]) / channels)
+
+
+def _cap_correction(before: np.ndarray, after: np.ndarray, mean_before: Optional[float] = None) -> np.ndarray:
+    """
+    Limit per-pixel change so overall correction does not exceed 50%. Never darken on average.
+    mean_before may be passed when several results are capped against the same crop.
+    """
     # Scale delta so max average absolute change is 50% of 255
     max_avg_delta = MAX_CORRECTION * 255.0 * 0.5
-    avg_abs = np.mean(np.abs(delta))
-    if avg_abs > 1e-6 and avg_abs > max_avg_delta:
+    avg_abs = cv2.norm(after, before, cv2.NORM_L1) / before.size
+    if avg_abs > max_avg_delta:
         scale = max_avg_delta / avg_abs
-        delta = delta * scale
-    result = before + delta
+        result = cv2.addWeighted(before, 1.0 - scale, after, scale, 0.0, dtype=cv2.CV_32F)
+    else:
+        # Common case: the delta is within the cap, so the result is `after` itself (no float copy).
+        result = after
     # Safeguard: if result is darker on average than before, add a constant lift so we don't show a darker "after"
-    mean_before = np.mean(before)
-    mean_result = np.mean(result)
-    if mean_result < mean_before - 0.5:
-        lift = mean_before - mean_result
-        result = np.clip(result + lift, 0, 255)
-    return np.clip(result, 0, 255).astype(np.uint8)
+    if mean_before is None:
+        mean_before = crop_mean(before)
+    lift = mean_before - crop_mean(result)
+    if lift > 0.5:
+        if result.dtype == np.uint8:
+            return cv2.LUT(result, np.clip(_LEVELS + np.float32(lift), 0, 255).astype(np.uint8))
+        result += np.float32(lift)
+    if result.dtype != np.uint8:
+        result = np.clip(result, 0, 255, out=result).astype(np.uint8)
+    return result
 
 
-def _no_over_whiten(lab: np.ndarray, max_l: float = 95.0) -> np.ndarray:
-    """Cap L channel to avoid over-whitening."""
-    lab = lab.astype(np.float32)
-    lab[:, :, 0] = np.minimum(lab[:, :, 0], max_l)
-    return np.clip(lab, 0, 255).astype(np.uint8)
-
-
-def _simulate_de_tan(img: np.ndarray) -> np.ndarray:
+def _simulate_de_tan(img: np.ndarray, lab: Optional[np.ndarray] = None) -> np.ndarray:
     """Reduce pigmentation 20-30%, improve tone uniformity. Keep or lift brightness."""
-    lab = cv2.cvtColor(img, cv2.COLOR_BGR2LAB).astype(np.float32)
-    l, a, b = lab[:, :, 0], lab[:, :, 1], lab[:, :, 2]
-    mean_l = np.mean(l)
-    mask_dark = (l < mean_l).astype(np.float32)
-    l = l + mask_dark * (mean_l - l) * 0.25
+    if lab is None:
+        lab = cv2.cvtColor(img, cv2.COLOR_BGR2LAB)
+    mean_l = np.float32(cv2.mean(lab)[0])
+    # Pull values below the mean 25% toward it
+    l = np.where(_LEVELS < mean_l, _LEVELS + (mean_l - _LEVELS) * 0.25, _LEVELS)
     # Small global L lift so result is never darker
-    l = np.minimum(255.0, l + 2.5)
-    a = a * 0.92 + 128 * 0.08
-    b = b * 0.92 + 128 * 0.08
-    lab[:, :, 0], lab[:, :, 1], lab[:, :, 2] = l, a, b
-    lab = _no_over_whiten(lab.astype(np.uint8))
-    return cv2.cvtColor(lab.astype(np.uint8), cv2.COLOR_LAB2BGR)
+    l = np.minimum(np.floor(np.minimum(255.0, l + 2.5)), MAX_L)
+    ab = _LEVELS * 0.92 + 128 * 0.08
+    return cv2.cvtColor(cv2.LUT(lab, _channel_lut(l, ab, ab)), cv2.COLOR_LAB2BGR)
 
 
-def _simulate_fruit_facial(img: np.ndarray) -> np.ndarray:
+def _simulate_fruit_facial(img: np.ndarray, lab: Optional[np.ndarray] = None) -> np.ndarray:
     """Add glow, mild hydration smoothing. Smooth only A,B so L stays bright."""
-    lab = cv2.cvtColor(img, cv2.COLOR_BGR2LAB).astype(np.float32)
     # Brighten L and cap (no smoothing of L – smoothing was making after darker)
-    l_ch = np.minimum(255.0, lab[:, :, 0] * 1.06 + 3)
-    l_ch = np.minimum(l_ch, 95.0)
+    l = np.minimum(np.minimum(255.0, _LEVELS * 1.06 + 3), MAX_L)
+    if lab is None:
+        lab = cv2.cvtColor(img, cv2.COLOR_BGR2LAB)
+    lab = cv2.LUT(lab, _channel_lut(l))
+    l_ch, a_ch, b_ch = cv2.split(lab)
     # Smooth only A and B for even tone; leave L as brightened (bilateral needs 3 channels)
-    a_ch = lab[:, :, 1].astype(np.uint8)
-    b_ch = lab[:, :, 2].astype(np.uint8)
-    ab_smooth = cv2.bilateralFilter(cv2.merge([a_ch, b_ch, a_ch]), 5, 30, 30)
-    a_smooth = ab_smooth[:, :, 0].astype(np.float32)
-    b_smooth = ab_smooth[:, :, 1].astype(np.float32)
-    lab_out = np.stack([l_ch, a_smooth, b_smooth], axis=2)
-    lab_out = np.clip(lab_out, 0, 255).astype(np.uint8)
-    return cv2.cvtColor(lab_out, cv2.COLOR_LAB2BGR)
+    a_smooth, b_smooth, _ = cv2.split(cv2.bilateralFilter(cv2.merge([a_ch, b_ch, a_ch]), 5, 30, 30))
+    return cv2.cvtColor(cv2.merge([l_ch, a_smooth, b_smooth]), cv2.COLOR_LAB2BGR)
 
 
-def _simulate_gold_diamond(img: np.ndarray) -> np.ndarray:
+def _simulate_gold_diamond(img: np.ndarray, lab: Optional[np.ndarray] = None) -> np.ndarray:
     """Brightness boost, slight reflectivity."""
-    lab = cv2.cvtColor(img, cv2.COLOR_BGR2LAB).astype(np.float32)
-    lab[:, :, 0] = np.minimum(255.0, lab[:, :, 0] * 1.08 + 3)
-    lab = _no_over_whiten(lab.astype(np.uint8))
-    return cv2.cvtColor(lab.astype(np.uint8), cv2.COLOR_LAB2BGR)
+    if lab is None:
+        lab = cv2.cvtColor(img, cv2.COLOR_BGR2LAB)
+    l = np.minimum(np.floor(np.minimum(255.0, _LEVELS * 1.08 + 3)), MAX_L)
+    return cv2.cvtColor(cv2.LUT(lab, _channel_lut(l)), cv2.COLOR_LAB2BGR)
 
 
-def _simulate_threading(img: np.ndarray) -> np.ndarray:
+def _simulate_threading(img: np.ndarray, lab: Optional[np.ndarray] = None) -> np.ndarray:
     """Soften edges; add slight L lift so result is not darker."""
-    lab = cv2.cvtColor(img, cv2.COLOR_BGR2LAB).astype(np.float32)
-    lab_uint8 = np.clip(lab, 0, 255).astype(np.uint8)
-    smooth = cv2.bilateralFilter(lab_uint8, 3, 25, 25).astype(np.float32)
+    if lab is None:
+        lab = cv2.cvtColor(img, cv2.COLOR_BGR2LAB)
+    smooth = cv2.bilateralFilter(lab, 3, 25, 25)
     # Ensure we don't darken: slight L lift
-    smooth[:, :, 0] = np.minimum(255.0, smooth[:, :, 0] * 1.02 + 1.5)
-    smooth = np.clip(smooth, 0, 255).astype(np.uint8)
+    smooth = cv2.LUT(smooth, _channel_lut(np.minimum(255.0, _LEVELS * 1.02 + 1.5)))
     return cv2.cvtColor(smooth, cv2.COLOR_LAB2BGR)
 
 
-def _simulate_acne_treatment(img: np.ndarray) -> np.ndarray:
+def _simulate_acne_treatment(img: np.ndarray, lab: Optional[np.ndarray] = None) -> np.ndarray:
     """Reduce redness slightly; small L lift so skin doesn't look darker."""
-    lab = cv2.cvtColor(img, cv2.COLOR_BGR2LAB).astype(np.float32)
-    lab[:, :, 1] = lab[:, :, 1] * 0.88 + 128 * 0.12
+    if lab is None:
+        lab = cv2.cvtColor(img, cv2.COLOR_BGR2LAB)
+    a = _LEVELS * 0.88 + 128 * 0.12
     # Slight brightness so less-red doesn't read as darker
-    lab[:, :, 0] = np.minimum(255.0, lab[:, :, 0] * 1.03 + 2)
-    lab = np.clip(lab, 0, 255).astype(np.uint8)
-    return cv2.cvtColor(lab, cv2.COLOR_LAB2BGR)
+    l = np.minimum(255.0, _LEVELS * 1.03 + 2)
+    return cv2.cvtColor(cv2.LUT(lab, _channel_lut(l, a)), cv2.COLOR_LAB2BGR)
 
 
-def simulate_service_impact(face_crop: np.ndarray, service_name: str) -> np.ndarray:
-    """Apply one service simulation; return capped result."""
+def simulate_service_impact(
+    face_crop: np.ndarray,
+    service_name: str,
+    lab: Optional[np.ndarray] = None,
+    mean_before: Optional[float] = None,
+) -> np.ndarray:
+    """Apply one service simulation; return capped result. lab / mean_before: precomputed for face_crop."""
     if face_crop is None or face_crop.size == 0:
         return face_crop
     name = (service_name or "").lower()
     if "de-tan" in name or "detan" in name:
-        after = _simulate_de_tan(face_crop)
+        simulate = _simulate_de_tan
     elif "fruit" in name:
-        after = _simulate_fruit_facial(face_crop)
+        simulate = _simulate_fruit_facial
     elif "gold" in name or "diamond" in name:
-        after = _simulate_gold_diamond(face_crop)
+        simulate = _simulate_gold_diamond
     elif "thread" in name or "wax" in name:
-        after = _simulate_threading(face_crop)
+        simulate = _simulate_threading
     elif "acne" in name:
-        after = _simulate_acne_treatment(face_crop)
+        simulate = _simulate_acne_treatment
     else:
-        after = _simulate_fruit_facial(face_crop)
-    return _cap_correction(face_crop, after)
+        simulate = _simulate_fruit_facial
+    return _cap_correction(face_crop, simulate(face_crop, lab), mean_before)
 
 
 def _product_correction_factor(days: int) -> float:
@@ -141,19 +159,25 @@ def _product_correction_factor(days: int) -> float:
     return 0.50
 
 
-def simulate_product_impact(face_crop: np.ndarray, days: int = 30) -> np.ndarray:
+def simulate_product_impact(
+    face_crop: np.ndarray,
+    days: int = 30,
+    lab: Optional[np.ndarray] = None,
+    mean_before: Optional[float] = None,
+) -> np.ndarray:
     """Controlled pigmentation lightening, redness reduction, edge-preserving smoothing, subtle glow. Cap 50%."""
     if face_crop is None or face_crop.size == 0:
         return face_crop
     f = _product_correction_factor(days)
-    lab = cv2.cvtColor(face_crop, cv2.COLOR_BGR2LAB).astype(np.float32)
-    # Mild L lift
-    lab[:, :, 0] = lab[:, :, 0] + (128 - lab[:, :, 0]) * f * 0.4
-    lab[:, :, 1] = lab[:, :, 1] * (1 - f * 0.3) + 128 * (f * 0.3)
-    lab = _no_over_whiten(lab.astype(np.uint8))
+    if lab is None:
+        lab = cv2.cvtColor(face_crop, cv2.COLOR_BGR2LAB)
+    # Mild L lift (capped against over-whitening); pull A toward neutral
+    l = np.minimum(np.floor(_LEVELS + (128 - _LEVELS) * f * 0.4), MAX_L)
+    a = _LEVELS * (1 - f * 0.3) + 128 * (f * 0.3)
+    lab = cv2.LUT(lab, _channel_lut(l, a))
     smooth = cv2.bilateralFilter(lab, 5, 40, 40)
     after = cv2.cvtColor(smooth, cv2.COLOR_LAB2BGR)
-    return _cap_correction(face_crop, after)
+    return _cap_correction(face_crop, after, mean_before)
 
 
 def get_before_after_base64(
@@ -175,3 +199,60 @@ def get_before_after_base64(
         after = simulate_product_impact(after, product_days)
     after_b64 = _to_base64(after)
     return before_b64, after_b64
+
+
+def render_scenarios(
+    face_crop: np.ndarray,
+    services: Sequence[str],
+    product_days: Sequence[int],
+    executor: Optional[Executor] = None,
+    lab: Optional[np.ndarray] = None,
+    mean_before: Optional[float] = None,
+    encode: Optional[Callable[[np.ndarray], Any]] = None,
+    field: str = "base64",
+) -> Dict[str, Any]:
+    """
+    Before image plus one after image per service and per product timeline day, from a
+    single LAB conversion of face_crop. Timeline days are rendered in ascending order
+    and days that map to the same correction factor share one frame. Scenarios are
+    independent and run on executor when given (OpenCV releases the GIL).
+    lab / mean_before may be passed when already known for face_crop (cached sessions).
+    Each image is passed through encode (also on the executor; default base64 JPEG) and
+    returned under before_image_<field> / after_image_<field>.
+    """
+    if encode is None:
+        encode = _to_base64
+    if lab is None:
+        lab = cv2.cvtColor(face_crop, cv2.COLOR_BGR2LAB)
+    if mean_before is None:
+        mean_before = crop_mean(face_crop)
+
+    def service_frame(name: str) -> Any:
+        return encode(simulate_service_impact(face_crop, name, lab, mean_before))
+
+    def product_frame(days: int) -> Any:
+        return encode(simulate_product_impact(face_crop, days, lab, mean_before))
+
+    days_sorted = sorted(set(product_days))
+    by_factor: Dict[float, int] = {}
+    for days in days_sorted:
+        by_factor.setdefault(_product_correction_factor(days), days)
+
+    jobs: List[Tuple[Any, Any]] = [(encode, face_crop)]
+    jobs += [(service_frame, name) for name in services]
+    jobs += [(product_frame, days) for days in by_factor.values()]
+    if executor is None:
+        results = [fn(arg) for fn, arg in jobs]
+    else:
+        results = [f.result() for f in [executor.submit(fn, arg) for fn, arg in jobs]]
+
+    service_results = results[1:1 + len(services)]
+    frames = dict(zip(by_factor.values(), results[1 + len(services):]))
+    after_key = f"after_image_{field}"
+    return {
+        f"before_image_{field}": results[0],
+        "services": [{"service": name, after_key: image} for name, image in zip(services, service_results)],
+        "product_timeline": [
+            {"days": days, after_key: frames[by_factor[_product_correction_factor(days)]]} for days in days_sorted
+        ],
+    }
@@ -3,11 +3,12 @@ Skin metrics (0-100) using OpenCV + NumPy.
 Uses face crop for most metrics; full image + landmarks for under-eye vs cheek.
 """
 from dataclasses import dataclass
-from typing import List, Dict
+from typing import List, Dict, Optional
 
 import cv2
 import numpy as np
 
+from canonical_face import laplacian_threshold
 from face_region_extractor import (
     FaceRegions,
     UNDER_EYE_LEFT,
@@ -16,8 +17,12 @@ from face_region_extractor import (
     CHEEK_RIGHT,
     UPPER_LIP,
     LOWER_FACE,
+    FOREHEAD,
+    NOSE,
     get_region_mean_luminance,
 )
+from image_planes import ImagePlanes
+from region_stats import landmark_rect
 
 
 @dataclass
@@ -48,57 +53,51 @@ def _normalize_0_100(value: float, low: float, high: float) -> float:
     return float(100.0 * (x - low) / (high - low))
 
 
-def _brightness_index(face_crop: np.ndarray) -> float:
-    """LAB L channel mean -> 0-100 (typical L range ~20-90)."""
-    lab = cv2.cvtColor(face_crop, cv2.COLOR_BGR2LAB)
-    l_mean = np.mean(lab[:, :, 0])
+def _brightness_index(planes: ImagePlanes) -> float:
+    """LAB L channel mean over skin -> 0-100 (typical L range ~20-90)."""
+    l_mean = planes.masked_mean(planes.lightness)
     return _normalize_0_100(l_mean, 20.0, 90.0)
 
 
-def _pigmentation_density(face_crop: np.ndarray) -> float:
-    """Dark clusters: % of pixels below threshold relative to mean L -> 0-100."""
-    lab = cv2.cvtColor(face_crop, cv2.COLOR_BGR2LAB)
-    l_channel = lab[:, :, 0]
-    l_mean = np.mean(l_channel)
+def _pigmentation_density(planes: ImagePlanes) -> float:
+    """Dark clusters: % of skin pixels below threshold relative to mean L -> 0-100."""
+    l_channel = planes.lightness
+    if l_channel.size == 0:
+        return 0.0
+    l_mean = planes.masked_mean(l_channel)
     # Pixels darker than mean - 15 count as "dark cluster"
     threshold = max(0, l_mean - 15)
-    below = np.sum(l_channel < threshold)
-    total = l_channel.size
-    if total == 0:
-        return 0.0
-    ratio = below / total
+    ratio = planes.skin_fraction(l_channel < threshold)
     # 0-40% dark -> 0-100 scale (higher = more pigmentation)
     return _normalize_0_100(ratio * 100.0, 0.0, 40.0)
 
 
-def _redness_score(face_crop: np.ndarray) -> float:
-    """HSV: red hue ratio (0-15 and 160-180) -> 0-100."""
-    hsv = cv2.cvtColor(face_crop, cv2.COLOR_BGR2HSV)
-    h = hsv[:, :, 0]
+def _redness_score(planes: ImagePlanes) -> float:
+    """HSV: red hue ratio over skin (0-15 and 160-180) -> 0-100."""
+    h = planes.hsv[:, :, 0]
     # Red in OpenCV hue: 0-10 and 170-180 (half scale 0-180)
-    red_mask = ((h <= 10) | (h >= 170)).astype(np.float32)
-    ratio = np.mean(red_mask)
+    ratio = planes.skin_fraction((h <= 10) | (h >= 170))
     return _normalize_0_100(ratio * 100.0, 5.0, 35.0)
 
 
-def _texture_roughness(face_crop: np.ndarray) -> float:
-    """Laplacian variance -> 0-100 (higher = rougher)."""
-    gray = cv2.cvtColor(face_crop, cv2.COLOR_BGR2GRAY)
-    lap = cv2.Laplacian(gray, cv2.CV_64F)
-    var = np.var(lap)
-    # Typical range ~50-2000
-    return _normalize_0_100(var, 50.0, 2000.0)
+def _texture_roughness(planes: ImagePlanes) -> float:
+    """Laplacian variance of the crop -> 0-100 (higher = rougher)."""
+    var = planes.laplacian_variance
+    # Typical range ~50-2000 at upload resolution; scaled to the canonical face
+    return _normalize_0_100(var, laplacian_threshold(50.0), laplacian_threshold(2000.0))
 
 
-def _dark_circle_index(image: np.ndarray, landmarks: List[Dict[str, float]]) -> float:
+def _dark_circle_index(
+    image: np.ndarray, landmarks: List[Dict[str, float]], planes: Optional[ImagePlanes] = None
+) -> float:
     """Under-eye vs cheek luminance difference -> 0-100 (higher = more dark circles)."""
     under_l = (
-        get_region_mean_luminance(image, landmarks, UNDER_EYE_LEFT)
-        + get_region_mean_luminance(image, landmarks, UNDER_EYE_RIGHT)
+        get_region_mean_luminance(image, landmarks, UNDER_EYE_LEFT, planes)
+        + get_region_mean_luminance(image, landmarks, UNDER_EYE_RIGHT, planes)
     ) / 2.0
     cheek_l = (
-        get_region_mean_luminance(image, landmarks, CHEEK_LEFT)
-        + get_region_mean_luminance(image, landmarks, CHEEK_RIGHT)
+        get_region_mean_luminance(image, landmarks, CHEEK_LEFT, planes)
+        + get_region_mean_luminance(image, landmarks, CHEEK_RIGHT, planes)
     ) / 2.0
     if cheek_l <= 0:
         return 0.0
@@ -108,7 +107,9 @@ def _dark_circle_index(image: np.ndarray, landmarks: List[Dict[str, float]]) ->
     return _normalize_0_100(1.0 - ratio, 0.0, 0.5)
 
 
-def _facial_hair_density(image: np.ndarray, landmarks: List[Dict[str, float]]) -> float:
+def _facial_hair_density(
+    image: np.ndarray, landmarks: List[Dict[str, float]], planes: Optional[ImagePlanes] = None
+) -> float:
     """Edge density + dark clusters in lower face / upper lip -> 0-100."""
     h, w = image.shape[:2]
     indices = list(set(UPPER_LIP + LOWER_FACE))
@@ -122,21 +123,32 @@ def _facial_hair_density(image: np.ndarray, landmarks: List[Dict[str, float]]) -
     y_max = min(h, int(max(ys)) + 10)
     if x_max <= x_min or y_max <= y_min:
         return 0.0
-    crop = image[y_min:y_max, x_min:x_max]
-    gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
-    edges = cv2.Canny(gray, 50, 150)
-    edge_density = np.mean(edges > 0) * 100.0
-    lab = cv2.cvtColor(crop, cv2.COLOR_BGR2LAB)
-    l_channel = lab[:, :, 0]
+    gray = planes.region("gray", x_min, y_min, x_max, y_max) if planes is not None else None
+    l_channel = planes.region("lightness", x_min, y_min, x_max, y_max) if planes is not None else None
+    if gray is None or l_channel is None:
+        crop = image[y_min:y_max, x_min:x_max]
+        gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+        l_channel = cv2.cvtColor(crop, cv2.COLOR_BGR2LAB)[:, :, 0]
+    edges = cv2.Canny(gray, 50, 150) > 0
+    # Only skin (and beard) pixels count: background past the jaw and the lips are masked out
+    skin = planes.region("skin_mask", x_min, y_min, x_max, y_max) if planes is not None else None
+    if skin is not None and cv2.countNonZero(skin) > 0:
+        skin = skin > 0
+        edges = edges[skin]
+        l_channel = l_channel[skin]
+    edge_density = np.mean(edges) * 100.0
     dark_ratio = np.mean(l_channel < np.percentile(l_channel, 25))
     combined = 0.5 * _normalize_0_100(edge_density, 2.0, 15.0) + 0.5 * _normalize_0_100(dark_ratio * 100.0, 10.0, 40.0)
     return min(100.0, combined)
 
 
-def compute_skin_scores(image: np.ndarray, regions: FaceRegions) -> SkinScores:
+def compute_skin_scores(
+    image: np.ndarray, regions: FaceRegions, planes: Optional[ImagePlanes] = None
+) -> SkinScores:
     """
     Compute all 6 metrics. Uses face_crop for brightness, pigmentation, redness, texture;
-    full image + landmarks for dark_circle and facial_hair.
+    full image + landmarks for dark_circle and facial_hair. Pass the request's ImagePlanes
+    to share colour conversions with compute_confidence.
     """
     if not regions.face_detected or regions.face_crop is None or regions.face_crop.size == 0:
         return SkinScores(
@@ -148,17 +160,18 @@ def compute_skin_scores(image: np.ndarray, regions: FaceRegions) -> SkinScores:
             facial_hair_density=50.0,
         )
 
-    face_crop = regions.face_crop
     landmarks = regions.landmarks
+    if planes is None:
+        planes = ImagePlanes.for_face(regions)
 
-    brightness = _brightness_index(face_crop)
-    pigmentation_density = _pigmentation_density(face_crop)
-    redness = _redness_score(face_crop)
-    texture_roughness = _texture_roughness(face_crop)
+    brightness = _brightness_index(planes)
+    pigmentation_density = _pigmentation_density(planes)
+    redness = _redness_score(planes)
+    texture_roughness = _texture_roughness(planes)
 
-    # These need full image + landmarks (in original image coords)
-    dark_circle_index = _dark_circle_index(image, landmarks) if landmarks else 50.0
-    facial_hair_density = _facial_hair_density(image, landmarks) if landmarks else 50.0
+    # These need full image + landmarks (in original image coords); regions inside the crop reuse its planes
+    dark_circle_index = _dark_circle_index(image, landmarks, planes) if landmarks else 50.0
+    facial_hair_density = _facial_hair_density(image, landmarks, planes) if landmarks else 50.0
 
     return SkinScores(
         brightness=brightness,
@@ -168,3 +181,42 @@ def compute_skin_scores(image: np.ndarray, regions: FaceRegions) -> SkinScores:
         dark_circle_index=dark_circle_index,
         facial_hair_density=facial_hair_density,
     )
+
+
+# Named regions for per-region luminance; a region made of several landmark groups
+# (the T-zone) is the union of their rectangles, overlap (the nose bridge) counted once.
+LUMINANCE_REGIONS: Dict[str, List[List[int]]] = {
+    "under_eye_left": [UNDER_EYE_LEFT],
+    "under_eye_right": [UNDER_EYE_RIGHT],
+    "cheek_left": [CHEEK_LEFT],
+    "cheek_right": [CHEEK_RIGHT],
+    "forehead": [FOREHEAD],
+    "nose": [NOSE],
+    "t_zone": [FOREHEAD, NOSE],
+}
+
+
+def compute_region_luminance(
+    image: np.ndarray, regions: FaceRegions, planes: Optional[ImagePlanes] = None
+) -> Dict[str, Dict[str, float]]:
+    """
+    Mean and standard deviation of LAB L per named region, answered from the crop's
+    summed-area tables. Regions without landmarks or outside the crop are omitted.
+    """
+    if not regions.face_detected or not regions.landmarks:
+        return {}
+    if planes is None:
+        planes = ImagePlanes.for_face(regions)
+    if planes is None:
+        return {}
+    result: Dict[str, Dict[str, float]] = {}
+    for name, groups in LUMINANCE_REGIONS.items():
+        rects = [landmark_rect(regions.landmarks, indices, image.shape) for indices in groups]
+        if any(rect is None for rect in rects):
+            continue
+        stats = planes.lightness_stats.union_stats(rects)
+        if stats is None:
+            continue
+        mean, variance = stats
+        result[name] = {"mean": round(mean, 1), "std": round(float(np.sqrt(variance)), 1)}
+    return result
@@ -0,0 +1,137 @@
+"""
+Dynamic micro-batching for model inference.
+Concurrent requests are queued; a single worker collects them for up to
+window_ms (or until max_batch_size is reached), runs one batched forward pass
+in a thread, and hands each caller its own row of the output.
+"""
+import asyncio
+import time
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+class Histogram:
+    """Cumulative-bucket histogram (Prometheus style), reported as JSON."""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = sorted(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        for i, upper in enumerate(self.buckets):
+            if value <= upper:
+                self.counts[i] += 1
+
+    def to_dict(self) -> Dict[str, object]:
+        buckets = {str(upper): n for upper, n in zip(self.buckets, self.counts)}
+        buckets["+Inf"] = self.count
+        return {
+            "count": self.count,
+            "sum": round(self.total, 4),
+            "mean": round(self.total / self.count, 4) if self.count else 0.0,
+            "buckets": buckets,
+        }
+
+
+class MicroBatcher:
+    def __init__(
+        self,
+        predict_fn: Callable[[np.ndarray], np.ndarray],
+        max_batch_size: int = 16,
+        window_ms: float = 5.0,
+    ):
+        self._predict_fn = predict_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.window_s = max(0.0, window_ms) / 1000.0
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self.batch_size_hist = Histogram([1, 2, 4, 8, 16, 32, 64])
+        self.queue_time_ms_hist = Histogram([1, 2, 5, 10, 25, 50, 100, 250])
+        self.inference_ms_hist = Histogram([5, 10, 25, 50, 100, 250, 500, 1000])
+
+    async def start(self) -> None:
+        if self._worker is None:
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    async def submit(self, batch: np.ndarray) -> np.ndarray:
+        """Queue a (1, ...) input batch; returns its (1, ...) output once its batch has run."""
+        if self._queue is None:
+            await self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((batch, future, time.perf_counter()))
+        return await future
+
+    async def _collect(self) -> List[tuple]:
+        items = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.window_s
+        while len(items) < self.max_batch_size:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                items.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        # Anything already waiting joins this batch without extra delay.
+        while len(items) < self.max_batch_size and not self._queue.empty():
+            items.append(self._queue.get_nowait())
+        return items
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            items = await self._collect()
+            items = [item for item in items if not item[1].done()]
+            if not items:
+                continue
+            # Any failure (mismatched input shapes, a predict error, a short output) fails this
+            # batch's callers only; the worker must survive or every later submit waits forever.
+            try:
+                await self._run_batch(loop, items)
+            except Exception as exc:
+                for _, future, _ in items:
+                    if not future.done():
+                        future.set_exception(exc)
+
+    async def _run_batch(self, loop: asyncio.AbstractEventLoop, items: List[tuple]) -> None:
+        started = time.perf_counter()
+        for _, _, enqueued in items:
+            self.queue_time_ms_hist.observe((started - enqueued) * 1000.0)
+        self.batch_size_hist.observe(len(items))
+        inputs = np.concatenate([batch for batch, _, _ in items], axis=0)
+        outputs = await loop.run_in_executor(None, self._predict_fn, inputs)
+        self.inference_ms_hist.observe((time.perf_counter() - started) * 1000.0)
+        if len(outputs) != len(inputs):
+            raise ValueError(f"predict returned {len(outputs)} rows for a batch of {len(inputs)}")
+        offset = 0
+        for batch, future, _ in items:
+            n = batch.shape[0]
+            if not future.done():
+                future.set_result(outputs[offset:offset + n])
+            offset += n
+
+    def metrics(self) -> Dict[str, object]:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "window_ms": self.window_s * 1000.0,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "batch_size": self.batch_size_hist.to_dict(),
+            "queue_time_ms": self.queue_time_ms_hist.to_dict(),
+            "inference_ms": self.inference_ms_hist.to_dict(),
+        }
@@ -0,0 +1,93 @@
+"""
+Convert the Keras MobileNetV2 feature extractor to TFLite or ONNX and check the
+converted model against the Keras outputs.
+
+Usage:
+    python convert_model.py --format tflite --quantize float16 --output models/mobilenet_v2_fp16.tflite
+    python convert_model.py --format onnx --quantize int8 --output models/mobilenet_v2_int8.onnx
+
+Then run the service with SKIN_BACKEND=tflite|onnx and SKIN_MODEL_PATH=<output>.
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+
+from inference import INPUT_SIZE, KerasBackend, load_backend
+
+QUANTIZE_MODES = ("none", "float16", "int8")
+
+
+def _convert_tflite(keras_model, output: str, quantize: str) -> None:
+    import tensorflow as tf
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(keras_model)
+    if quantize == "float16":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantize == "int8":
+        # Dynamic-range quantization: int8 weights, float activations. No calibration set needed.
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    with open(output, "wb") as f:
+        f.write(converter.convert())
+
+
+def _convert_onnx(keras_model, output: str, quantize: str) -> None:
+    import tensorflow as tf
+    import tf2onnx
+
+    spec = (tf.TensorSpec((None, INPUT_SIZE, INPUT_SIZE, 3), tf.float32, name="input"),)
+    if quantize == "float16":
+        raise SystemExit("float16 is only supported for --format tflite; use int8 or none for onnx")
+    fp32_path = output if quantize == "none" else output + ".fp32"
+    tf2onnx.convert.from_keras(keras_model, input_signature=spec, opset=13, output_path=fp32_path)
+    if quantize == "int8":
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(fp32_path, output, weight_type=QuantType.QInt8)
+        os.remove(fp32_path)
+
+
+def verify(reference, candidate, samples: int = 8, seed: int = 0) -> dict:
+    """Compare candidate backend embeddings with the reference on random preprocessed inputs."""
+    rng = np.random.default_rng(seed)
+    batch = rng.uniform(-1.0, 1.0, size=(samples, INPUT_SIZE, INPUT_SIZE, 3)).astype(np.float32)
+    expected = reference.predict(batch)
+    actual = candidate.predict(batch)
+    cos = np.sum(expected * actual, axis=1) / (
+        np.linalg.norm(expected, axis=1) * np.linalg.norm(actual, axis=1) + 1e-12
+    )
+    return {
+        "max_abs_diff": float(np.max(np.abs(expected - actual))),
+        "min_cosine": float(np.min(cos)),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--format", choices=("tflite", "onnx"), required=True)
+    parser.add_argument("--quantize", choices=QUANTIZE_MODES, default="float16")
+    parser.add_argument("--output", required=True)
+    parser.add_argument("--min-cosine", type=float, default=0.98, help="Fail if any sample falls below this")
+    args = parser.parse_args()
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    reference = KerasBackend()
+    if args.format == "tflite":
+        _convert_tflite(reference.model, args.output, args.quantize)
+    else:
+        _convert_onnx(reference.model, args.output, args.quantize)
+
+    report = verify(reference, load_backend(args.format, args.output))
+    size_mb = os.path.getsize(args.output) / 1e6
+    print(f"{args.output}: {size_mb:.1f} MB, max_abs_diff={report['max_abs_diff']:.4f}, "
+          f"min_cosine={report['min_cosine']:.4f}")
+    if report["min_cosine"] < args.min_cosine:
+        print(f"Converted model diverges from Keras (min_cosine < {args.min_cosine})", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+"""
+Skin-type and acne classification heads over pooled MobileNetV2 embeddings,
+plus the pixel-statistics heuristic used when no head is configured.
+A head is a pair of softmax (multinomial logistic) layers stored as one .npz file;
+every .npz in SKIN_HEADS_DIR is loaded and selectable by its file stem.
+"""
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+
+class LinearHead:
+    def __init__(
+        self,
+        name: str,
+        mean: np.ndarray,
+        std: np.ndarray,
+        skin_w: np.ndarray,
+        skin_b: np.ndarray,
+        skin_labels: Sequence[str],
+        acne_w: np.ndarray,
+        acne_b: np.ndarray,
+        acne_labels: Sequence[str],
+    ):
+        self.name = name
+        self.mean = mean.astype(np.float32)
+        self.std = np.maximum(std.astype(np.float32), 1e-6)
+        self.skin_w = skin_w.astype(np.float32)
+        self.skin_b = skin_b.astype(np.float32)
+        self.skin_labels = [str(x) for x in skin_labels]
+        self.acne_w = acne_w.astype(np.float32)
+        self.acne_b = acne_b.astype(np.float32)
+        self.acne_labels = [str(x) for x in acne_labels]
+
+    @classmethod
+    def from_npz(cls, path: str) -> "LinearHead":
+        data = np.load(path, allow_pickle=False)
+        return cls(
+            name=Path(path).stem,
+            mean=data["mean"],
+            std=data["std"],
+            skin_w=data["skin_w"],
+            skin_b=data["skin_b"],
+            skin_labels=data["skin_labels"],
+            acne_w=data["acne_w"],
+            acne_b=data["acne_b"],
+            acne_labels=data["acne_labels"],
+        )
+
+    def save(self, path: str) -> None:
+        np.savez(
+            path,
+            mean=self.mean,
+            std=self.std,
+            skin_w=self.skin_w,
+            skin_b=self.skin_b,
+            skin_labels=np.array(self.skin_labels),
+            acne_w=self.acne_w,
+            acne_b=self.acne_b,
+            acne_labels=np.array(self.acne_labels),
+        )
+
+    def predict(self, embeddings: np.ndarray) -> List[Dict[str, Any]]:
+        """Classify a (N, D) embedding batch; one result dict per row."""
+        x = (embeddings.astype(np.float32) - self.mean) / self.std
+        skin_p = softmax(x @ self.skin_w + self.skin_b)
+        acne_p = softmax(x @ self.acne_w + self.acne_b)
+        skin_idx = np.argmax(skin_p, axis=1)
+        acne_idx = np.argmax(acne_p, axis=1)
+        return [
+            {
+                "skin_type": self.skin_labels[s],
+                "acne_level": self.acne_labels[a],
+                "skin_type_confidence": round(float(skin_p[i, s]), 3),
+                "acne_confidence": round(float(acne_p[i, a]), 3),
+            }
+            for i, (s, a) in enumerate(zip(skin_idx, acne_idx))
+        ]
+
+
+def softmax(logits: np.ndarray) -> np.ndarray:
+    z = logits - np.max(logits, axis=1, keepdims=True)
+    e = np.exp(z)
+    return e / np.sum(e, axis=1, keepdims=True)
+
+
+def load_heads(directory: str) -> Dict[str, LinearHead]:
+    """Load every *.npz head in directory, keyed by file stem. Empty if unset or missing."""
+    if not directory or not os.path.isdir(directory):
+        return {}
+    return {p.stem: LinearHead.from_npz(str(p)) for p in sorted(Path(directory).glob("*.npz"))}
+
+
+def classify_by_pixel_stats(image: np.ndarray) -> Dict[str, str]:
+    """Original heuristic: whole-crop mean for skin type, std for acne level. No model needed."""
+    brightness = float(np.mean(image))
+    acne_score = float(np.std(image) / 50.0)
+
+    if brightness > 150:
+        skin_type = "Dry"
+    elif brightness < 100:
+        skin_type = "Oily"
+    else:
+        skin_type = "Combination"
+
+    if acne_score > 2:
+        acne_level = "High"
+    elif acne_score > 1:
+        acne_level = "Moderate"
+    else:
+        acne_level = "Low"
+
+    return {
+        "skin_type": skin_type,
+        "acne_level": acne_level,
+    }
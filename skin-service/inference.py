@@ -0,0 +1,115 @@
+"""
+Inference backends for skin-service.
+Every backend takes a preprocessed float32 batch (N, 224, 224, 3) and returns
+pooled MobileNetV2 features (N, 1280). Runtime libraries are imported lazily so
+a TFLite or ONNX deployment never pays for the TensorFlow import.
+"""
+import os
+import threading
+from typing import Optional
+
+import cv2
+import numpy as np
+
+
+INPUT_SIZE = 224
+EMBEDDING_DIM = 1280
+
+
+def preprocess(image: np.ndarray) -> np.ndarray:
+    """Resize and scale to [-1, 1] (same as mobilenet_v2.preprocess_input, without importing TensorFlow)."""
+    image_resized = cv2.resize(image, (INPUT_SIZE, INPUT_SIZE)).astype(np.float32)
+    image_resized = image_resized / 127.5 - 1.0
+    return np.expand_dims(image_resized, axis=0)
+
+
+class KerasBackend:
+    """Full TensorFlow/Keras MobileNetV2 (imagenet weights, global average pooling)."""
+
+    name = "keras"
+
+    def __init__(self, model_path: Optional[str] = None):
+        import tensorflow as tf
+
+        if model_path:
+            self.model = tf.keras.models.load_model(model_path)
+        else:
+            self.model = tf.keras.applications.MobileNetV2(
+                weights="imagenet",
+                include_top=False,
+                pooling="avg",
+            )
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        return np.asarray(self.model(batch, training=False))
+
+
+class TFLiteBackend:
+    """TFLite interpreter; uses tflite-runtime when installed, else tf.lite."""
+
+    name = "tflite"
+
+    def __init__(self, model_path: str, num_threads: Optional[int] = None):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+
+            Interpreter = tf.lite.Interpreter
+        self.interpreter = Interpreter(model_path=model_path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_size = int(self._input["shape"][0])
+        # The interpreter holds mutable tensor buffers; one invoke at a time.
+        self._lock = threading.Lock()
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        with self._lock:
+            if batch.shape[0] != self._batch_size:
+                self.interpreter.resize_tensor_input(self._input["index"], list(batch.shape))
+                self.interpreter.allocate_tensors()
+                self._batch_size = batch.shape[0]
+            self.interpreter.set_tensor(self._input["index"], batch.astype(self._input["dtype"]))
+            self.interpreter.invoke()
+            return np.array(self.interpreter.get_tensor(self._output["index"]), dtype=np.float32)
+
+
+class OnnxBackend:
+    """ONNX Runtime on the CPU execution provider."""
+
+    name = "onnx"
+
+    def __init__(self, model_path: str, num_threads: Optional[int] = None):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self._input_name = self.session.get_inputs()[0].name
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        outputs = self.session.run(None, {self._input_name: batch.astype(np.float32)})
+        return np.asarray(outputs[0], dtype=np.float32)
+
+
+BACKENDS = {
+    KerasBackend.name: KerasBackend,
+    TFLiteBackend.name: TFLiteBackend,
+    OnnxBackend.name: OnnxBackend,
+}
+
+
+def load_backend(name: str, model_path: Optional[str] = None):
+    """Build the backend selected by name. tflite/onnx require a converted model file."""
+    name = (name or KerasBackend.name).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown skin backend {name!r}; expected one of {sorted(BACKENDS)}")
+    if name == KerasBackend.name:
+        return KerasBackend(model_path or None)
+    if not model_path or not os.path.isfile(model_path):
+        raise FileNotFoundError(f"Skin backend {name!r} needs a converted model file; got {model_path!r}")
+    threads = int(os.getenv("SKIN_NUM_THREADS", "0")) or None
+    return BACKENDS[name](model_path, num_threads=threads)
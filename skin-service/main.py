@@ -1,33 +1,132 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from fastapi import FastAPI, UploadFile, File, HTTPException, Query
+from fastapi.responses import JSONResponse
 import numpy as np
 import cv2
-import tensorflow as tf
 
-app = FastAPI(title="NYRAA AI Skin Service", version="1.0.0")
+from batching import MicroBatcher
+from embedding_cache import EmbeddingCache
+from heads import classify_by_pixel_stats, load_heads
+from inference import INPUT_SIZE, load_backend, preprocess
+from raw_image import is_raw_image, unpack_raw_image
+
+logger = logging.getLogger("uvicorn.error")
+
+# keras (default) | tflite | onnx. tflite/onnx load a converted model from SKIN_MODEL_PATH (see convert_model.py).
+SKIN_BACKEND = os.getenv("SKIN_BACKEND", "keras")
+SKIN_MODEL_PATH = os.getenv("SKIN_MODEL_PATH", "")
+
+# Classification heads over the pooled embedding (see train_heads.py), from SKIN_HEADS_DIR.
+# The backbone is only loaded when there is a head to feed. Until a head has been trained,
+# and always with SKIN_BACKEND=none, labels come from the pixel-statistics heuristic.
+SKIN_HEADS_DIR = os.getenv("SKIN_HEADS_DIR", str(Path(__file__).resolve().parent / "heads"))
+heads = load_heads(SKIN_HEADS_DIR) if SKIN_BACKEND.lower() != "none" else {}
+LOAD_BACKBONE = SKIN_BACKEND.lower() != "none" and bool(heads)
+USE_MODEL = LOAD_BACKBONE
+DEFAULT_HEAD = os.getenv("SKIN_DEFAULT_HEAD") or (next(iter(heads)) if heads else None)
+if DEFAULT_HEAD is not None and DEFAULT_HEAD not in heads:
+    raise ValueError(
+        f"SKIN_DEFAULT_HEAD={DEFAULT_HEAD!r} is not a loaded head; "
+        f"available in {SKIN_HEADS_DIR}: {list(heads) or 'none'}"
+    )
+
+embedding_cache = EmbeddingCache(int(os.getenv("SKIN_EMBEDDING_CACHE_SIZE", "1024")))
 
-model = tf.keras.applications.MobileNetV2(
-    weights="imagenet",
-    include_top=False,
-    pooling="avg",
+model = None
+model_state: Dict[str, Any] = {
+    "status": "loading",
+    "backend": SKIN_BACKEND if LOAD_BACKBONE else "none",
+    "classifier": "heads" if USE_MODEL else "heuristic",
+    "heads": list(heads),
+    "load_ms": None,
+    "warmup_ms": None,
+    "error": None,
+}
+
+# Concurrent requests within SKIN_BATCH_WINDOW_MS share one forward pass (up to SKIN_MAX_BATCH images).
+batcher = MicroBatcher(
+    lambda batch: model.predict(batch),
+    max_batch_size=int(os.getenv("SKIN_MAX_BATCH", "16")),
+    window_ms=float(os.getenv("SKIN_BATCH_WINDOW_MS", "5")),
 )
 
 
+def _load_and_warm_model() -> None:
+    """Build the backend, then run one synthetic inference so the first real request skips graph setup."""
+    global model
+    started = time.perf_counter()
+    loaded = load_backend(SKIN_BACKEND, SKIN_MODEL_PATH)
+    model_state["load_ms"] = round((time.perf_counter() - started) * 1000.0, 1)
+    started = time.perf_counter()
+    loaded.predict(np.zeros((1, INPUT_SIZE, INPUT_SIZE, 3), dtype=np.float32))
+    model_state["warmup_ms"] = round((time.perf_counter() - started) * 1000.0, 1)
+    model = loaded
+
+
+async def _load_model() -> None:
+    if not LOAD_BACKBONE:
+        model_state["status"] = "ready"
+        if SKIN_BACKEND.lower() == "none":
+            logger.info("SKIN_BACKEND=none; using pixel-statistics heuristic")
+        else:
+            logger.warning(
+                "no classification head in %s; not loading %s backbone, using pixel-statistics heuristic",
+                SKIN_HEADS_DIR, SKIN_BACKEND,
+            )
+        return
+    try:
+        await asyncio.to_thread(_load_and_warm_model)
+        await batcher.start()
+        model_state["status"] = "ready"
+        logger.info("skin model ready: %s", model_state)
+    except Exception as exc:
+        model_state["status"] = "failed"
+        model_state["error"] = str(exc)
+        logger.exception("skin model failed to load")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load in the background so /health/live answers while the model is still building.
+    loader = asyncio.create_task(_load_model())
+    yield
+    loader.cancel()
+    await batcher.stop()
+
+
+app = FastAPI(title="NYRAA AI Skin Service", version="1.0.0", lifespan=lifespan)
+
+
 def read_image(file_bytes: bytes) -> np.ndarray:
+    if is_raw_image(file_bytes):
+        return unpack_raw_image(file_bytes)
     np_arr = np.frombuffer(file_bytes, np.uint8)
     image = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
     return image
 
 
-def preprocess(image: np.ndarray) -> np.ndarray:
-    image_resized = cv2.resize(image, (224, 224))
-    image_resized = tf.keras.applications.mobilenet_v2.preprocess_input(
-        image_resized.astype(np.float32)
-    )
-    return np.expand_dims(image_resized, axis=0)
+async def _embed(image: np.ndarray) -> np.ndarray:
+    """Pooled backbone embedding for a crop, served from the cache when the same pixels were seen before."""
+    key = EmbeddingCache.key(image)
+    embedding = embedding_cache.get(key)
+    if embedding is None:
+        embedding = (await batcher.submit(preprocess(image)))[0]
+        embedding_cache.put(key, embedding)
+    return embedding
 
 
 @app.post("/analyze-skin")
-async def analyze_skin(file: UploadFile = File(...)):
+async def analyze_skin(
+    file: UploadFile = File(...),
+    head: Optional[str] = Query(None, description="Classification head to use (default SKIN_DEFAULT_HEAD)"),
+):
     contents = await file.read()
     if not contents:
         raise HTTPException(status_code=400, detail="Empty file uploaded")
@@ -36,28 +135,40 @@ async def analyze_skin(file: UploadFile = File(...)):
     if image is None:
         raise HTTPException(status_code=400, detail="Unable to decode image")
 
-    img_batch = preprocess(image)
-    _ = model.predict(img_batch)
+    if not USE_MODEL:
+        if head is not None:
+            raise HTTPException(status_code=400, detail=f"No classification heads loaded; cannot use head {head!r}")
+        return {**classify_by_pixel_stats(image), "classifier": "heuristic"}
+
+    head_name = head or DEFAULT_HEAD
+    if head_name not in heads:
+        raise HTTPException(status_code=400, detail=f"Unknown head {head_name!r}; available: {list(heads)}")
+    if model_state["status"] != "ready":
+        raise HTTPException(status_code=503, detail=f"Skin model is {model_state['status']}")
+
+    embedding = await _embed(image)
+    result = heads[head_name].predict(embedding[np.newaxis, :])[0]
+    return {**result, "classifier": head_name}
+
+
+@app.get("/health/live")
+async def health_live():
+    return {"status": "ok", "service": "skin"}
+
 
-    brightness = float(np.mean(image))
-    acne_score = float(np.std(image) / 50.0)
+@app.get("/health/ready")
+async def health_ready():
+    """200 once the model is loaded and warmed up; 503 while loading or after a load failure."""
+    status_code = 200 if model_state["status"] == "ready" else 503
+    return JSONResponse(status_code=status_code, content={"service": "skin", **model_state})
 
-    if brightness > 150:
-        skin_type = "Dry"
-    elif brightness < 100:
-        skin_type = "Oily"
-    else:
-        skin_type = "Combination"
 
-    if acne_score > 2:
-        acne_level = "High"
-    elif acne_score > 1:
-        acne_level = "Moderate"
-    else:
-        acne_level = "Low"
+@app.get("/metrics/batching")
+async def batching_metrics():
+    """Batch-size, queue-time and inference-time histograms for the micro-batcher."""
+    return batcher.metrics()
 
-    return {
-        "skin_type": skin_type,
-        "acne_level": acne_level,
-    }
 
+@app.get("/metrics/embedding-cache")
+async def embedding_cache_metrics():
+    return embedding_cache.stats()
@@ -0,0 +1,88 @@
+"""
+Fit a skin-type / acne classification head on pooled MobileNetV2 embeddings.
+
+Input is a CSV with columns: path, skin_type, acne_level (one labelled face crop per row).
+The head is written as <output>.npz; drop it into SKIN_HEADS_DIR and select it by file stem.
+
+Usage:
+    python train_heads.py labels.csv --output heads/v1.npz
+    python train_heads.py labels.csv --output heads/v1.npz --backend onnx --model-path models/mobilenet_v2_int8.onnx
+"""
+import argparse
+import csv
+import sys
+from pathlib import Path
+from typing import List, Tuple
+
+import cv2
+import numpy as np
+
+from heads import LinearHead, softmax
+from inference import load_backend, preprocess
+
+
+def _fit_softmax(x: np.ndarray, labels: List[str], epochs: int, lr: float, l2: float) -> Tuple[np.ndarray, np.ndarray, List[str]]:
+    classes = sorted(set(labels))
+    y = np.zeros((len(labels), len(classes)), dtype=np.float32)
+    y[np.arange(len(labels)), [classes.index(label) for label in labels]] = 1.0
+    w = np.zeros((x.shape[1], len(classes)), dtype=np.float32)
+    b = np.zeros(len(classes), dtype=np.float32)
+    for _ in range(epochs):
+        grad = (softmax(x @ w + b) - y) / len(x)
+        w -= lr * (x.T @ grad + l2 * w)
+        b -= lr * grad.sum(axis=0)
+    return w, b, classes
+
+
+def _embed_rows(rows: List[dict], backend, batch_size: int) -> np.ndarray:
+    embeddings = []
+    for start in range(0, len(rows), batch_size):
+        batch = []
+        for row in rows[start:start + batch_size]:
+            image = cv2.imread(row["path"], cv2.IMREAD_COLOR)
+            if image is None:
+                raise SystemExit(f"Unable to read {row['path']}")
+            batch.append(preprocess(image))
+        embeddings.append(backend.predict(np.concatenate(batch, axis=0)))
+    return np.concatenate(embeddings, axis=0)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("labels_csv")
+    parser.add_argument("--output", required=True)
+    parser.add_argument("--backend", default="keras")
+    parser.add_argument("--model-path", default="")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--epochs", type=int, default=500)
+    parser.add_argument("--lr", type=float, default=0.1)
+    parser.add_argument("--l2", type=float, default=1e-3)
+    args = parser.parse_args()
+
+    with open(args.labels_csv, newline="") as f:
+        rows = list(csv.DictReader(f))
+    if not rows:
+        print("No labelled rows", file=sys.stderr)
+        return 1
+
+    embeddings = _embed_rows(rows, load_backend(args.backend, args.model_path), args.batch_size)
+    mean = embeddings.mean(axis=0)
+    std = np.maximum(embeddings.std(axis=0), 1e-6)
+    x = (embeddings - mean) / std
+
+    skin_w, skin_b, skin_labels = _fit_softmax(x, [r["skin_type"] for r in rows], args.epochs, args.lr, args.l2)
+    acne_w, acne_b, acne_labels = _fit_softmax(x, [r["acne_level"] for r in rows], args.epochs, args.lr, args.l2)
+
+    head = LinearHead(Path(args.output).stem, mean, std, skin_w, skin_b, skin_labels, acne_w, acne_b, acne_labels)
+    Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+    head.save(args.output)
+
+    predictions = head.predict(embeddings)
+    skin_acc = np.mean([p["skin_type"] == r["skin_type"] for p, r in zip(predictions, rows)])
+    acne_acc = np.mean([p["acne_level"] == r["acne_level"] for p, r in zip(predictions, rows)])
+    print(f"{args.output}: {len(rows)} rows, train accuracy skin_type={skin_acc:.2f} acne_level={acne_acc:.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -101,6 +101,24 @@ async def serve_upload(path: str):
     return Response(content=resp.content, media_type=resp.headers.get("content-type", "image/jpeg"))
 
 
+@app.get("/api/consult/artifacts/{artifact_id}")
+async def serve_consult_artifact(artifact_id: str):
+    """Proxy to gateway /consult/artifacts/<id> to serve rendered before/after images."""
+    if not artifact_id or "/" in artifact_id or ".." in artifact_id:
+        raise HTTPException(status_code=400, detail="Invalid artifact id")
+    async with httpx.AsyncClient(timeout=10.0) as client:
+        try:
+            resp = await client.get(f"{API_GATEWAY_URL}/consult/artifacts/{artifact_id}")
+        except httpx.RequestError as e:
+            raise HTTPException(status_code=502, detail=f"Gateway error: {e}")
+    if resp.status_code == 404:
+        raise HTTPException(status_code=404, detail="Image not found")
+    if resp.status_code >= 400:
+        raise HTTPException(status_code=resp.status_code, detail=resp.text)
+    headers = {"Cache-Control": resp.headers["cache-control"]} if "cache-control" in resp.headers else None
+    return Response(content=resp.content, media_type=resp.headers.get("content-type", "image/webp"), headers=headers)
+
+
 @app.get("/api/admin/analyses")
 async def admin_analyses(authorization: str = Header(None)):
     """Proxy to gateway GET /admin/analyses. Requires Authorization header."""
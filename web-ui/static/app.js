@@ -858,9 +858,17 @@
 
           var beforeImg = document.getElementById('sc-before-img');
           var afterImg = document.getElementById('sc-after-img');
-          if (beforeImg && customer.before_image_base64) beforeImg.src = 'data:image/jpeg;base64,' + customer.before_image_base64;
+          // Images come as gateway artifact URLs (/consult/artifacts/<id>, proxied under /api); base64 only in inline mode.
+          function scImageSrc(url, b64) {
+            if (url) return '/api' + url;
+            if (b64) return 'data:image/jpeg;base64,' + b64;
+            return '';
+          }
+          var beforeSrc = scImageSrc(customer.before_image_url, customer.before_image_base64);
+          var afterSrc = scImageSrc(customer.after_image_url, customer.after_image_base64);
+          if (beforeImg && beforeSrc) beforeImg.src = beforeSrc;
           else if (beforeImg) beforeImg.removeAttribute('src');
-          if (afterImg && customer.after_image_base64) afterImg.src = 'data:image/jpeg;base64,' + customer.after_image_base64;
+          if (afterImg && afterSrc) afterImg.src = afterSrc;
           else if (afterImg) afterImg.removeAttribute('src');
 
           var discEl = document.getElementById('sc-disclaimer');